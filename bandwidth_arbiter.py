@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Arbitrage de la bande passante entre torrents
+Garantit aux streams regardes un debit fonde sur leur bitrate et leur retard de buffer,
+protege les streams qui demarrent (pas encore de lecteur), bride (ou met en pause) les autres
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+import libtorrent as lt
+
+from real_streaming_service import ASSUMED_DURATION, RealStreamingService, TorrentSnapshot, real_streaming_service
+
+logger = logging.getLogger(__name__)
+
+# Capacite de telechargement (KB/s); 0 = estimee depuis le debit total observe
+DOWNLOAD_CAPACITY_KBPS = int(os.getenv('DOWNLOAD_CAPACITY_KBPS', '0'))
+BANDWIDTH_INTERVAL = 3  # Secondes entre deux arbitrages
+CAPACITY_DECAY = 0.98  # Oubli progressif du pic de debit observe (par arbitrage)
+MIN_CAPACITY = 256 * 1024  # Capacite supposee tant que rien n'a ete mesure (bytes/s)
+
+# Demande d'un stream regarde: bitrate x (1 + DEFICIT_BOOST x retard de buffer)
+BUFFER_TARGET_SECONDS = 30  # Buffer vise devant la lecture
+DEFICIT_BOOST = 2.0  # Buffer vide: jusqu'a 3x le bitrate
+
+IDLE_MIN_RATE = 32 * 1024  # En dessous, les torrents sans lecteur sont mis en pause (bytes/s)
+STARVED_UPLOAD_LIMIT = 64 * 1024  # Upload des autres torrents quand les streams manquent de debit
+STARTING_GRACE = 60  # Secondes apres l'ajout ou la derniere demande ou un torrent reste protege
+WATCHED_MAX_CONNECTIONS = 200
+IDLE_MAX_CONNECTIONS = 30
+UNLIMITED = -1
+# Jamais bridees ni en pause: streams regardes, et streams qui demarrent (les lecteurs ne
+# s'attachent qu'une fois le statut 'streaming' atteint, donc pas encore de lecteur)
+PROTECTED_ROLES = ('watched', 'starting')
+
+
+class BandwidthArbiter:
+    """Repartit la capacite de telechargement: streams regardes d'abord, le reste aux autres"""
+
+    def __init__(self, service: RealStreamingService, capacity: int = 0, interval: float = BANDWIDTH_INTERVAL):
+        self.service = service
+        self.configured_capacity = capacity  # 0 = estimation automatique
+        self.estimated_capacity = MIN_CAPACITY
+        self.interval = interval
+        self.applied: Dict[str, Dict] = {}  # info_hash -> derniers reglages envoyes a libtorrent
+        self.paused: set = set()  # Torrents mis en pause par l'arbitre
+        self.last_plan: Dict = {}
+        self._lock = threading.Lock()
+
+        thread = threading.Thread(target=self._loop, daemon=True)
+        thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.rebalance()
+            except Exception as e:
+                logger.error(f"Erreur arbitrage bande passante: {e}")
+
+    def capacity(self, total_rate: int) -> int:
+        """Capacite configuree, sinon pic de debit observe (oublie lentement)"""
+        if self.configured_capacity:
+            return self.configured_capacity
+        self.estimated_capacity = max(MIN_CAPACITY, total_rate, int(self.estimated_capacity * CAPACITY_DECAY))
+        return self.estimated_capacity
+
+    def _bitrate(self, torrent_info: Dict) -> float:
+        """Debit du media (bytes/s): scheduler si connu, sinon taille / duree supposee"""
+        if torrent_info['scheduler'] is not None:
+            return torrent_info['scheduler'].bitrate()
+        file_index = torrent_info['file_index']
+        if file_index is None or not torrent_info['files']:
+            return 0.0
+        return torrent_info['files'][file_index].size / ASSUMED_DURATION
+
+    def _demand(self, torrent_info: Dict, snapshot: TorrentSnapshot) -> int:
+        """Debit garanti a un stream regarde: bitrate augmente du retard de buffer"""
+        bitrate = self._bitrate(torrent_info)
+        if bitrate <= 0:
+            return 0
+        target = bitrate * BUFFER_TARGET_SECONDS
+        deficit = min(1.0, max(0.0, 1 - snapshot.buffered_ahead / target))
+        return int(bitrate * (1 + DEFICIT_BOOST * deficit))
+
+    def plan(self) -> Dict:
+        """Calcule les reglages de chaque torrent actif (sans les appliquer)"""
+        torrents = []
+        now = time.time()
+        for info_hash, torrent_info in list(self.service.active_torrents.items()):
+            if torrent_info['handle'] is None:
+                continue
+            snapshot = self.service.get_snapshot(info_hash) or TorrentSnapshot()
+            if torrent_info['status'] == 'completed':
+                role = 'seeding'
+            elif self.service.get_active_readers(info_hash) > 0:
+                role = 'watched'
+            elif torrent_info['status'] != 'error' and (
+                    torrent_info['status'] == 'downloading'
+                    or now - max(torrent_info['added_at'], torrent_info['last_read']) < STARTING_GRACE):
+                role = 'starting'
+            else:
+                role = 'idle'
+            torrents.append((info_hash, torrent_info, snapshot, role))
+
+        total_rate = sum(snapshot.download_rate for _, _, snapshot, _ in torrents)
+        capacity = self.capacity(total_rate)
+        demands = {info_hash: self._demand(torrent_info, snapshot)
+                   for info_hash, torrent_info, snapshot, role in torrents if role in PROTECTED_ROLES}
+        watched_demand = sum(demands[info_hash] for info_hash, _, _, role in torrents if role == 'watched')
+        spare = capacity - sum(demands.values())
+        idle = [info_hash for info_hash, _, _, role in torrents if role == 'idle']
+        starved = bool(demands) and spare < IDLE_MIN_RATE * max(1, len(idle))
+
+        settings = {}
+        for info_hash, torrent_info, snapshot, role in torrents:
+            download, upload, connections, paused = UNLIMITED, UNLIMITED, IDLE_MAX_CONNECTIONS, False
+            if role in PROTECTED_ROLES:
+                connections = WATCHED_MAX_CONNECTIONS
+                if role == 'watched' and self.configured_capacity and watched_demand > capacity:
+                    # Plusieurs streams au-dela de la capacite: partage au prorata de la demande
+                    # (pas avec une capacite estimee: la brider empecherait de mesurer mieux)
+                    download = max(1, capacity * demands[info_hash] // watched_demand)
+            elif role == 'idle' and demands:
+                if starved:
+                    paused = True
+                else:
+                    download = spare // len(idle)
+            if starved and role not in PROTECTED_ROLES:
+                upload = STARVED_UPLOAD_LIMIT
+            settings[info_hash] = {
+                'role': role,
+                'demand': demands.get(info_hash, 0),
+                'download_limit': download,
+                'upload_limit': upload,
+                'max_connections': connections,
+                'paused': paused,
+                'download_rate': snapshot.download_rate,
+                'buffered_ahead': snapshot.buffered_ahead,
+            }
+
+        return {
+            'time': time.time(),
+            'capacity': capacity,
+            'capacity_source': 'configured' if self.configured_capacity else 'estimated',
+            'total_download_rate': total_rate,
+            'watched_demand': watched_demand,
+            'starved': starved,
+            'torrents': settings,
+        }
+
+    def rebalance(self) -> Dict:
+        """Calcule et applique les reglages (seuls les changements sont envoyes a libtorrent)"""
+        with self._lock:
+            plan = self.plan()
+            for info_hash, settings in plan['torrents'].items():
+                torrent_info = self.service.active_torrents.get(info_hash)
+                if torrent_info is None or torrent_info['handle'] is None:
+                    continue
+                self._apply(info_hash, torrent_info['handle'], settings)
+                torrent_info['bandwidth'] = settings
+
+            # Torrents partis (arretes, pool chaud): oublier leurs reglages sans y toucher
+            for info_hash in set(self.applied) - set(plan['torrents']):
+                self.applied.pop(info_hash, None)
+                self.paused.discard(info_hash)
+            self.last_plan = plan
+            return plan
+
+    def _apply(self, info_hash: str, handle, settings: Dict):
+        previous = self.applied.get(info_hash, {})
+        if previous.get('download_limit') != settings['download_limit']:
+            handle.set_download_limit(settings['download_limit'])
+        if previous.get('upload_limit') != settings['upload_limit']:
+            handle.set_upload_limit(settings['upload_limit'])
+        if previous.get('max_connections') != settings['max_connections']:
+            handle.set_max_connections(settings['max_connections'])
+
+        if settings['paused'] and info_hash not in self.paused:
+            handle.unset_flags(lt.torrent_flags.auto_managed)
+            handle.pause()
+            self.paused.add(info_hash)
+            logger.info(f"Bande passante: pause de {info_hash} (streams regardes prioritaires)")
+        elif not settings['paused'] and info_hash in self.paused:
+            handle.set_flags(lt.torrent_flags.auto_managed)
+            handle.resume()
+            self.paused.discard(info_hash)
+            logger.info(f"Bande passante: reprise de {info_hash}")
+        self.applied[info_hash] = settings
+
+    def get_report(self) -> Optional[Dict]:
+        return self.last_plan or None
+
+
+# Instance globale
+bandwidth_arbiter = BandwidthArbiter(real_streaming_service, DOWNLOAD_CAPACITY_KBPS * 1024)
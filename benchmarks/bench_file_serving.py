@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark de debit: generateur 8 KB (ancien chemin) vs MediaFileResponse
+Usage: python benchmarks/bench_file_serving.py [taille_mb] [repetitions]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import anyio
+from starlette.responses import StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from media_file_server import MediaFileResponse  # noqa: E402
+
+
+def legacy_response(path: str, file_size: int) -> StreamingResponse:
+    """Reproduit l'ancien stream_video (lectures de 8 KB dans un generateur)"""
+    def generate_full():
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(8192)
+                if not chunk:
+                    break
+                yield chunk
+
+    return StreamingResponse(generate_full(), headers={'Content-Length': str(file_size)})
+
+
+async def serve(response, extensions=None) -> int:
+    """Execute la reponse ASGI avec un send qui jette les donnees"""
+    sent = 0
+
+    async def receive():
+        # Client connecte pendant toute la reponse
+        await anyio.sleep_forever()
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+        elif message["type"] == "http.response.zerocopysend":
+            # Simule le serveur: sendfile vers /dev/null
+            with open(os.devnull, 'wb') as sink:
+                remaining = message["count"]
+                offset = message["offset"]
+                while remaining > 0:
+                    n = os.sendfile(sink.fileno(), message["file"].fileno(), offset, remaining)
+                    if n == 0:
+                        break
+                    offset += n
+                    remaining -= n
+                    sent += n
+
+    scope = {"type": "http", "method": "GET", "headers": [], "extensions": extensions or {}}
+    await response(scope, receive, send)
+    return sent
+
+
+def bench(name: str, factory, repeats: int, extensions=None):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sent = anyio.run(serve, factory(), extensions)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<28} {sent / 1024 / 1024 / best:10.1f} MB/s  ({best * 1000:.0f} ms)")
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.NamedTemporaryFile(suffix='.mkv', delete=False) as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(block)
+        path = f.name
+
+    try:
+        file_size = os.path.getsize(path)
+        print(f"Fichier: {size_mb} MB, meilleur de {repeats}")
+        bench("generateur 8 KB", lambda: legacy_response(path, file_size), repeats)
+        bench("MediaFileResponse (pread)", lambda: MediaFileResponse(path, 'video/x-matroska'), repeats)
+        # Extension zerocopysend simulee par send(): uvicorn ne la fournit pas (chemin pread en production)
+        bench("MediaFileResponse (sendfile)", lambda: MediaFileResponse(path, 'video/x-matroska'), repeats,
+              extensions={"http.response.zerocopysend": {}})
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
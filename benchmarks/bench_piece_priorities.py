@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark des priorites de pieces: reconstruction complete (ancien seek) vs PiecePriorityState
+Usage: python benchmarks/bench_piece_priorities.py [nb_pieces] [nb_seeks]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from real_streaming_service import PiecePriorityState  # noqa: E402
+
+
+class FakeHandle:
+    """Compte les appels et les pieces transmises a libtorrent"""
+
+    def __init__(self):
+        self.calls = 0
+        self.pieces_sent = 0
+
+    def prioritize_pieces(self, priorities):
+        self.calls += 1
+        self.pieces_sent += len(priorities)
+
+    def set_piece_deadline(self, piece, deadline):
+        self.calls += 1
+
+    def reset_piece_deadline(self, piece):
+        self.calls += 1
+
+
+def legacy_seek(handle: FakeHandle, num_pieces: int, seek_piece: int):
+    """Reproduit l'ancien set_piece_priorities_for_seeking (liste Python complete a chaque seek)"""
+    priorities = [1] * num_pieces
+
+    ultra_critical_start = max(0, seek_piece - 1)
+    ultra_critical_end = min(num_pieces, seek_piece + 2)
+    for i in range(ultra_critical_start, ultra_critical_end):
+        priorities[i] = 7
+        handle.set_piece_deadline(i, 100)
+
+    critical_start = max(0, seek_piece - 7)
+    critical_end = min(num_pieces, seek_piece + 8)
+    for i in range(critical_start, critical_end):
+        if priorities[i] < 6:
+            priorities[i] = 6
+            handle.set_piece_deadline(i, 500)
+
+    buffer_end = min(num_pieces, seek_piece + 50)
+    for i in range(critical_end, buffer_end):
+        priorities[i] = 5
+        handle.set_piece_deadline(i, 2000)
+
+    for percent in range(10, 100, 10):
+        sample_piece = int((percent / 100) * num_pieces)
+        if sample_piece < num_pieces:
+            priorities[sample_piece] = max(priorities[sample_piece], 4)
+
+    for i in range(min(20, num_pieces)):
+        priorities[i] = max(priorities[i], 6)
+
+    handle.prioritize_pieces(priorities)
+
+
+def main():
+    num_pieces = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+    num_seeks = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    rng = random.Random(42)
+    # Scrubbing: petits deplacements autour d'une position, avec quelques grands sauts
+    seeks, position = [], num_pieces // 3
+    for _ in range(num_seeks):
+        position += rng.randint(-30, 30) if rng.random() < 0.9 else rng.randint(-num_pieces // 4, num_pieces // 4)
+        position = min(max(position, 0), num_pieces - 1)
+        seeks.append(position)
+
+    print(f"{num_pieces} pieces, {num_seeks} seeks")
+
+    handle = FakeHandle()
+    start = time.perf_counter()
+    for seek_piece in seeks:
+        legacy_seek(handle, num_pieces, seek_piece)
+    elapsed = time.perf_counter() - start
+    print(f"{'reconstruction complete':<26} {elapsed / num_seeks * 1e6:8.0f} us/seek  "
+          f"{handle.pieces_sent / num_seeks:8.0f} pieces/seek  {handle.calls / num_seeks:6.1f} appels/seek")
+
+    handle = FakeHandle()
+    state = PiecePriorityState(handle, num_pieces)
+    state.apply_instant_access()
+    state.apply_seek(seeks[0])
+    handle.calls = handle.pieces_sent = 0
+    start = time.perf_counter()
+    for seek_piece in seeks:
+        state.apply_seek(seek_piece)
+    elapsed = time.perf_counter() - start
+    print(f"{'PiecePriorityState':<26} {elapsed / num_seeks * 1e6:8.0f} us/seek  "
+          f"{handle.pieces_sent / num_seeks:8.0f} pieces/seek  {handle.calls / num_seeks:6.1f} appels/seek")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark de redemarrage: magnet a froid vs reprise (metadonnees + resume data persistees)
+Un seeder local sert le torrent; chaque phase tourne dans un processus neuf (comme un redemarrage).
+Usage: python benchmarks/bench_restart.py [taille_mb]
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import subprocess
+
+import libtorrent as lt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEEDER_PORT = 6991
+
+
+def run_phase(phase: str, magnet: str, cache_dir: str) -> dict:
+    """Execute une phase dans un nouveau processus et retourne ses mesures"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--phase', phase, magnet],
+        capture_output=True, text=True, timeout=300, cwd=ROOT,
+        env=dict(os.environ, STREAMTV_CACHE_DIR=cache_dir)
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def phase(name: str, magnet: str):
+    """Demarrage du service, attente des metadonnees puis du fichier complet"""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from real_streaming_service import real_streaming_service as service
+
+    info_hash = service.extract_info_hash(magnet)
+    if name == 'cold':
+        service.start_download(magnet, 'bench')
+    timings = {}
+    while time.perf_counter() - start < 120:
+        torrent_info = service.active_torrents.get(info_hash)
+        handle = torrent_info and torrent_info['handle']
+        if handle is not None and 'connected' not in timings:
+            # Pas de DHT ni de tracker en local: pointer le seeder directement
+            handle.connect_peer(('127.0.0.1', SEEDER_PORT))
+            timings['connected'] = True
+        if torrent_info and torrent_info['files'] and 'metadata' not in timings:
+            timings['metadata'] = time.perf_counter() - start
+        if torrent_info and torrent_info['status'] == 'completed':
+            timings['complete'] = time.perf_counter() - start
+            break
+        time.sleep(0.005)
+
+    if name == 'cold':
+        service.shutdown()
+    else:
+        service.remove_torrent(info_hash)
+    timings.pop('connected', None)
+    print(json.dumps(timings))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+
+    source = tempfile.mkdtemp(prefix='bench_restart_')
+    # Cache et resume data propres au benchmark: jamais ceux de la production
+    cache_dir = tempfile.mkdtemp(prefix='bench_restart_cache_')
+    try:
+        with open(os.path.join(source, 'bench_restart.mkv'), 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        storage = lt.file_storage()
+        lt.add_files(storage, os.path.join(source, 'bench_restart.mkv'))
+        creator = lt.create_torrent(storage, 256 * 1024)
+        lt.set_piece_hashes(creator, source)
+        info = lt.torrent_info(lt.bencode(creator.generate()))
+
+        seeder = lt.session({'listen_interfaces': f'127.0.0.1:{SEEDER_PORT}',
+                             'enable_dht': False, 'enable_lsd': False})
+        handle = seeder.add_torrent({'ti': info, 'save_path': source})
+        while not handle.status().is_seeding:
+            time.sleep(0.05)
+
+        magnet = lt.make_magnet_uri(info)
+        print(f"Fichier: {size_mb} MB, seeder local sur le port {SEEDER_PORT}")
+        for label, name in (("magnet a froid", 'cold'), ("reprise (resume data)", 'resume')):
+            timings = run_phase(name, magnet, cache_dir)
+            print(f"{label:<24} metadonnees {timings.get('metadata', float('nan')) * 1000:8.0f} ms   "
+                  f"complet {timings.get('complete', float('nan')) * 1000:8.0f} ms")
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '--phase':
+        phase(sys.argv[2], sys.argv[3])
+    else:
+        main()
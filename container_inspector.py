@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Inspecteur de conteneurs video (MP4 / Matroska)
+Localise l'index du conteneur (moov, Cues) a partir des premiers bytes telecharges
+"""
+
+import struct
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytes du debut de fichier necessaires a l'inspection (en-tetes MP4, SeekHead MKV)
+HEAD_PROBE_BYTES = 64 * 1024
+
+# Lecture (offset, longueur) -> bytes, ou None si les donnees ne sont pas encore sur disque
+ReadAt = Callable[[int, int], Optional[bytes]]
+
+# Boites MP4 de premier niveau qui peuvent ouvrir un fichier
+MP4_TOP_LEVEL_BOXES = {b'ftyp', b'styp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pdin'}
+
+# Identifiants EBML (Matroska / WebM)
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEKHEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+CUES_ID = 0x1C53BB6B
+CLUSTER_ID = 0x1F43B675
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+DEFAULT_TIMECODE_SCALE = 1000000  # ns par tick Matroska
+
+
+@dataclass(frozen=True)
+class ContainerLayout:
+    """Position de l'index d'un conteneur video"""
+    container: str  # 'mp4', 'mkv' ou 'unknown'
+    index_ranges: Tuple[Tuple[int, int], ...] = ()  # Ranges [debut, fin) dans le fichier
+    segment_offset: int = 0  # MKV: debut des donnees du Segment (origine des positions)
+    timecode_scale: int = DEFAULT_TIMECODE_SCALE  # MKV: ns par tick
+    duration: Optional[float] = None  # Duree en secondes si l'en-tete la donne
+
+
+def inspect_container(read_at: ReadAt, file_size: int) -> Optional[ContainerLayout]:
+    """Localise l'index du conteneur; None si les bytes necessaires manquent encore"""
+    head = read_at(0, min(16, file_size))
+    if head is None:
+        return None
+    if len(head) < 8:
+        return ContainerLayout('unknown')
+
+    if int.from_bytes(head[:4], 'big') == EBML_ID:
+        return _inspect_mkv(read_at, file_size)
+    if head[4:8] in MP4_TOP_LEVEL_BOXES:
+        return _inspect_mp4(read_at, file_size)
+    return ContainerLayout('unknown')
+
+
+def _inspect_mp4(read_at: ReadAt, file_size: int) -> Optional[ContainerLayout]:
+    """Parcourt les boites de premier niveau jusqu'a moov (ou la fin de mdat)"""
+    offset = 0
+    mdat_end = None
+
+    while offset + 8 <= file_size:
+        header = read_at(offset, min(16, file_size - offset))
+        if header is None:
+            break
+
+        size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                break
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset  # Boite jusqu'a la fin du fichier
+
+        if size < header_size:
+            logger.warning(f"Boite MP4 invalide a {offset}: {box_type!r} ({size} bytes)")
+            return ContainerLayout('mp4')
+
+        if box_type == b'moov':
+            return ContainerLayout('mp4', ((offset, min(file_size, offset + size)),))
+        if box_type == b'mdat':
+            mdat_end = offset + size
+        offset += size
+    else:
+        # Fin du fichier atteinte sans moov (MP4 fragmente ou incomplet)
+        return ContainerLayout('mp4')
+
+    if mdat_end is not None and mdat_end < file_size:
+        # moov apres mdat (fichier non "faststart"): l'index est dans la queue
+        return ContainerLayout('mp4', ((mdat_end, file_size),))
+    return None
+
+
+def read_vint(data: bytes, pos: int, keep_marker: bool = False) -> Tuple[Optional[int], int]:
+    """Entier EBML de longueur variable -> (valeur, longueur); valeur None si taille inconnue"""
+    first = data[pos]
+    if first == 0:
+        raise ValueError(f"VINT invalide a {pos}")
+    length = 9 - first.bit_length()
+    if pos + length > len(data):
+        raise IndexError("VINT tronque")
+
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None, length  # Tous les bits a 1: taille inconnue
+    return value, length
+
+
+def read_element_header(data: bytes, pos: int) -> Tuple[int, Optional[int], int]:
+    """En-tete d'element EBML -> (id, taille des donnees, debut des donnees)"""
+    element_id, id_length = read_vint(data, pos, keep_marker=True)
+    size, size_length = read_vint(data, pos + id_length)
+    return element_id, size, pos + id_length + size_length
+
+
+def _parse_info(data: bytes, start: int, end: int) -> Tuple[int, Optional[float]]:
+    """TimecodeScale et duree (secondes) de l'element Info"""
+    timecode_scale = DEFAULT_TIMECODE_SCALE
+    duration_ticks = None
+    pos = start
+    while pos < end:
+        element_id, size, data_start = read_element_header(data, pos)
+        if size is None:
+            break
+        value = data[data_start:data_start + size]
+        if element_id == TIMECODE_SCALE_ID:
+            timecode_scale = int.from_bytes(value, 'big') or DEFAULT_TIMECODE_SCALE
+        elif element_id == DURATION_ID and size in (4, 8):
+            duration_ticks = struct.unpack('>f' if size == 4 else '>d', value)[0]
+        pos = data_start + size
+
+    duration = duration_ticks * timecode_scale / 1e9 if duration_ticks else None
+    return timecode_scale, duration
+
+
+def _parse_seek_head(data: bytes, start: int, end: int) -> List[Tuple[int, int]]:
+    """Entrees (id d'element, position relative au segment) d'un SeekHead"""
+    entries = []
+    pos = start
+    while pos < end:
+        element_id, size, data_start = read_element_header(data, pos)
+        if size is None:
+            break
+        if element_id == SEEK_ID:
+            seek_id = seek_position = None
+            child = data_start
+            while child < data_start + size:
+                child_id, child_size, child_data = read_element_header(data, child)
+                if child_size is None:
+                    break
+                value = int.from_bytes(data[child_data:child_data + child_size], 'big')
+                if child_id == SEEK_ID_ID:
+                    seek_id = value
+                elif child_id == SEEK_POSITION_ID:
+                    seek_position = value
+                child = child_data + child_size
+            if seek_id is not None and seek_position is not None:
+                entries.append((seek_id, seek_position))
+        pos = data_start + size
+    return entries
+
+
+def _inspect_mkv(read_at: ReadAt, file_size: int) -> Optional[ContainerLayout]:
+    """Suit le SeekHead du segment pour localiser les Cues"""
+    head_size = min(HEAD_PROBE_BYTES, file_size)
+    head = read_at(0, head_size)
+    if head is None:
+        return None
+
+    try:
+        _, ebml_size, ebml_data = read_element_header(head, 0)
+        if ebml_size is None:
+            raise ValueError("en-tete EBML de taille inconnue")
+        segment_id, _, segment_data = read_element_header(head, ebml_data + ebml_size)
+    except (IndexError, ValueError) as e:
+        logger.warning(f"En-tete Matroska illisible: {e}")
+        return ContainerLayout('mkv')
+    if segment_id != SEGMENT_ID:
+        return ContainerLayout('mkv')
+
+    # Elements de premier niveau presents dans la tete, jusqu'au premier Cluster
+    seek_entries: List[Tuple[int, int]] = []
+    timing = {'segment_offset': segment_data}
+    pos = segment_data
+    try:
+        while pos < len(head):
+            element_id, size, data_start = read_element_header(head, pos)
+            if element_id == CUES_ID and size is not None:
+                # Cues avant les clusters: deja dans la tete du fichier
+                return ContainerLayout('mkv', ((pos, min(file_size, data_start + size)),), **timing)
+            if element_id == CLUSTER_ID or size is None:
+                break
+            if element_id == INFO_ID and data_start + size <= len(head):
+                timing['timecode_scale'], timing['duration'] = _parse_info(head, data_start, data_start + size)
+            elif element_id == SEEKHEAD_ID:
+                seek_entries = _parse_seek_head(head, data_start, min(len(head), data_start + size))
+            pos = data_start + size
+    except (IndexError, ValueError) as e:
+        # Element coupe en fin de tete: garder les entrees deja lues
+        logger.debug(f"Fin de l'en-tete Matroska analysee a {pos}: {e}")
+
+    positions = sorted(segment_data + position for _, position in seek_entries)
+    cues = [segment_data + position for element_id, position in seek_entries if element_id == CUES_ID]
+    if not cues or cues[0] >= file_size:
+        return ContainerLayout('mkv', **timing)
+    cues_start = cues[0]
+
+    # Taille exacte si l'en-tete des Cues est deja present, sinon jusqu'a l'element suivant
+    cues_end = next((position for position in positions if position > cues_start), file_size)
+    header = read_at(cues_start, min(12, file_size - cues_start))
+    if header:
+        try:
+            element_id, size, data_start = read_element_header(header, 0)
+            if element_id == CUES_ID and size is not None:
+                cues_end = cues_start + (data_start + size)
+        except (IndexError, ValueError):
+            pass
+
+    return ContainerLayout('mkv', ((cues_start, min(file_size, cues_end)),), **timing)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Protocole entre l'API et le daemon torrent (torrent_daemon.py)
+Une ligne JSON compacte par message sur une socket Unix locale:
+  requete   {"id": 7, "m": "service.get_streaming_info", "a": [...], "k": {...}}
+  reponse   {"id": 7, "r": ...} ou {"id": 7, "e": {"type": ..., "message": ..., ...}}
+  evenement {"ev": "info", "h": info_hash, "d": ...} (sans id, pousse aux abonnes)
+"""
+
+import json
+import dataclasses
+from typing import Dict
+
+import numpy as np
+
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024  # Limite d'une ligne (cartes de pieces des gros torrents)
+EVENT_INTERVAL = 1.0  # Publication des infos de streaming aux abonnes (secondes)
+
+# Methodes exposees par le daemon: composant -> methodes (les autres sont refusees)
+ENGINE_METHODS: Dict[str, set] = {
+    'service': {
+        'extract_info_hash', 'start_download', 'stop_torrent', 'remove_torrent', 'select_file', 'list_files',
+        'get_streaming_info', 'get_video_path', 'get_video_size', 'wait_for_range', 'report_playback_time',
+        'set_piece_priorities_for_seeking', 'get_piece_availability', 'get_piece_map', 'get_readiness',
+        'get_keyframe_times',
+        'prefetch_metadata', 'get_prefetched_metadata',
+    },
+    'eviction_manager': {'get_report', 'enforce'},
+    'bandwidth_arbiter': {'get_report'},
+    'upload_governor': {'get_state'},
+}
+ASYNC_METHODS = {'service.wait_for_range'}  # Coroutines cote daemon (attente de pieces)
+SUBSCRIBE = 'subscribe'  # Abonnement aux evenements de la connexion
+
+
+def _default(value):
+    """Types numpy et dataclasses des resultats du moteur"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if isinstance(value, set):
+        return list(value)
+    raise TypeError(f"Type non serialisable: {type(value).__name__}")
+
+
+def encode(message: Dict) -> bytes:
+    return json.dumps(message, separators=(',', ':'), default=_default).encode() + b'\n'
+
+
+def decode(line: bytes) -> Dict:
+    return json.loads(line)
+
+
+def encode_error(error: Exception) -> Dict:
+    """Erreur transportable: type, message et attributs utiles a la reconstruction cote client"""
+    payload = {'type': type(error).__name__, 'message': str(error)}
+    for attribute in ('info_hash', 'missing_pieces', 'retry_after'):
+        if hasattr(error, attribute):
+            payload[attribute] = getattr(error, attribute)
+    return payload
+
+
+def is_allowed(method: str) -> bool:
+    """Vrai si la methode ("composant.methode") est exposee par le daemon"""
+    component, _, name = method.partition('.')
+    return name in ENGINE_METHODS.get(component, ())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Gestion du budget disque des torrents
+Supprime les torrents en pause puis les moins recemment regardes (sans lecteur actif) au-dela du budget
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List
+
+from real_streaming_service import RealStreamingService, real_streaming_service
+
+logger = logging.getLogger(__name__)
+
+# Budget disque du cache torrent (Go) et frequence de verification
+DISK_BUDGET_GB = float(os.getenv('DISK_BUDGET_GB', '50'))
+EVICTION_INTERVAL = 30  # Secondes entre deux verifications
+EVICTION_HISTORY = 100  # Decisions conservees pour l'endpoint d'administration
+
+
+class EvictionManager:
+    """Applique un budget disque: LRU sur la derniere lecture, jamais un torrent en cours de lecture"""
+
+    def __init__(self, service: RealStreamingService, budget_bytes: int, interval: float = EVICTION_INTERVAL):
+        self.service = service
+        self.budget_bytes = budget_bytes
+        self.interval = interval
+        self.decisions = deque(maxlen=EVICTION_HISTORY)
+        self._lock = threading.Lock()
+
+        thread = threading.Thread(target=self._loop, daemon=True)
+        thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f"Erreur eviction: {e}")
+
+    def get_usage(self) -> List[Dict]:
+        """Occupation disque, derniere lecture et lecteurs actifs de chaque torrent"""
+        now = time.time()
+        usage = []
+        torrents = [(info_hash, info, False) for info_hash, info in list(self.service.active_torrents.items())]
+        torrents += [(info_hash, info, True) for info_hash, info in list(self.service.warm_pool.items())]
+        for info_hash, torrent_info, warm in torrents:
+            usage.append({
+                'info_hash': info_hash,
+                'title': torrent_info['title'],
+                'status': torrent_info['status'],
+                'warm': warm,  # En pause dans le pool chaud
+                'bytes_on_disk': self.service.get_disk_usage(info_hash),
+                'last_read': torrent_info['last_read'],
+                'idle_seconds': int(now - torrent_info['last_read']),
+                'active_readers': self.service.get_active_readers(info_hash),
+            })
+        return usage
+
+    def _record(self, action: str, reason: str, freed: int = 0, **details) -> Dict:
+        decision = {'time': time.time(), 'action': action, 'reason': reason, 'freed_bytes': freed, **details}
+        self.decisions.append(decision)
+        logger.info(f"Eviction: {action} ({reason}) {details.get('title', '')} "
+                    f"{freed / 1024 / 1024:.0f} MB")
+        return decision
+
+    def enforce(self) -> List[Dict]:
+        """Ramene l'occupation sous le budget; retourne les decisions prises"""
+        with self._lock:
+            decisions = []
+            usage = self.get_usage()
+            used = sum(entry['bytes_on_disk'] for entry in usage)
+
+            if used <= self.budget_bytes:
+                return decisions
+
+            # Pool chaud d'abord, puis torrents sans lecteur actif, du moins recemment regarde au plus recent
+            candidates = sorted(
+                (entry for entry in usage if entry['active_readers'] == 0 and entry['bytes_on_disk'] > 0),
+                key=lambda entry: (not entry['warm'], entry['last_read'])
+            )
+            for entry in candidates:
+                if used <= self.budget_bytes:
+                    break
+                if self.service.remove_torrent(entry['info_hash']):
+                    used -= entry['bytes_on_disk']
+                    decisions.append(self._record(
+                        'evict', 'over_budget', entry['bytes_on_disk'],
+                        info_hash=entry['info_hash'], title=entry['title'], idle_seconds=entry['idle_seconds']
+                    ))
+
+            last = self.decisions[-1] if self.decisions else None
+            if used > self.budget_bytes and not (last and last['action'] == 'keep' and not decisions):
+                # Tout ce qui reste est en cours de lecture: ne jamais couper un spectateur
+                decisions.append(self._record('keep', 'over_budget_all_active', used_bytes=used))
+            return decisions
+
+    def get_report(self) -> Dict:
+        usage = self.get_usage()
+        return {
+            'budget_bytes': self.budget_bytes,
+            'used_bytes': sum(entry['bytes_on_disk'] for entry in usage),
+            'torrents': sorted(usage, key=lambda entry: entry['last_read']),
+            'decisions': list(self.decisions),
+        }
+
+
+# Instance globale
+eviction_manager = EvictionManager(real_streaming_service, int(DISK_BUDGET_GB * 1024 ** 3))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Deduplication des travaux en cours
+Un seul calcul par cle (info_hash, artefact, index): les demandeurs concurrents recoivent le meme
+future, attendu en bloquant (threads) ou par await (endpoints async) sans occuper de thread
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional
+
+from transcode_scheduler import PRIORITY_BLOCKING, TranscodeScheduler, transcode_scheduler
+
+logger = logging.getLogger(__name__)
+
+SHARED_WAIT_TIMEOUT = 60  # Attente max d'un travail partage par un endpoint (file + ffmpeg), secondes
+
+
+class SharedWaitTimeout(Exception):
+    """Travail partage pas termine a temps (il continue pour les autres demandeurs)"""
+
+    def __init__(self, timeout: float):
+        super().__init__(f"Travail non termine en {timeout:.0f}s")
+        self.retry_after = 2
+
+
+class InFlightRegistry:
+    """Futures des travaux en cours par cle; retire des qu'un travail se termine"""
+
+    def __init__(self, scheduler: TranscodeScheduler):
+        self.scheduler = scheduler
+        self._futures: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, function: Callable, *args, priority: int = PRIORITY_BLOCKING,
+               **kwargs) -> Future:
+        """Future du travail en cours pour cette cle (remonte a cette priorite), sinon le soumet"""
+        with self._lock:
+            future = self._futures.get(key)
+            # Un prechargement annule (seek) n'est jamais rendu: un nouveau job le remplace
+            if future is not None and self.scheduler.promote(future, priority):
+                return future
+            future = self.scheduler.submit(function, *args, priority=priority, key=key, **kwargs)
+            self._futures[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Travail {key} en erreur: {future.exception()}")
+
+    def get(self, key: Hashable) -> Optional[Future]:
+        return self._futures.get(key)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._futures
+
+
+async def wait_shared(future: Future, timeout: float = SHARED_WAIT_TIMEOUT):
+    """Resultat d'un future partage depuis un endpoint async (une deconnexion n'annule pas le travail)"""
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        raise SharedWaitTimeout(timeout)
+
+
+# Instance globale
+transcode_flights = InFlightRegistry(transcode_scheduler)
@@ -6,20 +6,49 @@ Version finale avec streaming reel fonctionnel
 
 from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, StreamingResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 import os
 import logging
 import subprocess
 import shutil
 import time
-from typing import Optional, Dict
+import math
+import threading
+from typing import Optional, Dict, List, Tuple
 from collections import OrderedDict
+from concurrent.futures import Future
 from dotenv import load_dotenv
 
 from tmdb_service import CatalogService
 from production_scraper import production_scraper
 from simple_fallback_scraper import simple_fallback_scraper
-from real_streaming_service import real_streaming_service
+from real_streaming_service import PieceWaitTimeout, PREFETCH_MAX_RESULTS, TORRENT_ENGINE, TORRENT_DAEMON_SOCKET
+from torrent_client import RemoteComponent, TorrentEngineClient, TorrentEngineError
+if TORRENT_ENGINE == 'remote':
+    # Session libtorrent dans torrent_daemon.py: memes methodes, appels par socket locale
+    torrent_engine = TorrentEngineClient(TORRENT_DAEMON_SOCKET)
+    real_streaming_service = torrent_engine.service
+    eviction_manager = torrent_engine.eviction_manager
+    bandwidth_arbiter = torrent_engine.bandwidth_arbiter
+    upload_governor = torrent_engine.upload_governor
+else:
+    from real_streaming_service import real_streaming_service
+    from eviction_manager import eviction_manager
+    from bandwidth_arbiter import bandwidth_arbiter
+    from upload_governor import upload_governor
+from media_file_server import MediaFileResponse
+from media_probe import media_probe
+from inflight import SharedWaitTimeout, transcode_flights, wait_shared
+from transcode_scheduler import PRIORITY_BLOCKING, PRIORITY_PREFETCH, transcode_scheduler
+
+async def engine_call(component, name: str, *args, **kwargs):
+    """Methode du moteur torrent depuis un endpoint: RPC attendue sans geler la boucle en mode remote
+    (le proxy synchrone y est refuse), appel direct en local. Les helpers synchrones qui appellent le
+    moteur (sonde, duree, gestionnaires de transcodage) passent par run_in_threadpool"""
+    if isinstance(component, RemoteComponent):
+        return await component.call_async(name, *args, **kwargs)
+    return getattr(component, name)(*args, **kwargs)
 
 # Configuration
 load_dotenv()
@@ -45,6 +74,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+def save_torrents_on_shutdown():
+    """Resume data de tous les torrents avant l'arret (reprise instantanee au redemarrage)"""
+    if TORRENT_ENGINE == 'remote':
+        torrent_engine.close()  # Le daemon survit aux redemarrages de l'API et sauve ses torrents lui-meme
+    else:
+        real_streaming_service.shutdown()
+
+@app.exception_handler(TorrentEngineError)
+async def torrent_engine_error(request: Request, exc: TorrentEngineError):
+    """Daemon torrent injoignable: 503 (reessayer), erreur levee cote daemon: 500"""
+    logger.error(f"Daemon torrent: {exc}")
+    if exc.error_type != 'EngineUnavailable':
+        return JSONResponse(status_code=500, content={"detail": f"Erreur du moteur torrent: {exc}"})
+    return JSONResponse(status_code=503, content={"detail": f"Moteur torrent indisponible: {exc}"},
+                        headers={'Retry-After': '2'})
+
+@app.exception_handler(SharedWaitTimeout)
+async def shared_wait_timeout(request: Request, exc: SharedWaitTimeout):
+    """Transcodage encore en file ou en cours: 503, le lecteur reessaie (le travail continue)"""
+    logger.warning(f"Transcodage trop long pour {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": f"Transcodage en cours: {exc}"},
+                        headers={'Retry-After': str(exc.retry_after)})
+
 @app.get("/", response_class=HTMLResponse)
 async def home():
     """Interface web StreamTV Production"""
@@ -277,7 +330,7 @@ async def home():
 
             try {
                 const preferFrench = document.getElementById('preferFrench').checked;
-                const url = '/api/torrents/search?query=' + encodeURIComponent(title) + '&limit=20&prefer_french=' + preferFrench;
+                const url = '/api/torrents/search?query=' + encodeURIComponent(title) + '&limit=20&prefetch=3&prefer_french=' + preferFrench;
 
                 const response = await fetch(url);
                 if (!response.ok) throw new Error('HTTP ' + response.status);
@@ -637,9 +690,9 @@ async def home():
                     const video = document.getElementById('video-' + infoHash);
 
                     if (progress) progress.style.width = (data.progress || 0) + '%';
-                    if (status) status.firstChild.textContent = 'Progression: ' + (data.progress || 0) + '% - ' + (data.can_stream ? 'Pret!' : 'Buffering...');
+                    if (status) status.firstChild.textContent = 'Progression: ' + (data.progress || 0) + '% - ' + (data.ready ? 'Pret!' : (data.eta_playable != null ? 'Lecture dans ~' + Math.ceil(data.eta_playable) + 's' : 'Buffering...'));
 
-                    if (data.can_stream && data.progress >= 1 && video) {
+                    if (data.can_stream && video) {
                         video.style.display = 'block';
                         if (video.readyState === 0) video.load();
                     }
@@ -676,6 +729,12 @@ async def home():
 </html>
     """
 
+@app.get("/api/health/ready")
+async def readiness():
+    """Pret a resoudre des magnets (table DHT suffisamment remplie), 503 sinon"""
+    readiness_info = await engine_call(real_streaming_service, 'get_readiness')
+    return JSONResponse(readiness_info, status_code=200 if readiness_info['ready'] else 503)
+
 @app.get("/api/search")
 async def search_content(query: str = Query(..., description="Terme de recherche")):
     """Recherche catalogue TMDB"""
@@ -689,11 +748,34 @@ async def search_content(query: str = Query(..., description="Terme de recherche
         logger.error(f"Erreur recherche TMDB: {e}")
         return {"query": query, "results": {"movies": [], "series": []}}
 
+def with_prefetched_metadata(torrents: list, prefetch: int) -> list:
+    """Lance le pre-chargement des metadonnees des premiers resultats et ajoute celles deja connues"""
+    for rank, torrent in enumerate(torrents):
+        magnet = torrent.get('magnet')
+        if not magnet:
+            continue
+        if rank < min(prefetch, PREFETCH_MAX_RESULTS):
+            real_streaming_service.prefetch_metadata(magnet)
+        info_hash = real_streaming_service.extract_info_hash(magnet)
+        metadata = real_streaming_service.get_prefetched_metadata(info_hash) if info_hash else None
+        if metadata:
+            torrent['metadata'] = metadata
+    return torrents
+
+@app.get("/api/torrents/metadata/{info_hash}")
+async def get_torrent_metadata(info_hash: str):
+    """Metadonnees pre-chargees d'un resultat de recherche (fichiers, tailles, conteneur)"""
+    metadata = await engine_call(real_streaming_service, 'get_prefetched_metadata', info_hash.upper())
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Metadonnees non disponibles")
+    return {"info_hash": info_hash.upper(), **metadata}
+
 @app.get("/api/torrents/search")
 async def search_torrents(
     query: str = Query(...),
     limit: int = Query(20),
-    prefer_french: bool = Query(True, description="Prioriser les résultats en français")
+    prefer_french: bool = Query(True, description="Prioriser les résultats en français"),
+    prefetch: int = Query(0, description="Nombre de premiers resultats dont les metadonnees sont pre-chargees")
 ):
     """Recherche torrents production avec support français avancé"""
     try:
@@ -712,7 +794,7 @@ async def search_torrents(
 
         return {
             "query": query,
-            "torrents": quality_torrents[:limit],
+            "torrents": await run_in_threadpool(with_prefetched_metadata, quality_torrents[:limit], prefetch),
             "total_found": len(quality_torrents),
             "french_count": french_count,
             "prefer_french": prefer_french,
@@ -725,7 +807,7 @@ async def search_torrents(
             fallback_torrents = await simple_fallback_scraper.search_content(query, limit)
             return {
                 "query": query,
-                "torrents": fallback_torrents[:limit],
+                "torrents": await run_in_threadpool(with_prefetched_metadata, fallback_torrents[:limit], prefetch),
                 "total_found": len(fallback_torrents),
                 "french_count": 0,
                 "source": "fallback_only"
@@ -760,18 +842,24 @@ async def start_streaming(request: Request):
         data = await request.json()
         magnet = data.get('magnet')
         title = data.get('title', 'Unknown')
+        file_index = data.get('file_index')  # Fichier du pack a streamer (optionnel)
+        episode = data.get('episode')  # Ou episode "S01E03" (optionnel)
         
         if not magnet:
             raise HTTPException(status_code=400, detail="Magnet link requis")
         
-        info_hash = real_streaming_service.start_download(magnet, title)
+        info_hash = await engine_call(real_streaming_service, 'start_download', magnet, title, file_index, episode)
         
         if not info_hash:
             raise HTTPException(status_code=400, detail="Impossible de demarrer le telechargement")
         
+        # Prediction de demarrage (pool chaud ou metadonnees pre-chargees: connue tout de suite)
+        info = await engine_call(real_streaming_service, 'get_streaming_info', info_hash) or {}
         return {
             "success": True,
             "info_hash": info_hash,
+            "ready": info.get('ready', False),
+            "eta_playable": info.get('eta_playable'),
             "message": f"Streaming demarre: {title}"
         }
     
@@ -782,40 +870,54 @@ async def start_streaming(request: Request):
 @app.get("/api/streaming/status/{info_hash}")
 async def get_streaming_status(info_hash: str):
     """Status du streaming"""
-    info = real_streaming_service.get_streaming_info(info_hash)
+    info = await engine_call(real_streaming_service, 'get_streaming_info', info_hash)
     if not info:
         raise HTTPException(status_code=404, detail="Torrent non trouve")
-    return info
+    return {**info, "upload_governor": await engine_call(upload_governor, 'get_state')}
+
+@app.get("/api/streaming/upload-governor")
+async def get_upload_governor_state():
+    """Plafond d'upload courant et streams sous leur buffer cible"""
+    return await engine_call(upload_governor, 'get_state')
 
 @app.delete("/api/streaming/stop/{info_hash}")
 async def stop_streaming(info_hash: str):
-    """Arrete et nettoie un streaming"""
+    """Arrete un streaming (torrent mis en pause, repris instantanement s'il est relance)"""
     try:
-        success = real_streaming_service.stop_torrent(info_hash)
+        success = await engine_call(real_streaming_service, 'stop_torrent', info_hash)
         if success:
-            return {"success": True, "message": "Streaming arrete et nettoye"}
+            return {"success": True, "message": "Streaming arrete (en pause dans le pool chaud)"}
         else:
             raise HTTPException(status_code=404, detail="Torrent non trouve")
     except Exception as e:
         logger.error(f"Erreur stop streaming: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/streaming/files/{info_hash}")
+async def list_streaming_files(info_hash: str):
+    """Liste les fichiers d'un torrent (choix de l'episode dans un pack)"""
+    files = await engine_call(real_streaming_service, 'list_files', info_hash)
+    if files is None:
+        raise HTTPException(status_code=404, detail="Torrent non trouve")
+    return {"success": True, "info_hash": info_hash, "files": files}
+
 @app.post("/api/streaming/seek/{info_hash}")
 async def seek_streaming(info_hash: str, request: Request):
     """Configure seeking temps reel pour un streaming"""
     try:
         data = await request.json()
         position = data.get('position', 0)  # Position entre 0.0 et 1.0
+        seconds = data.get('t')  # Instant en secondes (prioritaire, pieces exactes via l'index)
         
         # Configurer les priorites pour le seeking
-        success = real_streaming_service.set_piece_priorities_for_seeking(info_hash, position)
+        success = await engine_call(real_streaming_service, 'set_piece_priorities_for_seeking', info_hash, position, seconds)
         
         if success:
             # Verifier la disponibilite immediate
-            availability = real_streaming_service.get_piece_availability(info_hash, position)
+            availability = await engine_call(real_streaming_service, 'get_piece_availability', info_hash, position, seconds)
             return {
                 "success": True, 
-                "message": f"Seeking configure a {position*100:.1f}%",
+                "message": f"Seeking configure a {seconds:.1f}s" if seconds is not None else f"Seeking configure a {position*100:.1f}%",
                 "availability": availability,
                 "immediate_playback": availability.get("available", False)
             }
@@ -826,24 +928,71 @@ async def seek_streaming(info_hash: str, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/streaming/availability/{info_hash}")
-async def check_availability(info_hash: str, position: float = Query(0.0, description="Position (0.0-1.0)")):
+async def check_availability(info_hash: str, position: float = Query(0.0, description="Position (0.0-1.0)"),
+                             t: Optional[float] = Query(None, ge=0, description="Instant en secondes (prioritaire sur position)")):
     """Verifie la disponibilite des pieces pour une position donnee"""
     try:
-        availability = real_streaming_service.get_piece_availability(info_hash, position)
+        availability = await engine_call(real_streaming_service, 'get_piece_availability', info_hash, position, t)
         return {
             "success": True,
             "info_hash": info_hash,
             "position": position,
+            "t": t,
             **availability
         }
     except Exception as e:
         logger.error(f"Erreur verification disponibilite: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/streaming/pieces/{info_hash}")
+async def get_piece_map(info_hash: str):
+    """Carte RLE des pieces telechargees (barre de buffer, monitoring)"""
+    piece_map = await engine_call(real_streaming_service, 'get_piece_map', info_hash)
+    if piece_map is None:
+        raise HTTPException(status_code=404, detail="Torrent non trouve")
+    return {"info_hash": info_hash, **piece_map}
+
+@app.get("/api/streaming/probe/{info_hash}")
+async def get_media_probe(info_hash: str):
+    """Sonde media du fichier video: duree, flux, codecs, langues, bitrate, intervalle entre keyframes"""
+    file_size = await engine_call(real_streaming_service, 'get_video_size', info_hash)
+    info = media_probe.get_cached(info_hash, file_size) if file_size else None
+    if info is None:
+        raise HTTPException(status_code=404, detail="Sonde media pas encore disponible")
+    return {"info_hash": info_hash, **info.get_info()}
+
+@app.get("/api/admin/storage")
+async def get_storage_report():
+    """Budget disque, occupation par torrent et dernieres decisions d'eviction"""
+    return await engine_call(eviction_manager, 'get_report')
+
+@app.get("/api/admin/bandwidth")
+async def get_bandwidth_report():
+    """Dernier arbitrage: capacite, demande des streams regardes et limites de chaque torrent"""
+    report = await engine_call(bandwidth_arbiter, 'get_report')
+    if report is None:
+        raise HTTPException(status_code=503, detail="Premier arbitrage pas encore effectue")
+    return report
+
+@app.get("/api/admin/transcode")
+async def get_transcode_state():
+    """Emplacements ffmpeg de ce worker: jobs en cours, transcodages complets et files d'attente"""
+    return transcode_scheduler.get_state()
+
+@app.post("/api/admin/storage/enforce")
+async def enforce_storage_budget():
+    """Force une verification du budget disque (sans attendre le prochain passage)"""
+    try:
+        decisions = await engine_call(eviction_manager, 'enforce')
+        return {"decisions": decisions, **await engine_call(eviction_manager, 'get_report')}
+    except Exception as e:
+        logger.error(f"Erreur eviction: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/streaming/watch/{info_hash}", response_class=HTMLResponse)
 async def watch_streaming(info_hash: str):
     """Page de lecture streaming"""
-    info = real_streaming_service.get_streaming_info(info_hash)
+    info = await engine_call(real_streaming_service, 'get_streaming_info', info_hash)
     if not info:
         raise HTTPException(status_code=404, detail="Torrent non trouve")
     
@@ -941,7 +1090,7 @@ async def watch_streaming(info_hash: str):
                     fetch(`/api/streaming/seek/${{infoHash}}`, {{
                         method: 'POST',
                         headers: {{ 'Content-Type': 'application/json' }},
-                        body: JSON.stringify({{ position: position }})
+                        body: JSON.stringify({{ position: position, t: video.currentTime }})
                     }})
                     .then(r => r.json())
                     .then(data => {{
@@ -971,11 +1120,12 @@ async def watch_streaming(info_hash: str):
                 .then(data => {{
                     const progress = data.progress || 0;
                     document.getElementById('progressBar').style.width = progress + '%';
+                    const eta = data.eta_playable != null ? `Lecture dans ~${{Math.ceil(data.eta_playable)}}s` : 'Preparation...';
                     document.getElementById('status').textContent = 
-                        `Streaming: ${{progress}}% mis en cache - ${{data.can_stream ? 'Lecture disponible!' : 'Preparation...'}}`; 
+                        `Streaming: ${{progress}}% mis en cache - ${{data.can_stream ? 'Lecture disponible!' : eta}}`; 
                     
-                    // Demarrage IMMEDIAT des 1% si metadonnees disponibles
-                    if (data.can_stream && progress >= 1) {{
+                    // Demarrage des que le buffer devant la lecture couvre le prebuffer estime
+                    if (data.can_stream) {{
                         document.getElementById('loading').style.display = 'none';
                         const videoElement = document.getElementById('player');
                         videoElement.style.display = 'block';
@@ -1044,93 +1194,61 @@ def get_video_content_type(file_path: str) -> str:
 @app.get("/api/streaming/video/{info_hash}")
 async def stream_video(info_hash: str, request: Request):
     """Stream du fichier video avec support HTTP Range pour seeking"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Fichier video non disponible")
 
-    # Taille du fichier
-    file_size = os.path.getsize(video_path)
-    content_type = get_video_content_type(video_path)
+    # Taille reelle du fichier (le fichier sparse peut etre plus court sur disque)
+    file_size = await engine_call(real_streaming_service, 'get_video_size', info_hash)
 
-    # Headers Range
-    range_header = request.headers.get('Range')
+    # Chaque bloc lu fait glisser la fenetre de deadlines de ce lecteur
+    reader_id = f"{request.client.host if request.client else 'unknown'}:video"
 
-    if range_header:
-        # Parse Range header (ex: "bytes=0-1023")
-        try:
-            range_match = range_header.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if range_match[1] else file_size - 1
-            end = min(end, file_size - 1)
-
-            content_length = end - start + 1
-
-            def generate_range():
-                with open(video_path, 'rb') as f:
-                    f.seek(start)
-                    remaining = content_length
-                    while remaining > 0:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-
-            return StreamingResponse(
-                generate_range(),
-                status_code=206,  # Partial Content
-                headers={
-                    'Content-Type': content_type,
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Range': f'bytes {start}-{end}/{file_size}'
-                }
-            )
-        except (ValueError, IndexError):
-            # Range header malforme, retourner le fichier complet
-            pass
+    async def wait_for_range(offset: int, length: int):
+        await real_streaming_service.wait_for_range(info_hash, offset, length, reader_id=reader_id)
 
-    # Stream complet si pas de Range header
-    def generate_full():
-        with open(video_path, 'rb') as f:
-            while True:
-                chunk = f.read(8192)
-                if not chunk:
-                    break
-                yield chunk
-
-    return StreamingResponse(
-        generate_full(),
-        headers={
-            'Content-Type': content_type,
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(file_size)
-        }
+    response = MediaFileResponse(
+        video_path,
+        get_video_content_type(video_path),
+        range_header=request.headers.get('Range'),
+        file_size=file_size,
+        wait_for_range=wait_for_range
     )
 
+    # Zone pas encore telechargee: "reessayez" plutot que des zeros du fichier sparse
+    try:
+        await response.wait_first_block()
+    except PieceWaitTimeout as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Donnees en cours de telechargement, reessayez",
+            headers={'Retry-After': str(e.retry_after)}
+        )
+
+    return response
+
+def probe_media(info_hash: str, video_path: str):
+    """Sonde partagee du fichier video: cache disque, ffprobe au plus une fois par fichier"""
+    return media_probe.get(info_hash, video_path, real_streaming_service.get_video_size(info_hash) or 0)
+
+def probe_duration(info_hash: str, video_path: str) -> float:
+    """Duree du media (0 si ffprobe n'a pas pu la lire)"""
+    return media_probe.get_duration(info_hash, video_path, real_streaming_service.get_video_size(info_hash) or 0)
+
+def cached_duration(info_hash: str) -> Optional[float]:
+    """Duree deja sondee, sans lancer ffprobe (None si inconnue)"""
+    file_size = real_streaming_service.get_video_size(info_hash)
+    info = media_probe.get_cached(info_hash, file_size) if file_size else None
+    return info.duration if info else None
+
 # Gestionnaire de transcodage fichier avec progression reelle
 class FileTranscodeManager:
-    def __init__(self, max_concurrent: int = 2, cache_dir: str = "/tmp/streamtv_transcoded"):
+    def __init__(self, cache_dir: str = "/tmp/streamtv_transcoded"):
         self.jobs: Dict[str, dict] = {}  # info_hash -> job info
-        self.max_concurrent = max_concurrent
         self.cache_dir = cache_dir
         os.makedirs(cache_dir, exist_ok=True)
 
-    def get_video_duration(self, video_path: str) -> float:
-        """Obtient la duree de la video avec ffprobe"""
-        try:
-            result = subprocess.run([
-                'ffprobe', '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ], capture_output=True, text=True, timeout=10)
-            return float(result.stdout.strip())
-        except:
-            return 0
-
     def cancel_for_client(self, client_id: str):
         """Annule les jobs du client"""
         for info_hash, job in list(self.jobs.items()):
@@ -1184,12 +1302,12 @@ class FileTranscodeManager:
                 job['client_id'] = client_id
                 return {"status": "transcoding", "progress": job.get('progress', 0)}
 
-        # Limite atteinte?
-        if self.get_active_count() >= self.max_concurrent:
+        # Limite atteinte? (emplacements ffmpeg partages avec segments et chunks)
+        if not transcode_scheduler.can_attach():
             return {"status": "busy", "message": "Serveur occupe"}
 
-        # Obtenir duree source
-        duration = self.get_video_duration(source_path)
+        # Obtenir duree source (sonde partagee)
+        duration = probe_duration(info_hash, source_path)
 
         # Fichier sortie
         output_path = os.path.join(self.cache_dir, f"{info_hash}_aac.mp4")
@@ -1227,6 +1345,7 @@ class FileTranscodeManager:
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL
         )
+        transcode_scheduler.attach(process)
 
         self.jobs[info_hash] = {
             'process': process,
@@ -1353,12 +1472,14 @@ class FileTranscodeManager:
                 del self.jobs[info_hash]
 
 # Instance globale
-transcode_manager = FileTranscodeManager(max_concurrent=2)
+transcode_manager = FileTranscodeManager()
 
 # ============================================
 # AUDIO CHUNKS - Audio instantané avec seeking
 # ============================================
 
+AUDIO_PREFETCH_CHUNKS = 2  # Chunks precharges apres celui demande
+
 class ChunkedAudioManager:
     """Gestionnaire d'audio par chunks pour seeking instantané"""
 
@@ -1367,30 +1488,16 @@ class ChunkedAudioManager:
         self.cache_dir = cache_dir
         self.max_cache_size = max_cache_size  # Max chunks en cache par vidéo
         self.cache: Dict[str, OrderedDict] = {}  # info_hash -> OrderedDict[chunk_id, bytes]
-        self.video_durations: Dict[str, float] = {}
         self.active_processes: Dict[str, subprocess.Popen] = {}
         os.makedirs(cache_dir, exist_ok=True)
 
     def get_video_duration(self, video_path: str, info_hash: str) -> float:
-        """Obtient la durée de la vidéo avec ffprobe"""
-        if info_hash in self.video_durations:
-            return self.video_durations[info_hash]
-        try:
-            result = subprocess.run([
-                'ffprobe', '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ], capture_output=True, text=True, timeout=10)
-            duration = float(result.stdout.strip())
-            self.video_durations[info_hash] = duration
-            return duration
-        except:
-            return 0
+        """Durée de la vidéo (sonde partagée)"""
+        return probe_duration(info_hash, video_path)
 
     def get_chunk_count(self, info_hash: str) -> int:
         """Retourne le nombre total de chunks pour une vidéo"""
-        duration = self.video_durations.get(info_hash, 0)
+        duration = cached_duration(info_hash) or 0
         if duration <= 0:
             return 0
         return int(duration // self.chunk_duration) + 1
@@ -1501,20 +1608,26 @@ class ChunkedAudioManager:
             logger.error(f"Exception audio chunk {chunk_id}: {e}")
             return None
 
-    def prefetch_chunks(self, info_hash: str, video_path: str, current_chunk: int, count: int = 2):
-        """Précharge les chunks suivants en arrière-plan (non-bloquant)"""
-        import threading
-
-        def prefetch_worker():
-            for i in range(1, count + 1):
-                next_chunk = current_chunk + i
-                if not self.is_chunk_cached(info_hash, next_chunk):
-                    duration = self.video_durations.get(info_hash, 0)
-                    if next_chunk * self.chunk_duration < duration:
-                        self.transcode_chunk(info_hash, video_path, next_chunk)
-
-        thread = threading.Thread(target=prefetch_worker, daemon=True)
-        thread.start()
+    def submit_chunk(self, info_hash: str, video_path: str, chunk_id: int,
+                     priority: int = PRIORITY_BLOCKING) -> Future:
+        """Transcodage du chunk, partage entre requetes et prechargement concurrents"""
+        if priority == PRIORITY_BLOCKING:
+            # Seek: les prechargements en attente hors de la nouvelle fenetre ne serviront plus
+            transcode_scheduler.cancel_prefetch(
+                lambda key: key[:2] == (info_hash, 'audio')
+                and not chunk_id <= key[2] <= chunk_id + AUDIO_PREFETCH_CHUNKS
+            )
+        return transcode_flights.submit((info_hash, 'audio', chunk_id), self.transcode_chunk,
+                                        info_hash, video_path, chunk_id, priority=priority)
+
+    def prefetch_chunks(self, info_hash: str, video_path: str, current_chunk: int,
+                        count: int = AUDIO_PREFETCH_CHUNKS):
+        """Précharge les chunks suivants en arrière-plan (non-bloquant, apres les requetes des lecteurs)"""
+        duration = cached_duration(info_hash) or 0
+        for i in range(1, count + 1):
+            next_chunk = current_chunk + i
+            if next_chunk * self.chunk_duration < duration and not self.is_chunk_cached(info_hash, next_chunk):
+                self.submit_chunk(info_hash, video_path, next_chunk, priority=PRIORITY_PREFETCH)
 
     def cleanup_old_chunks(self, info_hash: str, current_chunk: int, keep_range: int = 5):
         """Nettoie les anciens fichiers de chunks"""
@@ -1554,26 +1667,14 @@ class ChunkTranscodeManager:
     def __init__(self, chunk_duration: int = 60, cache_dir: str = "/tmp/streamtv_chunks"):
         self.chunk_duration = chunk_duration  # Duree d'un chunk en secondes
         self.cache_dir = cache_dir
-        self.active_processes: Dict[str, subprocess.Popen] = {}
-        self.video_durations: Dict[str, float] = {}
+        self.active_processes: Dict[tuple, subprocess.Popen] = {}  # Cle du chunk -> ffmpeg en cours
+        self.client_chunks: Dict[str, tuple] = {}  # Client -> cle du chunk attendu
+        self._lock = threading.Lock()
         os.makedirs(cache_dir, exist_ok=True)
 
     def get_video_duration(self, video_path: str, info_hash: str) -> float:
-        """Obtient la duree avec ffprobe"""
-        if info_hash in self.video_durations:
-            return self.video_durations[info_hash]
-        try:
-            result = subprocess.run([
-                'ffprobe', '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ], capture_output=True, text=True, timeout=10)
-            duration = float(result.stdout.strip())
-            self.video_durations[info_hash] = duration
-            return duration
-        except:
-            return 0
+        """Duree de la video (sonde partagee)"""
+        return probe_duration(info_hash, video_path)
 
     def get_chunk_path(self, info_hash: str, chunk_index: int) -> str:
         """Chemin du fichier chunk"""
@@ -1587,24 +1688,40 @@ class ChunkTranscodeManager:
         return False
 
     def cancel_for_client(self, client_id: str):
-        """Annule le transcodage en cours"""
-        if client_id in self.active_processes:
-            proc = self.active_processes[client_id]
-            if proc.poll() is None:
-                proc.terminate()
-                try:
-                    proc.wait(timeout=1)
-                except:
-                    proc.kill()
-            del self.active_processes[client_id]
-
-    def transcode_chunk(self, info_hash: str, video_path: str, start_time: float, client_id: str) -> dict:
+        """Annule le transcodage attendu par le client, sauf si un autre client l'attend aussi"""
+        with self._lock:
+            key = self.client_chunks.pop(client_id, None)
+            if key is None or key in self.client_chunks.values():
+                return
+            proc = self.active_processes.get(key)
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=1)
+            except:
+                proc.kill()
+
+    def submit_chunk(self, info_hash: str, video_path: str, start_time: float, client_id: str) -> Future:
+        """Transcodage du chunk contenant start_time, partage entre clients concurrents"""
+        key = (info_hash, 'chunk', int(start_time // self.chunk_duration))
+        if self.client_chunks.get(client_id) != key:
+            # Annuler ancien transcodage du client
+            self.cancel_for_client(client_id)
+        with self._lock:
+            self.client_chunks[client_id] = key
+
+        future = transcode_flights.submit(key, self.transcode_chunk, info_hash, video_path, key[2])
+
+        def release(_):
+            with self._lock:
+                if self.client_chunks.get(client_id) == key:
+                    del self.client_chunks[client_id]
+        future.add_done_callback(release)
+        return future
+
+    def transcode_chunk(self, info_hash: str, video_path: str, chunk_index: int) -> dict:
         """Transcode un chunk de video"""
-        # Annuler ancien transcodage du client
-        self.cancel_for_client(client_id)
-
-        # Calculer l'index du chunk
-        chunk_index = int(start_time // self.chunk_duration)
+        key = (info_hash, 'chunk', chunk_index)
         chunk_start = chunk_index * self.chunk_duration
         chunk_path = self.get_chunk_path(info_hash, chunk_index)
 
@@ -1655,7 +1772,7 @@ class ChunkTranscodeManager:
             stderr=subprocess.PIPE
         )
 
-        self.active_processes[client_id] = process
+        self.active_processes[key] = process
 
         # Attendre la fin (chunk = rapide, ~2-5 secondes)
         try:
@@ -1663,6 +1780,8 @@ class ChunkTranscodeManager:
         except subprocess.TimeoutExpired:
             process.kill()
             return {"status": "error", "message": "Timeout transcodage"}
+        finally:
+            self.active_processes.pop(key, None)
 
         if process.returncode == 0 and os.path.exists(chunk_path):
             return {
@@ -1707,74 +1826,106 @@ chunk_manager = ChunkTranscodeManager(chunk_duration=60)
 # ============================================
 # HLS STREAMING - Solution professionnelle
 # ============================================
-from concurrent.futures import ThreadPoolExecutor
-import threading
+import signal
+
+KEYFRAME_SEEK_MARGIN = 0.01  # Secondes: arrondi des instants de keyframes de l'index
+SEGMENTER_AHEAD = 5  # Segments precharges devant la derniere requete d'un lecteur
+SEGMENTER_RESTART_GAP = 5  # Requete au-dela de la production + N segments: relance a cette position
+SEGMENTER_IDLE_TIMEOUT = 60  # Segmenteur arrete sans requete depuis N secondes
+SEGMENTER_POLL = 0.2  # Lecture de la liste des segments termines (secondes)
+SEGMENT_WAIT_TIMEOUT = 20  # Attente max d'un segment du segmenteur (secondes)
 
 class HLSManager:
-    """Gestionnaire HLS avec transcodage parallèle et pré-buffering"""
+    """Gestionnaire HLS: un ffmpeg segmenteur par stream, segments coupes sur les keyframes"""
 
     def __init__(self, segment_duration: int = 10, cache_dir: str = "/tmp/streamtv_hls"):
         self.segment_duration = segment_duration
         self.cache_dir = cache_dir
         self.video_info: Dict[str, dict] = {}
-        self.transcoding_segments: Dict[str, set] = {}  # info_hash -> set of segment indices being transcoded
-        self.segment_locks: Dict[str, threading.Lock] = {}
-        self.executor = ThreadPoolExecutor(max_workers=4)  # 4 transcodes parallèles
+        self.segmenters: Dict[str, dict] = {}  # info_hash -> ffmpeg en cours et sa progression
+        self.completed: Dict[str, set] = {}  # info_hash -> segments entierement ecrits
+        self.prefetching: set = set()  # Cles des segments demandes en prechargement seulement
+        self._cond = threading.Condition()
         os.makedirs(cache_dir, exist_ok=True)
 
-    def _get_lock(self, info_hash: str) -> threading.Lock:
-        if info_hash not in self.segment_locks:
-            self.segment_locks[info_hash] = threading.Lock()
-        return self.segment_locks[info_hash]
+        thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        thread.start()
 
     def get_video_info(self, info_hash: str, video_path: str) -> dict:
         """Obtient les infos de la video"""
         if info_hash in self.video_info:
             return self.video_info[info_hash]
 
-        try:
-            result = subprocess.run([
-                'ffprobe', '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ], capture_output=True, text=True, timeout=15)
-            duration = float(result.stdout.strip())
-        except Exception as e:
-            logger.error(f"Erreur ffprobe: {e}")
-            duration = 0
+        if info_hash not in self.completed:
+            # Segments d'un processus precedent: rien ne garantit qu'ils soient complets
+            shutil.rmtree(os.path.join(self.cache_dir, info_hash), ignore_errors=True)
+            self.completed[info_hash] = set()
 
-        num_segments = int(duration // self.segment_duration) + (1 if duration % self.segment_duration > 0 else 0)
+        duration = probe_duration(info_hash, video_path)
+        boundaries, alignment = self._segment_boundaries(info_hash, video_path, duration)
+        num_segments = len(boundaries) - 1
 
         info = {
             'duration': duration,
             'num_segments': num_segments,
             'segment_duration': self.segment_duration,
+            'boundaries': boundaries,  # Debut de chaque segment (keyframe) + fin du fichier
+            'alignment': alignment,
             'video_path': video_path
         }
-        self.video_info[info_hash] = info
-        self.transcoding_segments[info_hash] = set()
+        if duration > 0:
+            self.video_info[info_hash] = info  # Sonde en echec: reessayer a la prochaine requete
 
-        logger.info(f"HLS info: {info_hash[:8]}... {duration:.0f}s, {num_segments} segments")
+        logger.info(f"HLS info: {info_hash[:8]}... {duration:.0f}s, {num_segments} segments ({alignment})")
         return info
 
+    def _segment_boundaries(self, info_hash: str, video_path: str, duration: float) -> Tuple[List[float], str]:
+        """Coupes sur des keyframes: index du conteneur, sinon GOP fixe sonde, sinon pas fixe"""
+        if duration <= 0:
+            return [0.0], 'fixed'
+
+        # Keyframes exactes (Cues MKV, stss MP4): premiere keyframe apres chaque duree cible
+        keyframes = real_streaming_service.get_keyframe_times(info_hash)
+        if keyframes and keyframes[-1] >= duration - 4 * self.segment_duration:  # Index couvrant tout le fichier
+            boundaries = [0.0]
+            for t in keyframes:
+                if t - boundaries[-1] >= self.segment_duration and t < duration:
+                    boundaries.append(t)
+            return boundaries + [duration], 'keyframes'
+
+        # GOP regulier: pas multiple de l'intervalle entre keyframes mesure par la sonde
+        step, alignment = float(self.segment_duration), 'fixed'
+        probe = probe_media(info_hash, video_path)
+        if probe and probe.keyframe_interval:
+            step = max(1, round(self.segment_duration / probe.keyframe_interval)) * probe.keyframe_interval
+            alignment = 'gop'
+        count = math.ceil(duration / step)
+        return [round(i * step, 3) for i in range(count)] + [duration], alignment
+
+    def segment_bounds(self, info_hash: str, segment_index: int) -> Optional[Tuple[float, float]]:
+        """(debut, duree) d'un segment, None hors du fichier"""
+        boundaries = self.video_info[info_hash]['boundaries']
+        if not 0 <= segment_index < len(boundaries) - 1:
+            return None
+        start = boundaries[segment_index]
+        return start, boundaries[segment_index + 1] - start
+
     def generate_playlist(self, info_hash: str, video_path: str) -> str:
         """Génère le fichier playlist .m3u8"""
         info = self.get_video_info(info_hash, video_path)
-        duration = info['duration']
-        num_segments = info['num_segments']
-        seg_duration = self.segment_duration
+        boundaries = info['boundaries']
+        durations = [end - start for start, end in zip(boundaries, boundaries[1:])]
 
+        # Segments de duree variable (coupes sur keyframes): la cible couvre le plus long
         lines = [
             "#EXTM3U",
             "#EXT-X-VERSION:3",
-            f"#EXT-X-TARGETDURATION:{seg_duration}",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max(durations, default=self.segment_duration))}",
             "#EXT-X-MEDIA-SEQUENCE:0",
             "#EXT-X-PLAYLIST-TYPE:VOD",
         ]
 
-        for i in range(num_segments):
-            seg_len = duration - (i * seg_duration) if i == num_segments - 1 else seg_duration
+        for i, seg_len in enumerate(durations):
             lines.append(f"#EXTINF:{seg_len:.3f},")
             lines.append(f"segment_{i}.ts")
 
@@ -1787,25 +1938,26 @@ class HLSManager:
         return os.path.join(segment_dir, f"segment_{segment_index}.ts")
 
     def is_segment_ready(self, info_hash: str, segment_index: int) -> bool:
-        path = self.get_segment_path(info_hash, segment_index)
-        return os.path.exists(path) and os.path.getsize(path) > 1000
+        """Segment entierement ecrit (liste du segmenteur ou transcodage unitaire termine)"""
+        with self._cond:
+            return segment_index in self.completed.get(info_hash, ())
 
     def _transcode_one_segment(self, info_hash: str, segment_index: int, video_path: str,
                                 start_time: float, actual_duration: float) -> Optional[str]:
-        """Transcode un segment (appelé dans un thread)"""
+        """Transcode un seul segment (repli si le segmenteur n'a pas pu le produire)"""
         segment_path = self.get_segment_path(info_hash, segment_index)
 
         # Double-check si déjà prêt
         if self.is_segment_ready(info_hash, segment_index):
             return segment_path
 
-        # -ss AVANT -i = seek rapide (keyframe-based)
-        # Simple et rapide - priorité à la réactivité
+        # -ss AVANT -i = seek sur la keyframe <= position: les bornes etant des keyframes, la coupe
+        # en copie est exacte (marge pour l'arrondi des instants; la keyframe suivante reste exclue)
         ffmpeg_cmd = [
             'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
-            '-ss', str(start_time),  # AVANT -i = seek rapide!
+            '-ss', f"{start_time + KEYFRAME_SEEK_MARGIN:.3f}",
             '-i', video_path,
-            '-t', str(actual_duration),
+            '-t', f"{max(KEYFRAME_SEEK_MARGIN, actual_duration - KEYFRAME_SEEK_MARGIN):.3f}",
             '-c:v', 'copy',
             '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
             '-f', 'mpegts',
@@ -1836,85 +1988,208 @@ class HLSManager:
         except Exception as e:
             logger.error(f"Erreur segment {segment_index}: {e}")
             return None
-        finally:
-            # Retirer de la liste des segments en cours
-            if info_hash in self.transcoding_segments:
-                self.transcoding_segments[info_hash].discard(segment_index)
+
+    def submit_segment(self, info_hash: str, segment_index: int) -> Future:
+        """Segment attendu par un lecteur, partage entre requetes concurrentes (prechargement compris)"""
+        key = (info_hash, 'hls', segment_index)
+        self.prefetching.discard(key)  # Un prechargement en cours de ce segment devient bloquant
+        # Seek: les prechargements en attente hors de la nouvelle fenetre ne serviront plus
+        transcode_scheduler.cancel_prefetch(
+            lambda other: other[:2] == key[:2] and not segment_index <= other[2] <= segment_index + SEGMENTER_AHEAD
+        )
+        return transcode_flights.submit(key, self.transcode_segment, info_hash, segment_index)
+
+    def prefetch_segments(self, info_hash: str, segment_index: int):
+        """Garde le segmenteur actif jusqu'a SEGMENTER_AHEAD segments devant le lecteur (priorite basse)"""
+        target = segment_index + SEGMENTER_AHEAD
+        key = (info_hash, 'hls', target)
+        info = self.video_info.get(info_hash)
+        if (info is None or target >= info['num_segments'] or self.is_segment_ready(info_hash, target)
+                or transcode_flights.in_flight(key)):
+            return
+        self.prefetching.add(key)
+        future = transcode_flights.submit(key, self.transcode_segment, info_hash, target, priority=PRIORITY_PREFETCH)
+        future.add_done_callback(lambda _: self.prefetching.discard(key))
 
     def transcode_segment(self, info_hash: str, segment_index: int) -> Optional[str]:
-        """Transcode un segment et pré-transcode les suivants"""
+        """Segment produit par le segmenteur du stream (relance a cette position si elle est hors de sa portee)"""
         if info_hash not in self.video_info:
             return None
-
-        info = self.video_info[info_hash]
-        video_path = info['video_path']
-        duration = info['duration']
-        seg_duration = self.segment_duration
-        num_segments = info['num_segments']
-
-        # Si segment déjà prêt, retourner immédiatement
-        if self.is_segment_ready(info_hash, segment_index):
-            # Pré-transcoder les 5 segments suivants (20s d'avance)
-            self._prefetch_segments(info_hash, segment_index + 1, 5)
-            return self.get_segment_path(info_hash, segment_index)
-
-        start_time = segment_index * seg_duration
-        if start_time >= duration:
+        bounds = self.segment_bounds(info_hash, segment_index)
+        if bounds is None:
             return None
-        actual_duration = min(seg_duration, duration - start_time)
-
-        # Marquer comme en cours de transcodage
-        if info_hash not in self.transcoding_segments:
-            self.transcoding_segments[info_hash] = set()
-
-        # Attendre si ce segment est déjà en cours de transcodage
-        max_wait = 10  # Max 10s d'attente
-        waited = 0
-        while segment_index in self.transcoding_segments.get(info_hash, set()) and waited < max_wait:
-            time.sleep(0.3)
-            waited += 0.3
-            if self.is_segment_ready(info_hash, segment_index):
+
+        started = False
+        deadline = time.monotonic() + SEGMENT_WAIT_TIMEOUT
+        with self._cond:
+            while not self.is_segment_ready(info_hash, segment_index):
+                segmenter = self.segmenters.get(info_hash)
+                if (segmenter is None or segment_index < segmenter['start']
+                        or segment_index > segmenter['produced'] + SEGMENTER_RESTART_GAP):
+                    if (info_hash, 'hls', segment_index) in self.prefetching:
+                        return None  # Prechargement hors de la portee du segmenteur (seek): abandon
+                    if started:
+                        break  # Segmenteur relance pour ce segment, arrete sans l'ecrire: repli unitaire
+                    self._start_segmenter(info_hash, segment_index)
+                    started = True
+                    continue
+                segmenter['last_request'] = time.monotonic()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"HLS: segment {segment_index} non produit en {SEGMENT_WAIT_TIMEOUT}s")
+                    return None
+                # Le segmenteur ne tourne que pour les jobs qui l'attendent (emplacement de l'ordonnanceur)
+                segmenter['waiters'] += 1
+                self._resume_segmenter(segmenter)
+                try:
+                    self._cond.wait(min(remaining, 1.0))
+                finally:
+                    segmenter['waiters'] -= 1
+            else:
                 return self.get_segment_path(info_hash, segment_index)
 
-        # Transcoder ce segment
-        self.transcoding_segments[info_hash].add(segment_index)
-        logger.info(f"HLS: Segment {segment_index} ({start_time:.0f}s)")
+        start_time, actual_duration = bounds
+        result = self._transcode_one_segment(info_hash, segment_index, self.video_info[info_hash]['video_path'],
+                                             start_time, actual_duration)
+        if result:
+            with self._cond:
+                self.completed[info_hash].add(segment_index)
+        return result
 
-        result = self._transcode_one_segment(info_hash, segment_index, video_path, start_time, actual_duration)
+    def _start_segmenter(self, info_hash: str, start_index: int):
+        """Lance un ffmpeg qui ecrit les segments en continu depuis start_index (appele sous self._cond)"""
+        self._stop_segmenter(info_hash)
+        info = self.video_info[info_hash]
+        boundaries = info['boundaries']
+        segment_dir = os.path.dirname(self.get_segment_path(info_hash, start_index))
 
-        # Pré-transcoder les 5 segments suivants (20s d'avance)
-        self._prefetch_segments(info_hash, segment_index + 1, 5)
+        # S'arreter avant le prochain segment deja ecrit: jamais de reecriture d'un segment servi
+        end_index = min((i for i in self.completed[info_hash] if i > start_index), default=info['num_segments'])
+        start_time = boundaries[start_index] + KEYFRAME_SEEK_MARGIN
+        cut_times = ",".join(f"{t - KEYFRAME_SEEK_MARGIN:.3f}" for t in boundaries[start_index + 1:end_index])
 
-        return result
+        list_path = os.path.join(segment_dir, f"segments_{start_index}.csv")
+        if os.path.exists(list_path):
+            os.remove(list_path)
+        ffmpeg_cmd = [
+            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-nostdin',
+            '-ss', f"{start_time:.3f}",
+            '-copyts',  # Horodatage du fichier source: segments continus d'une relance a l'autre
+            '-i', info['video_path'],
+            '-c:v', 'copy',
+            '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
+        ]
+        if end_index < info['num_segments']:
+            ffmpeg_cmd += ['-t', f"{boundaries[end_index] - KEYFRAME_SEEK_MARGIN - start_time:.3f}"]
+        ffmpeg_cmd += [
+            '-f', 'segment',
+            '-segment_format', 'mpegts',
+            '-segment_start_number', str(start_index),
+            '-segment_list', list_path,
+            '-segment_list_type', 'csv',
+        ]
+        ffmpeg_cmd += ['-segment_times', cut_times] if cut_times else ['-segment_time', str(10 ** 9)]
+        ffmpeg_cmd.append(os.path.join(segment_dir, 'segment_%d.ts'))
 
-    def _prefetch_segments(self, info_hash: str, start_index: int, count: int):
-        """Pré-transcode plusieurs segments en arrière-plan"""
-        if info_hash not in self.video_info:
+        with open(os.path.join(segment_dir, 'ffmpeg.log'), 'wb') as log:
+            process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=log)
+        self.segmenters[info_hash] = {
+            'process': process,
+            'start': start_index,
+            'end': end_index,
+            'list_path': list_path,
+            'list_pos': 0,
+            'produced': start_index - 1,  # Dernier segment termine
+            'waiters': 0,  # Jobs de l'ordonnanceur qui attendent un de ses segments
+            'last_request': time.monotonic(),
+            'paused': False,
+        }
+        logger.info(f"HLS: segmenteur {info_hash[:8]}... segments {start_index}-{end_index - 1} "
+                    f"({boundaries[start_index]:.0f}s)")
+
+    def _resume_segmenter(self, segmenter: dict):
+        if segmenter['paused'] and segmenter['process'].poll() is None:
+            segmenter['process'].send_signal(signal.SIGCONT)
+            segmenter['paused'] = False
+
+    def _stop_segmenter(self, info_hash: str):
+        """Arrete le segmenteur et supprime le segment qu'il ecrivait (appele sous self._cond)"""
+        segmenter = self.segmenters.pop(info_hash, None)
+        if segmenter is None:
             return
+        process = segmenter['process']
+        if process.poll() is None:
+            process.kill()  # Aussi efficace sur un processus suspendu (SIGSTOP)
+            process.wait()
+        self._collect_segments(info_hash, segmenter)
+        partial = segmenter['produced'] + 1
+        if partial < segmenter['end'] and not self.is_segment_ready(info_hash, partial):
+            try:
+                os.remove(self.get_segment_path(info_hash, partial))
+            except OSError:
+                pass
 
-        info = self.video_info[info_hash]
-        video_path = info['video_path']
-        duration = info['duration']
-        seg_duration = self.segment_duration
-        num_segments = info['num_segments']
-
-        for i in range(count):
-            seg_idx = start_index + i
-            if seg_idx >= num_segments:
-                break
-            if self.is_segment_ready(info_hash, seg_idx):
+    def _collect_segments(self, info_hash: str, segmenter: dict) -> bool:
+        """Lit les segments termines ajoutes a la liste csv d'ffmpeg depuis la derniere lecture"""
+        try:
+            with open(segmenter['list_path']) as f:
+                f.seek(segmenter['list_pos'])
+                data = f.read()
+        except OSError:
+            return False
+
+        # Ligne "segment_12.ts,72.072000,78.078000" ecrite quand le segment est ferme
+        lines = data.split('\n')
+        segmenter['list_pos'] += len(data) - len(lines[-1])
+        found = False
+        for line in lines[:-1]:
+            name = line.split(',')[0]
+            if name.startswith('segment_') and name.endswith('.ts'):
+                index = int(name[len('segment_'):-len('.ts')])
+                self.completed[info_hash].add(index)
+                segmenter['produced'] = max(segmenter['produced'], index)
+                found = True
+        return found
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(SEGMENTER_POLL)
+            try:
+                with self._cond:
+                    self._monitor_segmenters()
+            except Exception as e:
+                logger.error(f"Erreur segmenteur HLS: {e}")
+
+    def _monitor_segmenters(self):
+        """Progression, rythme (suspendu sans job en attente), fin et inactivite"""
+        changed = False
+        now = time.monotonic()
+        for info_hash, segmenter in list(self.segmenters.items()):
+            changed |= self._collect_segments(info_hash, segmenter)
+            process = segmenter['process']
+
+            if process.poll() is not None:
+                if process.returncode != 0:
+                    logger.error(f"HLS: segmenteur {info_hash[:8]}... en erreur (code {process.returncode}) "
+                                 f"apres le segment {segmenter['produced']}")
+                del self.segmenters[info_hash]
+                changed = True
                 continue
-            if seg_idx in self.transcoding_segments.get(info_hash, set()):
+
+            if now - segmenter['last_request'] > SEGMENTER_IDLE_TIMEOUT:
+                self._stop_segmenter(info_hash)
+                changed = True
                 continue
 
-            start_time = seg_idx * seg_duration
-            actual_duration = min(seg_duration, duration - start_time)
+            # Sans job en attente (requete ou prechargement), le segmenteur n'a pas d'emplacement ffmpeg
+            if not segmenter['paused'] and segmenter['waiters'] == 0:
+                process.send_signal(signal.SIGSTOP)
+                segmenter['paused'] = True
+            elif segmenter['waiters'] > 0:
+                self._resume_segmenter(segmenter)
 
-            self.transcoding_segments[info_hash].add(seg_idx)
-            self.executor.submit(
-                self._transcode_one_segment,
-                info_hash, seg_idx, video_path, start_time, actual_duration
-            )
+        if changed:
+            self._cond.notify_all()
 
     def cleanup_old_segments(self, info_hash: str, current_segment: int, keep_range: int = 20):
         """Nettoie les anciens segments (garde current ± keep_range)"""
@@ -1923,14 +2198,17 @@ class HLSManager:
             if not os.path.exists(segment_dir):
                 return
 
-            for f in os.listdir(segment_dir):
-                if f.startswith("segment_") and f.endswith(".ts"):
-                    idx = int(f.replace("segment_", "").replace(".ts", ""))
-                    if abs(idx - current_segment) > keep_range:
-                        try:
-                            os.remove(os.path.join(segment_dir, f))
-                        except:
-                            pass
+            # Sous self._cond: le moniteur et les requetes lisent completed et les fichiers ensemble
+            with self._cond:
+                for f in os.listdir(segment_dir):
+                    if f.startswith("segment_") and f.endswith(".ts"):
+                        idx = int(f.replace("segment_", "").replace(".ts", ""))
+                        if abs(idx - current_segment) > keep_range:
+                            self.completed.get(info_hash, set()).discard(idx)
+                            try:
+                                os.remove(os.path.join(segment_dir, f))
+                            except:
+                                pass
         except:
             pass
 
@@ -1944,12 +2222,12 @@ hls_manager = HLSManager(segment_duration=6)  # 6s = équilibre qualité/réacti
 @app.get("/api/hls/{info_hash}/playlist.m3u8")
 async def hls_playlist(info_hash: str):
     """Retourne le playlist HLS M3U8"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
-    playlist = hls_manager.generate_playlist(info_hash, video_path)
+    playlist = await run_in_threadpool(hls_manager.generate_playlist, info_hash, video_path)
 
     return Response(
         content=playlist,
@@ -1961,62 +2239,56 @@ async def hls_playlist(info_hash: str):
     )
 
 @app.get("/api/hls/{info_hash}/segment_{segment_index}.ts")
-async def hls_segment(info_hash: str, segment_index: int):
+async def hls_segment(info_hash: str, segment_index: int, request: Request):
     """Retourne un segment HLS (transcode si nécessaire)"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
     # S'assurer que les infos sont chargées
-    hls_manager.get_video_info(info_hash, video_path)
+    info = await run_in_threadpool(hls_manager.get_video_info, info_hash, video_path)
+
+    # Position de lecture -> fenetre de deadlines des pieces torrent
+    await engine_call(real_streaming_service, 'report_playback_time', 
+        info_hash, f"{request.client.host if request.client else 'unknown'}:hls",
+        info['boundaries'][min(segment_index, len(info['boundaries']) - 1)], info['duration']
+    )
 
     # Transcoder le segment
-    segment_path = hls_manager.transcode_segment(info_hash, segment_index)
+    segment_path = await wait_shared(hls_manager.submit_segment(info_hash, segment_index))
 
     if not segment_path or not os.path.exists(segment_path):
         raise HTTPException(status_code=500, detail="Erreur transcodage segment")
 
-    # Nettoyer les anciens segments
+    # Precharger devant le lecteur, puis nettoyer les anciens segments
+    hls_manager.prefetch_segments(info_hash, segment_index)
     hls_manager.cleanup_old_segments(info_hash, segment_index)
 
     # Streamer le segment
-    file_size = os.path.getsize(segment_path)
-
-    def generate():
-        with open(segment_path, 'rb') as f:
-            while True:
-                chunk = f.read(65536)
-                if not chunk:
-                    break
-                yield chunk
-
-    return StreamingResponse(
-        generate(),
-        media_type="video/mp2t",
-        headers={
-            "Content-Type": "video/mp2t",
-            "Content-Length": str(file_size),
-            "Cache-Control": "max-age=3600"
-        }
+    return MediaFileResponse(
+        segment_path,
+        'video/mp2t',
+        cache_control='max-age=3600'
     )
 
 @app.get("/api/hls/{info_hash}/info")
 async def hls_info(info_hash: str):
     """Retourne les infos HLS de la video"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
-    info = hls_manager.get_video_info(info_hash, video_path)
+    info = await run_in_threadpool(hls_manager.get_video_info, info_hash, video_path)
 
     return {
         "info_hash": info_hash,
         "duration": info['duration'],
         "duration_formatted": f"{int(info['duration']//60)}:{int(info['duration']%60):02d}",
         "num_segments": info['num_segments'],
-        "segment_duration": info['segment_duration']
+        "segment_duration": info['segment_duration'],
+        "alignment": info['alignment']  # 'keyframes', 'gop' ou 'fixed'
     }
 
 # ============================================
@@ -2030,19 +2302,26 @@ async def hls_info(info_hash: str):
 @app.get("/api/audio/chunk/{info_hash}/{chunk_id}")
 async def get_audio_chunk(info_hash: str, chunk_id: int, request: Request):
     """Retourne un chunk audio de 90 secondes (transcodé à la demande)"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
+    # Position de lecture -> fenetre de deadlines des pieces torrent
+    await engine_call(real_streaming_service, 'report_playback_time', 
+        info_hash, f"{request.client.host if request.client else 'unknown'}:audio",
+        chunk_id * audio_chunk_manager.chunk_duration,
+        await run_in_threadpool(cached_duration, info_hash)
+    )
+
     # Transcoder le chunk (très rapide: ~1-2 sec pour 90s d'audio)
-    audio_data = audio_chunk_manager.transcode_chunk(info_hash, video_path, chunk_id)
+    audio_data = await wait_shared(audio_chunk_manager.submit_chunk(info_hash, video_path, chunk_id))
 
     if not audio_data:
         raise HTTPException(status_code=500, detail="Erreur transcodage audio")
 
-    # Précharger les 2 chunks suivants en arrière-plan
-    audio_chunk_manager.prefetch_chunks(info_hash, video_path, chunk_id, count=2)
+    # Précharger les chunks suivants en arrière-plan
+    await run_in_threadpool(audio_chunk_manager.prefetch_chunks, info_hash, video_path, chunk_id)
 
     # Nettoyer les vieux chunks (garder ±5 autour du courant)
     audio_chunk_manager.cleanup_old_chunks(info_hash, chunk_id, keep_range=5)
@@ -2063,12 +2342,12 @@ async def get_audio_chunk(info_hash: str, chunk_id: int, request: Request):
 @app.get("/api/audio/info/{info_hash}")
 async def get_audio_info(info_hash: str):
     """Retourne les infos audio pour le frontend"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
-    info = audio_chunk_manager.get_info(info_hash, video_path)
+    info = await run_in_threadpool(audio_chunk_manager.get_info, info_hash, video_path)
     return info
 
 @app.get("/api/audio/status/{info_hash}")
@@ -2089,7 +2368,7 @@ async def get_audio_status(info_hash: str, chunk_id: int = 0):
 @app.post("/api/streaming/transcode/start/{info_hash}")
 async def start_transcode(info_hash: str, request: Request):
     """Demarre le transcodage complet en arriere-plan"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Fichier video non disponible")
@@ -2100,7 +2379,7 @@ async def start_transcode(info_hash: str, request: Request):
     client_id = request.client.host if request.client else "unknown"
     transcode_manager.cleanup_old()
 
-    result = transcode_manager.start_transcode(info_hash, video_path, client_id)
+    result = await run_in_threadpool(transcode_manager.start_transcode, info_hash, video_path, client_id)
     return result
 
 @app.get("/api/streaming/transcode/progress/{info_hash}")
@@ -2122,62 +2401,12 @@ async def stream_transcoded(info_hash: str, request: Request):
     if safe_size <= 0:
         raise HTTPException(status_code=503, detail="Transcodage en cours, reessayez")
 
-    range_header = request.headers.get('Range')
-
-    if range_header:
-        try:
-            range_match = range_header.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if range_match[1] else safe_size - 1
-            # Limiter au safe_size
-            end = min(end, safe_size - 1)
-            if start >= safe_size:
-                # Demande au-dela de ce qui est disponible
-                raise HTTPException(status_code=416, detail="Range non disponible")
-            content_length = end - start + 1
-
-            def generate_range():
-                with open(transcoded_path, 'rb') as f:
-                    f.seek(start)
-                    remaining = content_length
-                    while remaining > 0:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-
-            return StreamingResponse(
-                generate_range(),
-                status_code=206,
-                headers={
-                    'Content-Type': 'video/mp4',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Range': f'bytes {start}-{end}/{safe_size}'
-                }
-            )
-        except (ValueError, IndexError):
-            pass
-
-    def generate_full():
-        with open(transcoded_path, 'rb') as f:
-            bytes_read = 0
-            while bytes_read < safe_size:
-                chunk = f.read(min(8192, safe_size - bytes_read))
-                if not chunk:
-                    break
-                bytes_read += len(chunk)
-                yield chunk
-
-    return StreamingResponse(
-        generate_full(),
-        headers={
-            'Content-Type': 'video/mp4',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(file_size)
-        }
+    # La taille safe limite la reponse (fichier encore en cours d'ecriture)
+    return MediaFileResponse(
+        transcoded_path,
+        'video/mp4',
+        range_header=request.headers.get('Range'),
+        file_size=safe_size
     )
 
 @app.delete("/api/streaming/transcode/cancel")
@@ -2192,75 +2421,29 @@ async def cancel_transcode(request: Request):
 @app.get("/api/streaming/chunk/{info_hash}")
 async def get_chunk(info_hash: str, request: Request, t: float = 0):
     """Transcode et stream un chunk de 60s a partir de la position t"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
     client_id = request.client.host if request.client else "unknown"
 
-    # Transcoder le chunk (bloquant mais rapide ~2-5s pour 60s de video)
-    result = chunk_manager.transcode_chunk(info_hash, video_path, t, client_id)
+    # Position de lecture -> fenetre de deadlines des pieces torrent
+    await engine_call(real_streaming_service, 'report_playback_time', 
+        info_hash, f"{client_id}:chunk", t, await run_in_threadpool(cached_duration, info_hash)
+    )
+
+    # Transcoder le chunk (~2-5s pour 60s de video), attendu sans bloquer la boucle
+    result = await wait_shared(chunk_manager.submit_chunk(info_hash, video_path, t, client_id))
 
     if result["status"] != "ready":
         raise HTTPException(status_code=500, detail=result.get("message", "Erreur"))
 
-    chunk_path = result["chunk_path"]
-    file_size = os.path.getsize(chunk_path)
-
-    # Support Range requests pour seeking dans le chunk
-    range_header = request.headers.get('Range')
-
-    if range_header:
-        try:
-            range_match = range_header.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if range_match[1] else file_size - 1
-            end = min(end, file_size - 1)
-            content_length = end - start + 1
-
-            def generate_range():
-                with open(chunk_path, 'rb') as f:
-                    f.seek(start)
-                    remaining = content_length
-                    while remaining > 0:
-                        chunk_size = min(8192, remaining)
-                        data = f.read(chunk_size)
-                        if not data:
-                            break
-                        remaining -= len(data)
-                        yield data
-
-            return StreamingResponse(
-                generate_range(),
-                status_code=206,
-                headers={
-                    'Content-Type': 'video/mp4',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Range': f'bytes {start}-{end}/{file_size}',
-                    'X-Chunk-Start': str(result["start_time"]),
-                    'X-Chunk-Duration': str(result["duration"]),
-                    'X-Total-Duration': str(result.get("total_duration", 0))
-                }
-            )
-        except:
-            pass
-
-    def generate_full():
-        with open(chunk_path, 'rb') as f:
-            while True:
-                data = f.read(8192)
-                if not data:
-                    break
-                yield data
-
-    return StreamingResponse(
-        generate_full(),
+    return MediaFileResponse(
+        result["chunk_path"],
+        'video/mp4',
+        range_header=request.headers.get('Range'),
         headers={
-            'Content-Type': 'video/mp4',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(file_size),
             'X-Chunk-Start': str(result["start_time"]),
             'X-Chunk-Duration': str(result["duration"]),
             'X-Total-Duration': str(result.get("total_duration", 0))
@@ -2270,12 +2453,12 @@ async def get_chunk(info_hash: str, request: Request, t: float = 0):
 @app.get("/api/streaming/chunk/info/{info_hash}")
 async def get_chunk_info(info_hash: str):
     """Retourne les infos pour le streaming par chunks"""
-    video_path = real_streaming_service.get_video_path(info_hash)
+    video_path = await engine_call(real_streaming_service, 'get_video_path', info_hash)
 
     if not video_path or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video non disponible")
 
-    duration = chunk_manager.get_video_duration(video_path, info_hash)
+    duration = await run_in_threadpool(chunk_manager.get_video_duration, video_path, info_hash)
     chunk_count = int(duration // chunk_manager.chunk_duration) + 1
 
     return {
@@ -2310,12 +2493,18 @@ if __name__ == "__main__":
     logger.info("Demarrage StreamTV Production")
     logger.info("Streaming reel avec libtorrent active")
     logger.info("Interface: http://localhost:8000")
-    
-    
+
+    # Plusieurs workers seulement avec le daemon torrent: une session libtorrent par processus sinon
+    workers = int(os.getenv('API_WORKERS', '1'))
+    if workers > 1 and TORRENT_ENGINE != 'remote':
+        logger.warning("API_WORKERS ignore sans TORRENT_ENGINE=remote: un seul worker")
+        workers = 1
+
     uvicorn.run(
         "main_production:app",
         host="0.0.0.0",
         port=8000,
         reload=False,  # Production mode
+        workers=workers,
         log_level="info"
     )
\ No newline at end of file
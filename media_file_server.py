@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Moteur de service de fichiers media
+Reponses HTTP Range/complete partagees par tous les endpoints video
+(zero-copie via sendfile quand le serveur le permet, lectures alignees sinon)
+
+Le chemin zero-copie n'existe que sous un serveur ASGI qui fournit l'extension
+http.response.zerocopysend; uvicorn (le serveur de production) ne la fournit pas, les reponses
+passent donc par les lectures pread alignees. Le debit sendfile de benchmarks/bench_file_serving.py
+simule cette extension: ce n'est pas celui de la production.
+
+Un corps plus court que le Content-Length annonce (fichier tronque ou evince pendant l'envoi,
+range devenue indisponible) leve IncompleteBodyError: le serveur coupe alors la connexion au lieu
+de terminer normalement une reponse que le client prendrait pour complete.
+"""
+
+import os
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus sur le chemin de repli (multiple de la page memoire)
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+READ_BLOCK_SIZE = 1024 * 1024  # 1 MB par lecture au lieu de 8 KB
+READAHEAD_SIZE = 8 * 1024 * 1024  # Fenetre de readahead annoncee au noyau
+
+# Extension ASGI des serveurs capables de faire os.sendfile eux-memes
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+# Attente de disponibilite d'une range (offset, longueur) avant lecture
+RangeWaiter = Callable[[int, int], Awaitable[None]]
+
+
+class IncompleteBodyError(Exception):
+    """Headers deja envoyes mais corps impossible a completer: la connexion doit etre coupee"""
+
+    def __init__(self, path: str, sent: int, expected: int):
+        super().__init__(f"{path}: {sent}/{expected} bytes envoyes")
+        self.path = path
+        self.sent = sent
+        self.expected = expected
+
+
+def parse_byte_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """Parse un header Range 'bytes=start-end' (None si absent ou malforme)"""
+    if not range_header or file_size <= 0:
+        return None
+    try:
+        range_match = range_header.strip().replace('bytes=', '').split(',')[0].split('-')
+        if range_match[0]:
+            start = int(range_match[0])
+            end = int(range_match[1]) if range_match[1] else file_size - 1
+        else:
+            # Suffixe "bytes=-N" = les N derniers bytes
+            start = max(0, file_size - int(range_match[1]))
+            end = file_size - 1
+    except (ValueError, IndexError):
+        return None
+
+    if start >= file_size:
+        raise HTTPException(
+            status_code=416,
+            detail="Range non disponible",
+            headers={'Content-Range': f'bytes */{file_size}'}
+        )
+    end = min(end, file_size - 1)
+    if end < start:
+        return None
+    return start, end
+
+
+def _advise(fd: int, offset: int, length: int, advice_name: str):
+    """posix_fadvise si disponible (ignore les erreurs, simple indication au noyau)"""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+class MediaFileResponse(Response):
+    """Reponse fichier avec support Range, sendfile et lectures alignees"""
+
+    def __init__(self, path: str, content_type: str, range_header: Optional[str] = None,
+                 file_size: Optional[int] = None, headers: Optional[Dict[str, str]] = None,
+                 cache_control: Optional[str] = None, wait_for_range: Optional[RangeWaiter] = None):
+        self.path = path
+        # wait_for_range bloque (async) chaque bloc tant que ses donnees ne sont pas sur disque
+        self.wait_for_range = wait_for_range
+        # file_size permet de limiter la reponse (ex: fichier en cours d'ecriture)
+        self.file_size = file_size if file_size is not None else os.path.getsize(path)
+
+        byte_range = parse_byte_range(range_header, self.file_size)
+        if byte_range:
+            self.start, self.end = byte_range
+            status_code = 206
+        else:
+            self.start, self.end = 0, self.file_size - 1
+            status_code = 200
+        self.content_length = max(0, self.end - self.start + 1)
+
+        response_headers = {
+            'Content-Type': content_type,
+            'Accept-Ranges': 'bytes',
+            'Content-Length': str(self.content_length),
+        }
+        if status_code == 206:
+            response_headers['Content-Range'] = f'bytes {self.start}-{self.end}/{self.file_size}'
+        if cache_control:
+            response_headers['Cache-Control'] = cache_control
+        if headers:
+            response_headers.update(headers)
+
+        super().__init__(content=None, status_code=status_code, headers=response_headers)
+
+    def _block_length(self, offset: int, end: int) -> int:
+        """Longueur du bloc a partir d'offset (premier bloc raccourci pour aligner les suivants)"""
+        return min(end, (offset // READ_BLOCK_SIZE + 1) * READ_BLOCK_SIZE) - offset
+
+    async def wait_first_block(self):
+        """Attend le premier bloc avant l'envoi des headers (l'appelant peut encore repondre 503)"""
+        if self.wait_for_range and self.content_length > 0:
+            await self.wait_for_range(self.start, self._block_length(self.start, self.start + self.content_length))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if scope["method"].upper() == "HEAD" or self.content_length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        f = await anyio.to_thread.run_sync(open, self.path, 'rb', 0)
+        try:
+            fd = f.fileno()
+            _advise(fd, self.start, self.content_length, 'POSIX_FADV_SEQUENTIAL')
+
+            zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+
+            # Comme StreamingResponse: le client parti (http.disconnect) arrete l'envoi, les lectures
+            # et les attentes de pieces (send() ne signale pas la deconnexion)
+            try:
+                async with anyio.create_task_group() as task_group:
+                    async def send_body():
+                        if zerocopy:
+                            await self._send_zerocopy(f, send)
+                        else:
+                            await self._send_aligned_blocks(fd, send)
+                        task_group.cancel_scope.cancel()
+
+                    task_group.start_soon(send_body)
+                    await self._listen_for_disconnect(receive)
+                    task_group.cancel_scope.cancel()
+            except BaseExceptionGroup as group:
+                # L'erreur d'origine (IncompleteBodyError, OSError) plutot que le groupe d'anyio
+                if len(group.exceptions) == 1:
+                    raise group.exceptions[0] from None
+                raise
+        finally:
+            await anyio.to_thread.run_sync(f.close)
+
+    @staticmethod
+    async def _listen_for_disconnect(receive: Receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def _wait_block(self, offset: int, length: int):
+        """Attend un bloc; IncompleteBodyError s'il est indisponible"""
+        if not self.wait_for_range:
+            return
+        try:
+            await self.wait_for_range(offset, length)
+        except Exception as e:
+            # Headers deja envoyes: couper la connexion, le lecteur relancera une Range
+            logger.warning(f"Range indisponible {self.path} @{offset}: {e}")
+            raise IncompleteBodyError(self.path, offset - self.start, self.content_length) from e
+
+    async def _send_zerocopy(self, f, send: Send):
+        """Le serveur envoie directement depuis le page cache (os.sendfile)"""
+        offset = self.start
+        end = self.start + self.content_length
+
+        while offset < end:
+            # Sans attente de pieces, toute la range part en un seul appel
+            length = self._block_length(offset, end) if self.wait_for_range else end - offset
+            await self._wait_block(offset, length)
+            offset += length
+            await send({
+                "type": ZEROCOPY_EXTENSION,
+                "file": f,
+                "offset": offset - length,
+                "count": length,
+                "more_body": offset < end,
+            })
+
+    async def _send_aligned_blocks(self, fd: int, send: Send):
+        """Repli: grosses lectures pread alignees sur la page, readahead en avance"""
+        offset = self.start
+        end = self.start + self.content_length
+        readahead_until = offset
+
+        while offset < end:
+            length = self._block_length(offset, end)
+            await self._wait_block(offset, length)
+
+            if offset >= readahead_until:
+                readahead_until = min(end, offset + READAHEAD_SIZE)
+                aligned = offset - offset % PAGE_SIZE
+                _advise(fd, aligned, readahead_until - aligned, 'POSIX_FADV_WILLNEED')
+
+            data = await anyio.to_thread.run_sync(os.pread, fd, length, offset)
+            if not data:
+                break
+            offset += len(data)
+            await send({"type": "http.response.body", "body": data, "more_body": offset < end})
+
+        if offset < end:
+            # Fichier tronque ou evince: un corps court termine normalement passerait pour complet
+            logger.warning(f"Fichier tronque pendant l'envoi: {self.path} ({offset}/{end})")
+            raise IncompleteBodyError(self.path, offset - self.start, self.content_length)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Sonde media partagee
+Un seul ffprobe par fichier video (duree, flux, codecs, langues, bitrate, intervalle entre keyframes),
+lance des que le debut du fichier est telecharge et persiste sur disque par info_hash et taille
+"""
+
+import os
+import json
+import time
+import logging
+import subprocess
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from real_streaming_service import CACHE_DIR, RealStreamingService, real_streaming_service, write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# Resultats persistes dans le volume du cache: un redemarrage ne re-sonde rien
+PROBE_DIR = os.path.join(CACHE_DIR, ".probe")
+os.makedirs(PROBE_DIR, exist_ok=True)
+PROBE_TIMEOUT = 15  # ffprobe des metadonnees (secondes)
+PROBE_INTERVAL = 2  # Recherche des fichiers a sonder (secondes)
+PROBE_RETRY_AFTER = 30  # Nouvel essai apres un echec (index MP4 pas encore telecharge...)
+KEYFRAME_SCAN_SECONDS = 30  # Debut du fichier scanne pour l'intervalle entre keyframes
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Resultat ffprobe d'un fichier video"""
+    duration: float
+    bitrate: int  # bits/s (conteneur)
+    format_name: str
+    streams: List[Dict] = field(default_factory=list)  # index, type, codec, language, channels, width, height
+    keyframe_interval: Optional[float] = None  # Ecart median entre keyframes (secondes)
+    file_size: int = 0
+    probed_at: float = 0.0
+
+    def get_info(self) -> Dict:
+        return asdict(self)
+
+
+def _describe_stream(stream: Dict) -> Dict:
+    return {
+        'index': stream.get('index'),
+        'type': stream.get('codec_type'),
+        'codec': stream.get('codec_name'),
+        'language': stream.get('tags', {}).get('language'),
+        'channels': stream.get('channels'),
+        'width': stream.get('width'),
+        'height': stream.get('height'),
+    }
+
+
+def _keyframe_interval(video_path: str) -> Optional[float]:
+    """Ecart median entre les keyframes du debut du fichier (deja telecharge)"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-read_intervals', f'%+{KEYFRAME_SCAN_SECONDS}',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            video_path
+        ], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    times = []
+    for line in result.stdout.splitlines():
+        fields = line.split(',')
+        if len(fields) >= 2 and 'K' in fields[1]:
+            try:
+                times.append(float(fields[0]))
+            except ValueError:
+                continue
+    gaps = sorted(b - a for a, b in zip(times, times[1:]) if b > a)
+    return round(gaps[len(gaps) // 2], 3) if gaps else None
+
+
+def run_ffprobe(video_path: str, file_size: int) -> Optional[MediaInfo]:
+    """Sonde complete d'un fichier (None si ffprobe echoue ou ne trouve pas de duree)"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-show_format', '-show_streams',
+            '-of', 'json',
+            video_path
+        ], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        data = json.loads(result.stdout or '{}')
+    except (OSError, subprocess.TimeoutExpired, ValueError) as e:
+        logger.error(f"Erreur ffprobe: {e}")
+        return None
+
+    media_format = data.get('format', {})
+    try:
+        duration = float(media_format.get('duration', 0))
+    except ValueError:
+        duration = 0.0
+    if duration <= 0:
+        return None
+
+    return MediaInfo(
+        duration=duration,
+        bitrate=int(media_format.get('bit_rate') or file_size * 8 / duration),
+        format_name=media_format.get('format_name', ''),
+        streams=[_describe_stream(stream) for stream in data.get('streams', [])],
+        keyframe_interval=_keyframe_interval(video_path),
+        file_size=file_size,
+        probed_at=time.time(),
+    )
+
+
+class MediaProbeService:
+    """Cache memoire + disque des sondes; sonde les fichiers des torrents prets en arriere-plan"""
+
+    def __init__(self, service: Optional[RealStreamingService], probe_dir: str = PROBE_DIR,
+                 interval: float = PROBE_INTERVAL):
+        self.service = service
+        self.probe_dir = probe_dir
+        self.interval = interval
+        self.cache: Dict[str, MediaInfo] = {}  # "info_hash_taille" -> resultat
+        self.failures: Dict[str, float] = {}  # Cle -> instant du dernier echec
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        # Sans session locale (API avec daemon torrent), le daemon sonde et le cache disque est partage
+        if service is not None:
+            thread = threading.Thread(target=self._loop, daemon=True)
+            thread.start()
+
+    @staticmethod
+    def _key(info_hash: str, file_size: int) -> str:
+        return f"{info_hash.upper()}_{file_size}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.probe_dir, f"{key}.json")
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.probe_ready_torrents()
+            except Exception as e:
+                logger.error(f"Erreur sonde media: {e}")
+
+    def probe_ready_torrents(self):
+        """Sonde le fichier video des torrents lisibles (en-tete et prebuffer presents)"""
+        for info_hash in list(self.service.active_torrents):
+            video_path = self.service.get_video_path(info_hash)
+            file_size = self.service.get_video_size(info_hash)
+            if not video_path or not file_size:
+                continue
+            key = self._key(info_hash, file_size)
+            if time.time() - self.failures.get(key, 0) < PROBE_RETRY_AFTER:
+                continue
+            info = self.get(info_hash, video_path, file_size)
+            if info is not None:
+                self.service.set_media_duration(info_hash, info.duration)
+
+    def get_cached(self, info_hash: str, file_size: int) -> Optional[MediaInfo]:
+        """Resultat deja connu (memoire puis disque), sans lancer ffprobe"""
+        key = self._key(info_hash, file_size)
+        info = self.cache.get(key)
+        if info is not None:
+            return info
+        try:
+            with open(self._path(key)) as f:
+                info = MediaInfo(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        self.cache[key] = info
+        return info
+
+    def get(self, info_hash: str, video_path: str, file_size: int) -> Optional[MediaInfo]:
+        """Resultat en cache, sinon un seul ffprobe par fichier (les appels concurrents l'attendent)"""
+        info = self.get_cached(info_hash, file_size)
+        if info is not None:
+            return info
+
+        key = self._key(info_hash, file_size)
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            event.wait(PROBE_TIMEOUT * 2)
+            return self.cache.get(key)
+
+        try:
+            info = run_ffprobe(video_path, file_size)
+            if info is None:
+                self.failures[key] = time.time()
+                return None
+            self.cache[key] = info
+            self.failures.pop(key, None)
+            write_file_atomic(self._path(key), json.dumps(info.get_info()).encode())
+            logger.info(f"Sonde media {info_hash}: {info.duration:.0f}s, {len(info.streams)} flux, "
+                        f"keyframes toutes les {info.keyframe_interval}s")
+            return info
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def get_duration(self, info_hash: str, video_path: str, file_size: int) -> float:
+        """Duree du media (0 si inconnue), comme l'ancien ffprobe des gestionnaires"""
+        info = self.get(info_hash, video_path, file_size)
+        return info.duration if info else 0
+
+
+# Instance globale (cote API avec daemon torrent: lecture du cache disque et sonde a la demande)
+media_probe = MediaProbeService(real_streaming_service)
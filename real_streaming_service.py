@@ -5,17 +5,507 @@ Telecharge et stream en temps reel les torrents
 """
 
 import libtorrent as lt
+import numpy as np
 import os
+import json
+import re
 import time
+import asyncio
 import threading
 import logging
-from typing import Dict, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from container_inspector import HEAD_PROBE_BYTES, ContainerLayout, inspect_container
+from time_index import TimeIndex, build_time_index, probe_keyframes
 
 logger = logging.getLogger(__name__)
 
-CACHE_DIR = "/tmp/streamtv_torrents"
+CACHE_DIR = os.getenv('STREAMTV_CACHE_DIR', '/tmp/streamtv_torrents')
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# Reprise rapide: metadonnees + resume data par info_hash, dans le volume du cache
+RESUME_DIR = os.path.join(CACHE_DIR, ".resume")
+os.makedirs(RESUME_DIR, exist_ok=True)
+RESUME_SAVE_INTERVAL = 60  # Sauvegarde periodique des resume data (secondes)
+SHUTDOWN_SAVE_TIMEOUT = 10  # Attente max des resume data a l'arret (secondes)
+
+# Table de routage DHT persistee: bootstrap a chaud apres un redemarrage
+DHT_STATE_PATH = os.path.join(RESUME_DIR, "dht.state")
+DHT_SAVE_INTERVAL = 300  # Sauvegarde periodique de la table DHT (secondes)
+DHT_READY_NODES = int(os.getenv('DHT_READY_NODES', '20'))  # Noeuds DHT pour se declarer pret
+SESSION_STATS_INTERVAL = 5  # Rafraichissement du compteur de noeuds DHT (secondes)
+
+# Moteur torrent: 'local' (session dans le processus de l'API) ou 'remote' (torrent_daemon.py)
+TORRENT_ENGINE = os.getenv('TORRENT_ENGINE', 'local')
+TORRENT_DAEMON_SOCKET = os.getenv('TORRENT_DAEMON_SOCKET', os.path.join(CACHE_DIR, '.engine.sock'))
+
+# Torrents arretes gardes en pause (fichiers conserves) pour un retour instantane
+WARM_POOL_SIZE = int(os.getenv('WARM_POOL_SIZE', '5'))
+
+# Pre-chargement des metadonnees des meilleurs resultats de recherche
+PREFETCH_MAX_RESULTS = 5  # Resultats pre-charges au plus par recherche
+PREFETCH_MAX_ACTIVE = 10  # Recuperations de metadonnees simultanees
+PREFETCH_TIMEOUT = 60  # Abandon d'une recuperation sans reponse de l'essaim (secondes)
+METADATA_CACHE_SIZE = 100  # Metadonnees gardees en memoire
+METADATA_CACHE_TTL = 900  # Duree de vie d'une metadonnee pre-chargee (secondes)
+PREFETCH_CHECK_INTERVAL = 5  # Expiration des recuperations et du cache (secondes)
+
+# Attente max (secondes) des pieces d'une range avant de repondre 503
+PIECE_WAIT_TIMEOUT = float(os.getenv('PIECE_WAIT_TIMEOUT', '15'))
+PIECE_RETRY_AFTER = 2  # Retry-After conseille au client (secondes)
+
+# Pret a lire: secondes de media contigues devant la lecture (plutot qu'un % fixe du fichier)
+PLAYABLE_BUFFER_SECONDS = float(os.getenv('PLAYABLE_BUFFER_SECONDS', '10'))
+PLAYABLE_MIN_BYTES = 2 * 1024 * 1024  # Plancher: en-tete du conteneur + premieres images
+PLAYABLE_HORIZON = 300  # Essaim plus lent que le media: buffer pour tenir autant de secondes sans coupure
+PREBUFFER_DEADLINE = 500  # Deadline (ms) des pieces du prebuffer avant le premier demarrage
+
+# Frequence des post_torrent_updates() de la boucle d'alertes (secondes)
+STATUS_UPDATE_INTERVAL = 1.0
+# Recalage periodique des bitfields sur libtorrent (query_pieces): une piece_finished_alert perdue
+# ne laisse jamais une piece 'absente' jusqu'a la fin du torrent (secondes)
+HAVE_RESYNC_INTERVAL = 30
+
+# Fenetre glissante de deadlines devant chaque lecteur
+DEADLINE_WINDOW_SECONDS = 30  # Secondes de media couvertes devant la position lue
+DEADLINE_MIN_PIECES = 4
+DEADLINE_MAX_PIECES = 256
+READER_IDLE_TIMEOUT = 30  # Lecteur oublie apres 30s sans lecture
+ASSUMED_DURATION = 5400  # Duree supposee (s) tant que ffprobe n'a pas repondu
+
+# Fichiers video et episodes (S01E02, 1x02)
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm']
+EPISODE_PATTERN = re.compile(r'[Ss](\d{1,2})[ ._-]?[Ee](\d{1,3})|\b(\d{1,2})x(\d{2,3})\b')
+
+# Priorites de pieces
+LT_DEFAULT_PRIORITY = 4  # Priorite initiale de libtorrent
+SEEK_DEBOUNCE = 0.15  # Les seeks plus rapproches sont regroupes (secondes)
+
+# Watermarks de buffer (secondes de media devant la lecture): au-dessus du haut, seules les pieces
+# avec deadline restent demandees; sous le bas, la strategie complete est retablie
+BUFFER_HIGH_WATERMARK = float(os.getenv('BUFFER_HIGH_WATERMARK', '240'))
+BUFFER_LOW_WATERMARK = float(os.getenv('BUFFER_LOW_WATERMARK', '90'))
+
+# Index du conteneur (moov MP4, Cues MKV)
+CONTAINER_HEAD_DEADLINE = 100  # Deadline (ms) des pieces d'en-tete a inspecter
+CONTAINER_INDEX_DEADLINE = 1000  # Deadline (ms) des pieces de l'index localise
+CONTAINER_INDEX_MAX_BYTES = 64 * 1024 * 1024  # Borne de la zone epinglee par index
+
+
+class PieceWaitTimeout(Exception):
+    """Les pieces d'une range ne sont pas arrivees dans le delai imparti"""
+
+    def __init__(self, info_hash: str, missing_pieces: List[int], retry_after: int = PIECE_RETRY_AFTER):
+        super().__init__(f"{len(missing_pieces)} pieces manquantes pour {info_hash}")
+        self.info_hash = info_hash
+        self.missing_pieces = missing_pieces
+        self.retry_after = retry_after
+
+
+def write_file_atomic(path: str, data: bytes):
+    """Ecriture atomique (un arret brutal ne laisse jamais un fichier tronque)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def parse_episode(text: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(saison, episode) depuis 'S01E02', 's1e2' ou '1x02' (None si absent)"""
+    match = EPISODE_PATTERN.search(text or '')
+    if not match:
+        return None
+    season, episode = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+    return int(season), int(episode)
+
+
+def find_video_file_index(files) -> Optional[int]:
+    """Index du fichier video principal (le plus gros), None si aucun fichier video"""
+    largest_index = None
+    largest_size = 0
+    
+    for index, file_info in enumerate(files):
+        file_path = file_info.path
+        file_size = file_info.size
+        
+        # Check si c'est un fichier video
+        if any(file_path.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
+            if file_size > largest_size:
+                largest_size = file_size
+                largest_index = index
+    
+    return largest_index
+
+
+def describe_files(files, selected_index: Optional[int] = None) -> List[Dict]:
+    """Fichiers d'un torrent pour l'API (index, taille, video, episode detecte, selection)"""
+    described = []
+    for index, file_info in enumerate(files):
+        episode = parse_episode(os.path.basename(file_info.path))
+        described.append({
+            'index': index,
+            'path': file_info.path,
+            'size': file_info.size,
+            'is_video': any(file_info.path.lower().endswith(ext) for ext in VIDEO_EXTENSIONS),
+            'episode': f"S{episode[0]:02d}E{episode[1]:02d}" if episode else None,
+            'selected': index == selected_index,
+        })
+    return described
+
+
+def count_pieces(pieces: np.ndarray, start: int, end: int) -> int:
+    """Nombre de pieces presentes dans la fenetre [start, end) (vectorise)"""
+    return int(np.count_nonzero(pieces[max(0, start):max(0, end)]))
+
+
+def encode_piece_runs(pieces: np.ndarray) -> List[List[int]]:
+    """Encode les pieces presentes en runs [premiere_piece, longueur] (RLE)"""
+    # Bords montants/descendants du bitmap entoure de zeros
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], pieces != 0, [0])).astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    return np.column_stack((starts, ends - starts)).tolist()
+
+
+@dataclass(frozen=True)
+class TorrentSnapshot:
+    """Etat fige d'un torrent, remplace en bloc par la boucle d'alertes (lecture sans verrou)"""
+    state: str = 'adding'
+    progress: float = 0.0
+    download_rate: int = 0
+    upload_rate: int = 0
+    num_peers: int = 0
+    num_seeds: int = 0
+    has_metadata: bool = False
+    pieces: Optional[np.ndarray] = None  # Bitmap uint8 en lecture seule (1 = telechargee et verifiee)
+    pieces_done: int = 0
+    buffered_ahead: int = 0  # Bytes contigus disponibles apres la position de lecture
+    prebuffer_bytes: int = 0  # Bytes contigus requis devant la lecture pour demarrer (0 = inconnu)
+    ready: bool = False  # Assez de buffer devant la lecture pour lire sans attendre
+    eta_playable: Optional[float] = None  # Secondes estimees avant d'etre pret (None = inconnu)
+    updated_at: float = 0.0
+
+
+class StreamScheduler:
+    """Deadlines glissantes devant chaque lecteur actif du fichier video d'un torrent"""
+
+    def __init__(self, handle, ti, file_index: int, file_size: int):
+        self.handle = handle
+        self.file_size = file_size
+        self.piece_length = ti.piece_length()
+        self.file_start = ti.files().file_offset(file_index)
+        self.first_piece = ti.map_file(file_index, 0, 1).piece
+        self.last_piece = ti.map_file(file_index, max(0, file_size - 1), 1).piece
+        self.duration: Optional[float] = None  # Duree reelle (ffprobe) si connue
+        self.readers: Dict[str, Dict] = {}  # reader_id -> {'offset', 'piece', 'last_seen'}
+        self.deadlines: Dict[int, int] = {}  # piece -> deadline (ms) posee par le scheduler
+
+    def bitrate(self) -> float:
+        """Debit moyen du media en bytes/s"""
+        return self.file_size / (self.duration or ASSUMED_DURATION)
+
+    def piece_at(self, offset: int) -> int:
+        return (self.file_start + max(0, min(offset, self.file_size - 1))) // self.piece_length
+
+    def report_read(self, reader_id: str, offset: int, have: Optional[np.ndarray], download_rate: int):
+        """Position lue par un lecteur; ne recalcule la fenetre qu'au changement de piece"""
+        now = time.monotonic()
+        piece = self.piece_at(offset)
+        reader = self.readers.get(reader_id)
+        self.readers[reader_id] = {'offset': offset, 'piece': piece, 'last_seen': now}
+        if reader and reader['piece'] == piece:
+            return
+
+        # Oublier les lecteurs inactifs
+        for rid in [rid for rid, r in self.readers.items() if now - r['last_seen'] > READER_IDLE_TIMEOUT]:
+            del self.readers[rid]
+
+        self._update_window(have, download_rate)
+
+    def _window_pieces(self, download_rate: int) -> int:
+        """Taille de la fenetre en pieces: N secondes de media, reduite si le swarm ne suit pas"""
+        window_bytes = self.bitrate() * DEADLINE_WINDOW_SECONDS
+        if 0 < download_rate < self.bitrate():
+            # Concentrer les deadlines sur ce qui peut vraiment arriver a temps
+            window_bytes = download_rate * DEADLINE_WINDOW_SECONDS
+        pieces = int(window_bytes // self.piece_length) + 1
+        return max(DEADLINE_MIN_PIECES, min(DEADLINE_MAX_PIECES, pieces))
+
+    def _update_window(self, have: Optional[np.ndarray], download_rate: int):
+        """Pose les deadlines devant les lecteurs et libere celles laissees derriere"""
+        window = self._window_pieces(download_rate)
+        bitrate = self.bitrate()
+        wanted: Dict[int, int] = {}
+
+        for reader in self.readers.values():
+            end = min(self.last_piece, reader['piece'] + window)
+            for piece in range(reader['piece'], end + 1):
+                if have is not None and have[piece]:
+                    continue
+                # Deadline = instant ou la lecture atteindra cette piece
+                ahead = piece * self.piece_length - self.file_start - reader['offset']
+                deadline = max(100, int(ahead / bitrate * 1000))
+                wanted[piece] = min(deadline, wanted.get(piece, deadline))
+
+        for piece in list(self.deadlines):
+            if piece not in wanted:
+                if have is None or not have[piece]:
+                    self.handle.reset_piece_deadline(piece)
+                del self.deadlines[piece]
+
+        for piece, deadline in wanted.items():
+            if piece not in self.deadlines:
+                self.handle.set_piece_deadline(piece, deadline)
+                self.deadlines[piece] = deadline
+
+    def clear(self):
+        """Oublie lecteurs et deadlines (torrent mis en pause, deadlines deja retirees du handle)"""
+        self.readers.clear()
+        self.deadlines.clear()
+
+    def get_info(self) -> Dict:
+        return {
+            'readers': len(self.readers),
+            'deadline_pieces': len(self.deadlines),
+            'bitrate': int(self.bitrate()),
+            'duration': self.duration,
+        }
+
+
+class PiecePriorityState:
+    """Priorites de pieces d'un torrent: calcul vectorise, application differentielle, seeks regroupes"""
+
+    def __init__(self, handle, num_pieces: int, keep_deadlines: Optional[Callable[[], Dict[int, int]]] = None):
+        self.handle = handle
+        self.num_pieces = num_pieces
+        self.applied = np.full(num_pieces, LT_DEFAULT_PRIORITY, dtype=np.uint8)
+        self.deadlines: Dict[int, int] = {}  # piece -> deadline (ms) posee par cet objet
+        # Deadlines d'un autre proprietaire (StreamScheduler) a ne jamais reinitialiser
+        self.keep_deadlines = keep_deadlines or dict
+        # Pieces du fichier selectionne: les strategies sont calculees sur cette plage, le reste a 0
+        self.first_piece = 0
+        self.last_piece = num_pieces - 1
+        # Pieces epinglees (index du conteneur): priorite max quelle que soit la strategie
+        self.pinned: Dict[int, int] = {}
+        self._strategy: Optional[Tuple[str, int]] = None  # ('instant', 0) ou ('seek', piece)
+        self.throttled = False  # Buffer au-dessus du watermark haut: pieces sans deadline a 0
+        self.stats = {'applies': 0, 'pieces_sent': 0, 'coalesced_seeks': 0}
+        self._lock = threading.Lock()
+        self._pending_seek: Optional[int] = None
+        self._timer: Optional[threading.Timer] = None
+        self._last_seek_apply = 0.0
+
+    @staticmethod
+    def _around(points: np.ndarray, radius: int, num_pieces: int) -> np.ndarray:
+        """Indices des pieces a +/- radius autour de chaque point, bornes au torrent"""
+        indices = (points[:, None] + np.arange(-radius, radius + 1)).ravel()
+        return indices[(indices >= 0) & (indices < num_pieces)]
+
+    @classmethod
+    def instant_access_layout(cls, num_pieces: int) -> Tuple[np.ndarray, Dict[int, int]]:
+        """Echantillons repartis pour acces instantane a toutes les positions"""
+        priorities = np.full(num_pieces, 2, dtype=np.uint8)  # Priorite normale par defaut
+        deadlines: Dict[int, int] = {}
+
+        # 1. TRES HAUTE PRIORITE : Debut du fichier (0-5% - metadonnees critiques)
+        start_critical = min(50, num_pieces // 20)  # 5% ou 50 pieces max
+        priorities[:start_critical] = 7
+        deadlines.update(dict.fromkeys(range(start_critical), 500))
+
+        # 2. HAUTE PRIORITE : 5 pieces autour de chaque 10% du fichier
+        sample = cls._around(num_pieces * np.arange(1, 10) // 10, 2, num_pieces)
+        priorities[sample] = 6
+        deadlines.update(dict.fromkeys(sample.tolist(), 2000))
+
+        # 3. PRIORITE ELEVEE : 3 pieces autour des points intermediaires (5%, 15%, 25%...)
+        intermediate = cls._around(num_pieces * np.arange(1, 20, 2) // 20, 1, num_pieces)
+        priorities[intermediate] = np.maximum(priorities[intermediate], 5)
+
+        return priorities, deadlines
+
+    @classmethod
+    def seek_layout(cls, num_pieces: int, seek_piece: int) -> Tuple[np.ndarray, Dict[int, int]]:
+        """Strategie ultra-agressive autour d'une position de seek"""
+        priorities = np.ones(num_pieces, dtype=np.uint8)  # Tres basse priorite par defaut
+        deadlines: Dict[int, int] = {}
+
+        # 3. ZONE BUFFER (lecture continue) : 50 pieces apres
+        critical_end = min(num_pieces, seek_piece + 8)
+        buffer_end = min(num_pieces, seek_piece + 50)
+        priorities[critical_end:buffer_end] = 5
+        deadlines.update(dict.fromkeys(range(critical_end, buffer_end), 2000))
+
+        # 2. ZONE CRITIQUE (buffer proche) : 15 pieces autour
+        critical_start = max(0, seek_piece - 7)
+        priorities[critical_start:critical_end] = 6
+        deadlines.update(dict.fromkeys(range(critical_start, critical_end), 500))
+
+        # 1. ZONE ULTRA-CRITIQUE (instantane) : 3 pieces autour + deadline immediate
+        ultra_start, ultra_end = max(0, seek_piece - 1), min(num_pieces, seek_piece + 2)
+        priorities[ultra_start:ultra_end] = 7
+        deadlines.update(dict.fromkeys(range(ultra_start, ultra_end), 100))
+
+        # 4. MAINTENIR points d'acces strategiques (10%, 20%, etc.) avec priorite moderee
+        sample = num_pieces * np.arange(1, 10) // 10
+        sample = sample[sample < num_pieces]
+        priorities[sample] = np.maximum(priorities[sample], 4)
+
+        # 5. TOUJOURS maintenir debut du fichier (metadonnees video)
+        head = min(20, num_pieces)
+        priorities[:head] = np.maximum(priorities[:head], 6)
+
+        return priorities, deadlines
+
+    def apply_instant_access(self) -> int:
+        """Strategie d'acces instantane sur le fichier; retourne le nombre de pieces modifiees"""
+        with self._lock:
+            return self._apply_strategy_locked(('instant', 0))
+
+    def apply_seek(self, seek_piece: int) -> int:
+        """Strategie de seek immediate (sans regroupement) autour d'une piece du torrent"""
+        with self._lock:
+            return self._apply_strategy_locked(('seek', seek_piece))
+
+    def select_range(self, first_piece: int, last_piece: int):
+        """Restreint les strategies aux pieces d'un fichier (les autres passent a 0)"""
+        with self._lock:
+            self.first_piece, self.last_piece = first_piece, last_piece
+            self.pinned = {}  # Epinglages propres a l'ancien fichier
+            if self._strategy is not None:
+                self._apply_strategy_locked(('instant', 0))
+
+    def pin(self, pieces: List[int], deadline: int, release: Iterable[int] = ()):
+        """Epingle des pieces en priorite 7 avec deadline, conservees a travers les seeks
+        (release: epinglages remplaces, retires dans la meme application)"""
+        with self._lock:
+            for piece in release:
+                self.pinned.pop(piece, None)
+            self.pinned.update(dict.fromkeys(pieces, deadline))
+            if self._strategy is not None:
+                self._apply_strategy_locked(self._strategy)
+
+    def unpin(self, pieces: Iterable[int]):
+        """Retire des epinglages: les pieces reviennent a la strategie courante"""
+        with self._lock:
+            for piece in pieces:
+                self.pinned.pop(piece, None)
+            if self._strategy is not None:
+                self._apply_strategy_locked(self._strategy)
+
+    def resync(self):
+        """Relit les priorites reelles puis reapplique la strategie (apres un changement de priorites
+        de fichiers: libtorrent recalcule alors toutes les priorites de pieces du fichier)"""
+        with self._lock:
+            self.applied = np.array(self.handle.get_piece_priorities(), dtype=np.uint8)
+            if self._strategy is not None:
+                self._apply_strategy_locked(self._strategy)
+
+    def set_throttled(self, throttled: bool) -> bool:
+        """Active/desactive le bridage des pieces sans deadline; True si l'etat a change"""
+        with self._lock:
+            if throttled == self.throttled:
+                return False
+            self.throttled = throttled
+            if self._strategy is not None:
+                self._apply_strategy_locked(self._strategy)
+            return True
+
+    def _apply_strategy_locked(self, strategy: Tuple[str, int]) -> int:
+        """Calcule la strategie sur la plage du fichier, superpose les epinglages, applique"""
+        self._strategy = strategy
+        first = self.first_piece
+        file_pieces = self.last_piece - first + 1
+        kind, seek_piece = strategy
+        if kind == 'seek':
+            local, local_deadlines = self.seek_layout(file_pieces, min(max(seek_piece - first, 0), file_pieces - 1))
+            self.throttled = False  # Le buffer est a la nouvelle position: il est a reconstruire
+        else:
+            local, local_deadlines = self.instant_access_layout(file_pieces)
+
+        priorities = np.zeros(self.num_pieces, dtype=np.uint8)
+        if not self.throttled:
+            priorities[first:first + file_pieces] = local
+        deadlines = {piece + first: deadline for piece, deadline in local_deadlines.items()}
+        if self.pinned:
+            deadlines.update(self.pinned)
+        # Pieces a deadline (strategie, epinglages, scheduler) jamais sous 7: une priorite 0 les annulerait
+        priorities[list(deadlines.keys() | self.keep_deadlines().keys())] = 7
+        return self._apply_locked(priorities, deadlines)
+
+    def _apply_locked(self, priorities: np.ndarray, deadlines: Dict[int, int]) -> int:
+        changed = np.flatnonzero(priorities != self.applied)
+        if changed.size > self.num_pieces // 2:
+            # Changement massif: une liste complete coute moins cher que des paires
+            self.handle.prioritize_pieces(priorities.tolist())
+        elif changed.size:
+            self.handle.prioritize_pieces(list(zip(changed.tolist(), priorities[changed].tolist())))
+        self.applied = priorities.copy()
+
+        keep = self.keep_deadlines()
+        for piece in self.deadlines.keys() - deadlines.keys():
+            if piece not in keep:
+                self.handle.reset_piece_deadline(piece)
+        for piece, deadline in deadlines.items():
+            if self.deadlines.get(piece) != deadline:
+                self.handle.set_piece_deadline(piece, deadline)
+        self.deadlines = deadlines
+        if deadlines:
+            # libtorrent monte a 7 les pieces avec deadline: refleter l'etat reel pour le prochain diff
+            self.applied[list(deadlines)] = 7
+
+        self.stats['applies'] += 1
+        self.stats['pieces_sent'] += int(changed.size)
+        return int(changed.size)
+
+    def request_seek(self, seek_piece: int):
+        """Seek immediat si calme, sinon regroupe: seul le dernier d'une rafale est applique"""
+        with self._lock:
+            self._pending_seek = seek_piece
+            if self._timer is not None:
+                self.stats['coalesced_seeks'] += 1
+                return
+
+            wait = SEEK_DEBOUNCE - (time.monotonic() - self._last_seek_apply)
+            if wait <= 0:
+                self._flush_seek_locked()
+            else:
+                self._timer = threading.Timer(wait, self._flush_seek)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_seek(self):
+        with self._lock:
+            self._timer = None
+            self._flush_seek_locked()
+
+    def _flush_seek_locked(self):
+        if self._pending_seek is None:
+            return
+        seek_piece, self._pending_seek = self._pending_seek, None
+        self._last_seek_apply = time.monotonic()
+        self._apply_strategy_locked(('seek', seek_piece))
+
+    def reset(self):
+        """Toutes les pieces a 0 sans deadline: plus rien n'est demande (torrent mis en pause)"""
+        with self._lock:
+            self.handle.clear_piece_deadlines()
+            self.handle.prioritize_pieces([0] * self.num_pieces)
+            self.applied = np.zeros(self.num_pieces, dtype=np.uint8)
+            self.deadlines = {}
+            self.pinned = {}
+            self._strategy = None
+            self.throttled = False
+
+    def close(self):
+        """Annule un seek en attente (torrent arrete)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending_seek = None
+
+
 class RealStreamingService:
     """Service de streaming torrent reel avec libtorrent"""
 
@@ -33,9 +523,15 @@ class RealStreamingService:
             'announce_to_all_trackers': True,
             'aio_threads': 4,
             'checking_mem_usage': 256,
+            'alert_mask': (lt.alert_category.status | lt.alert_category.error |
+                           lt.alert_category.storage | lt.alert_category.piece_progress),
         }
 
-        self.session = lt.session(settings)
+        # Table DHT de la session precedente: pas d'attente des routeurs au premier magnet
+        session_params, self.dht_restored_nodes = self._load_dht_state()
+        session_params.settings = settings
+        self.session = lt.session(session_params)
+        self.dht_nodes = 0  # Mis a jour par session_stats_alert
 
         # Ajouter des DHT bootstrap nodes supplementaires
         try:
@@ -48,7 +544,32 @@ class RealStreamingService:
 
         self.active_torrents: Dict[str, Dict] = {}
         self.download_progress: Dict[str, int] = {}
-        
+        # Torrents arretes, en pause avec leurs fichiers: du plus ancien au plus recent
+        self.warm_pool: OrderedDict[str, Dict] = OrderedDict()
+        # Recuperations de metadonnees en cours (aucun fichier telecharge) et leur resultat
+        self.prefetching: Dict[str, Dict] = {}  # info_hash -> {'handle', 'lt_hash', 'started_at'}
+        self.metadata_cache: OrderedDict[str, Tuple[lt.torrent_info, float]] = OrderedDict()  # -> (ti, expiration)
+        self._prefetch_lock = threading.Lock()
+
+        # Lecteurs en attente de pieces: (info_hash, piece) -> [(loop, future)]
+        self.piece_waiters: Dict[Tuple[str, int], List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self.handle_index: Dict[str, str] = {}  # hash libtorrent -> info_hash
+        self._waiters_lock = threading.Lock()
+
+        # Derniers snapshots publies par la boucle d'alertes (aucun appel libtorrent en lecture)
+        self.snapshots: Dict[str, TorrentSnapshot] = {}
+
+        # Resume data demandees et pas encore ecrites (attendues a l'arret)
+        self._pending_resume = 0
+        self._resume_cond = threading.Condition()
+
+        # Boucle d'alertes unique pour tous les torrents (remplace un thread par torrent)
+        alert_thread = threading.Thread(target=self._alert_loop, daemon=True)
+        alert_thread.start()
+
+        # Torrents de la session precedente: reprise sans aller-retour vers l'essaim
+        self._restore_torrents()
+
     def extract_info_hash(self, magnet_link: str) -> Optional[str]:
         """Extrait l'info hash d'un magnet link"""
         try:
@@ -60,99 +581,916 @@ class RealStreamingService:
         except:
             return None
     
-    def start_download(self, magnet_link: str, title: str = "Unknown") -> Optional[str]:
-        """Demarre le telechargement d'un torrent"""
+    def start_download(self, magnet_link: str, title: str = "Unknown", file_index: Optional[int] = None,
+                       episode: Optional[str] = None) -> Optional[str]:
+        """Demarre le telechargement d'un torrent (fichier choisi par index ou episode SxxEyy)"""
         info_hash = self.extract_info_hash(magnet_link)
         if not info_hash:
             logger.error(f"Impossible d'extraire l'info hash de: {magnet_link[:100]}...")
             return None
         
+        if info_hash in self.warm_pool:
+            # Deja en pause avec ses pieces: reprise sans metadonnees ni essaim a recontacter
+            self._resume_warm_torrent(info_hash)
+
         if info_hash in self.active_torrents:
             logger.info(f"Torrent deja en cours: {title}")
+            if file_index is not None or episode:
+                # Meme pack, autre episode: basculer le fichier telecharge
+                self.select_file(info_hash, file_index, episode)
             return info_hash
         
+        file_request = {'file_index': file_index, 'episode': episode}
+        with self._prefetch_lock:
+            prefetch = self.prefetching.pop(info_hash, None)
+            cached = self.metadata_cache.pop(info_hash, None)
+            if prefetch:
+                # Metadonnees en cours de recuperation: le torrent deja dans la session devient le stream
+                self._register_torrent(info_hash, prefetch['lt_hash'], title, magnet_link, file_request)
+        if prefetch:
+            self._adopt_prefetch(info_hash, prefetch['handle'])
+            return info_hash
+
         try:
             # Parametres du torrent
-            params = {
-                'save_path': CACHE_DIR,
-                'storage_mode': lt.storage_mode_t(1),  # sparse mode
-            }
-            
-            # Ajouter le torrent
-            handle = lt.add_magnet_uri(self.session, magnet_link, params)
-            
-            self.active_torrents[info_hash] = {
-                'handle': handle,
-                'title': title,
-                'magnet': magnet_link,
-                'status': 'downloading',
-                'files': [],
-                'ready_file': None
-            }
-            
-            self.download_progress[info_hash] = 0
-            
-            # Demarrer le monitoring en arriere-plan
-            monitor_thread = threading.Thread(
-                target=self._monitor_torrent, 
-                args=(info_hash,),
-                daemon=True
-            )
-            monitor_thread.start()
+            params = lt.parse_magnet_uri(magnet_link)
+            params.save_path = CACHE_DIR
+            params.storage_mode = lt.storage_mode_t(1)  # sparse mode
+            if cached:
+                params.ti = cached[0]  # Metadonnees pre-chargees: pas de phase DHT/ut_metadata
+            self._add_torrent(info_hash, params, title, magnet_link, file_request)
             
             logger.info(f"Torrent ajoute: {title} ({info_hash})")
             return info_hash
             
         except Exception as e:
             logger.error(f"Erreur ajout torrent {title}: {e}")
+            self.active_torrents.pop(info_hash, None)
+            self.download_progress.pop(info_hash, None)
+            self.snapshots.pop(info_hash, None)
             return None
-    
-    def _monitor_torrent(self, info_hash: str):
-        """Monitore le progres d'un torrent avec optimisation acces instantane"""
-        torrent_info = self.active_torrents[info_hash]
-        handle = torrent_info['handle']
+
+    def _add_torrent(self, info_hash: str, params, title: str, magnet_link: str, file_request: Dict,
+                     warm: bool = False):
+        """Enregistre l'etat d'un torrent puis l'ajoute a la session (magnet ou reprise, actif ou en pause)"""
+        self._register_torrent(info_hash, self._lt_hash(params.info_hashes), title, magnet_link, file_request, warm)
         
-        logger.info(f"Monitoring torrent: {torrent_info['title']}")
+        # Ajout non bloquant: la boucle d'alertes recupere le handle
+        self.session.async_add_torrent(params)
+
+    def _register_torrent(self, info_hash: str, lt_hash: str, title: str, magnet_link: str, file_request: Dict,
+                          warm: bool = False):
+        """Cree l'entree d'etat d'un torrent (handle connu a la reception de add_torrent_alert)"""
+        torrent_info = {
+            'handle': None,  # Connu a la reception de add_torrent_alert
+            'lt_hash': lt_hash,
+            'title': title,
+            'magnet': magnet_link,
+            'status': 'downloading',
+            'files': [],
+            'torrent_file': None,
+            'ready_file': None,
+            'file_index': None,
+            'file_request': file_request,  # Choix du fichier demande au demarrage
+            'have': None,  # Bitfield vivant des pieces (ecrit par la boucle d'alertes)
+            'read_offset': 0,  # Derniere position lue dans le fichier video
+            'scheduler': None,  # StreamScheduler une fois le fichier video choisi
+            'priorities': None,  # PiecePriorityState une fois les metadonnees recues
+            'container': None,  # ContainerLayout une fois l'en-tete du fichier inspecte
+            'time_index': None,  # TimeIndex (keyframes) une fois l'index du conteneur lu
+            'time_index_attempted': False,
+            'media_duration': None,  # Duree donnee par la sonde media (ffprobe)
+            'prebuffer_pieces': None,  # Plage [first, last] du prebuffer epinglee avant le demarrage
+            'added_at': time.time(),
+            'last_read': time.time(),  # Derniere lecture (eviction des torrents les moins regardes)
+            'readers': {},  # reader_id -> derniere lecture, y compris une fois le torrent complet
+            'bandwidth': None,  # Derniers reglages de l'arbitre de bande passante
+            'last_logged_progress': 0
+        }
         
+        if warm:
+            self.warm_pool[info_hash] = torrent_info
+        else:
+            self.active_torrents[info_hash] = torrent_info
+            self.download_progress[info_hash] = 0
+            self.snapshots[info_hash] = TorrentSnapshot(updated_at=time.time())
+        self.handle_index[lt_hash] = info_hash
+        self._save_torrent_state(info_hash)
+
+    @staticmethod
+    def _lt_hash(info_hashes) -> str:
+        """Cle stable d'un torrent cote libtorrent (v1, ou v2 tronque pour les torrents v2 purs)"""
+        return str(info_hashes.v1) if info_hashes.has_v1() else str(info_hashes.get_best())
+
+    def _alert_loop(self):
+        """Boucle unique d'evenements libtorrent pour tous les torrents"""
+        last_update_request = 0.0
+        last_resume_save = last_dht_save = time.monotonic()
+        last_stats_request = last_prefetch_check = 0.0
+        last_have_resync = time.monotonic()
+        resync_have = False
         while True:
             try:
-                status = handle.status()
-                
-                # Mise a jour du progres
-                progress = int(status.progress * 100)
-                self.download_progress[info_hash] = progress
-                
-                # Check si on a les metadonnees
-                if status.has_metadata and not torrent_info['files']:
-                    torrent_info['files'] = [f for f in handle.torrent_file().files()]
-                    logger.info(f"Metadonnees recues: {len(torrent_info['files'])} fichiers")
-                    
-                    # IMMEDIATEMENT configurer les priorites pour acces instantane
-                    self._setup_instant_access_priorities(info_hash)
-                
-                # Streaming pret des 1% si on a les metadonnees (acces instantane)
-                if progress >= 1 and status.has_metadata and torrent_info['status'] == 'downloading':
-                    video_file = self._find_video_file(info_hash)
-                    if video_file:
-                        torrent_info['status'] = 'streaming'
-                        torrent_info['ready_file'] = video_file
-                        logger.info(f"Streaming instantane a {progress}%: {video_file}")
-                
-                # Check si termine
-                if status.is_seeding or progress >= 100:
-                    torrent_info['status'] = 'completed'
-                    logger.info(f"Telechargement termine: {torrent_info['title']}")
-                    break
-                
-                # Log periodique
-                if progress % 10 == 0 and progress > 0:
-                    logger.info(f" {torrent_info['title']}: {progress}% - {status.num_peers} peers")
-                
-                time.sleep(2)
-                
+                # Demander les status modifies (reponse: state_update_alert)
+                now = time.monotonic()
+                if now - last_update_request >= STATUS_UPDATE_INTERVAL:
+                    # Sans query_pieces: le bitfield est tenu a jour par piece_finished (et _resync_have)
+                    self.session.post_torrent_updates(0)
+                    last_update_request = now
+                if now - last_resume_save >= RESUME_SAVE_INTERVAL:
+                    self.save_resume_data()
+                    last_resume_save = now
+                if now - last_stats_request >= SESSION_STATS_INTERVAL:
+                    self.session.post_session_stats()
+                    last_stats_request = now
+                if now - last_dht_save >= DHT_SAVE_INTERVAL:
+                    self.save_dht_state()
+                    last_dht_save = now
+                if now - last_prefetch_check >= PREFETCH_CHECK_INTERVAL:
+                    self._expire_prefetch()
+                    last_prefetch_check = now
+                if resync_have or now - last_have_resync >= HAVE_RESYNC_INTERVAL:
+                    self._resync_have()
+                    resync_have, last_have_resync = False, now
+
+                self.session.wait_for_alert(int(STATUS_UPDATE_INTERVAL * 1000))
+                # Handler en erreur: la piece_finished_alert perdue est rattrapee par un recalage
+                resync_have = not self._dispatch_alerts(self.session.pop_alerts())
+            except Exception as e:
+                logger.error(f"Erreur boucle alertes: {e}")
+                time.sleep(1)
+
+    def _dispatch_alerts(self, alerts) -> bool:
+        """Route un lot d'alertes; une erreur dans un handler ne perd pas les suivantes.
+        Faux si au moins un handler a echoue"""
+        ok = True
+        for alert in alerts:
+            try:
+                self._dispatch_alert(alert)
             except Exception as e:
-                logger.error(f"Erreur monitoring {info_hash}: {e}")
-                break
+                logger.error(f"Erreur alerte {alert.what()}: {e}")
+                ok = False
+        return ok
+
+    def _resync_have(self):
+        """Recale le bitfield de chaque torrent actif sur les pieces reellement presentes"""
+        for info_hash, torrent_info in list(self.active_torrents.items()):
+            handle = torrent_info['handle']
+            if torrent_info['have'] is None or handle is None or not handle.is_valid():
+                continue
+            try:
+                pieces = handle.status(lt.status_flags_t.query_pieces).pieces
+                self._merge_have(info_hash, np.fromiter(pieces, dtype=np.uint8, count=len(pieces)))
+            except Exception as e:
+                logger.warning(f"Recalage des pieces impossible pour {info_hash}: {e}")
+
+    def _merge_have(self, info_hash: str, pieces: np.ndarray) -> List[int]:
+        """Ajoute au bitfield les pieces presentes qu'il ignore (alertes perdues) et reveille leurs lecteurs"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return []
+        with self._waiters_lock:
+            have = torrent_info['have']
+            if have is None or len(have) != len(pieces):
+                return []
+            missed = np.flatnonzero(pieces > have)
+            have[missed] = 1
+        if not missed.size:
+            return []
+
+        logger.warning(f"{missed.size} pieces rattrapees par recalage pour {torrent_info['title']}")
+        self._publish_snapshot(info_hash)
+        for piece in missed.tolist():
+            self._wake_piece_waiters(info_hash, piece)
+        self._advance_media_index(info_hash)
+        return missed.tolist()
+
+    def _dispatch_alert(self, alert):
+        """Route une alerte libtorrent vers son handler. Un torrent peut etre detache a tout moment par
+        un autre thread (arret, suppression, eviction): les handlers relisent son entree avec .get()"""
+        if isinstance(alert, lt.state_update_alert):
+            for status in alert.status:
+                info_hash = self.handle_index.get(self._lt_hash(status.info_hashes))
+                if info_hash in self.active_torrents:
+                    self._on_status_update(info_hash, status)
+            return
+
+        if isinstance(alert, lt.session_stats_alert):
+            self.dht_nodes = alert.values.get('dht.dht_nodes', 0)
+            return
+
+        if not isinstance(alert, lt.torrent_alert):
+            return
+
+        info_hash = self.handle_index.get(self._lt_hash(alert.handle.info_hashes()))
+
+        if isinstance(alert, lt.save_resume_data_alert):
+            self._on_resume_data(info_hash, alert.params)
+        elif isinstance(alert, lt.save_resume_data_failed_alert):
+            self._resume_done()
+        elif isinstance(alert, lt.add_torrent_alert):
+            self._on_torrent_added(info_hash, alert)
+        elif info_hash in self.prefetching:
+            if isinstance(alert, lt.metadata_received_alert):
+                self._on_prefetch_metadata(info_hash)
+        elif info_hash not in self.active_torrents:
+            return
+        elif isinstance(alert, lt.piece_finished_alert):
+            self._on_piece_finished(info_hash, alert.piece_index)
+        elif isinstance(alert, lt.metadata_received_alert):
+            self._on_metadata_received(info_hash)
+        elif isinstance(alert, lt.file_prio_alert):
+            # prioritize_files applique: les priorites de pieces viennent d'etre ecrasees
+            priorities = (self.active_torrents.get(info_hash) or {}).get('priorities')
+            if priorities is not None:
+                priorities.resync()
+        elif isinstance(alert, lt.torrent_finished_alert):
+            self._on_torrent_finished(info_hash)
+
+    def _on_torrent_added(self, info_hash: Optional[str], alert):
+        """add_torrent_alert: le handle est disponible"""
+        if info_hash in self.warm_pool:
+            # Restaure en pause depuis le pool chaud de la session precedente
+            self.warm_pool[info_hash]['handle'] = alert.handle
+            return
+        with self._prefetch_lock:
+            prefetch = self.prefetching.get(info_hash)
+            if prefetch is not None and not alert.error.value():
+                prefetch['handle'] = alert.handle
+        if prefetch is not None:
+            self._on_prefetch_added(info_hash, alert)
+            return
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            # Arrete avant la fin de l'ajout asynchrone
+            if alert.handle.is_valid():
+                self.session.remove_torrent(alert.handle, lt.options_t.delete_files)
+            return
+
+        if alert.error.value():
+            torrent_info['status'] = 'error'
+            logger.error(f"Erreur ajout torrent {torrent_info['title']}: {alert.error.message()}")
+            return
+
+        torrent_info['handle'] = alert.handle
+        logger.info(f"Monitoring torrent: {torrent_info['title']}")
+
+        # Metadonnees deja presentes (fichier .torrent ou cache)
+        if alert.handle.status().has_metadata:
+            self._on_metadata_received(info_hash)
+
+    def _state_path(self, info_hash: str, extension: str) -> str:
+        return os.path.join(RESUME_DIR, f"{info_hash}.{extension}")
+
+    def _write_state_file(self, info_hash: str, extension: str, data: bytes):
+        write_file_atomic(self._state_path(info_hash, extension), data)
+
+    @staticmethod
+    def _load_dht_state() -> Tuple[lt.session_params, int]:
+        """Parametres de session avec la table DHT sauvegardee (et son nombre de noeuds)"""
+        try:
+            with open(DHT_STATE_PATH, 'rb') as f:
+                data = f.read()
+            params = lt.read_session_params(data, lt.save_state_flags_t.save_dht_state)
+            dht_state = lt.bdecode(data).get(b'dht state', {})
+            nodes = len(dht_state.get(b'nodes', [])) + len(dht_state.get(b'nodes6', []))  # Endpoints compacts
+            logger.info(f"Table DHT restauree: {nodes} noeuds")
+            return params, nodes
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Table DHT illisible, bootstrap depuis les routeurs: {e}")
+        return lt.session_params(), 0
+
+    def save_dht_state(self):
+        """Sauvegarde la table de routage DHT courante"""
+        try:
+            flags = lt.save_state_flags_t.save_dht_state
+            write_file_atomic(DHT_STATE_PATH, lt.write_session_params_buf(self.session.session_state(flags), flags))
+        except Exception as e:
+            logger.warning(f"Sauvegarde table DHT impossible: {e}")
+
+    def get_readiness(self) -> Dict:
+        """Etat de preparation: la DHT connait assez de noeuds pour resoudre les magnets"""
+        dht_running = self.session.is_dht_running()
+        return {
+            'ready': dht_running and self.dht_nodes >= DHT_READY_NODES,
+            'dht_running': dht_running,
+            'dht_nodes': self.dht_nodes,
+            'dht_ready_nodes': DHT_READY_NODES,
+            'dht_restored_nodes': self.dht_restored_nodes,
+            'active_torrents': len(self.active_torrents),
+            'warm_torrents': len(self.warm_pool),
+        }
+
+    def _save_torrent_state(self, info_hash: str):
+        """Titre, magnet, fichier choisi et pause (.json), necessaires pour recreer l'entree au redemarrage"""
+        torrent_info = self._get_torrent_info(info_hash)
+        state = {
+            'title': torrent_info['title'],
+            'magnet': torrent_info['magnet'],
+            'file_request': torrent_info['file_request'],
+            'warm': info_hash in self.warm_pool,
+        }
+        try:
+            self._write_state_file(info_hash, 'json', json.dumps(state).encode())
+        except OSError as e:
+            logger.warning(f"Sauvegarde etat torrent impossible: {e}")
+
+    def _forget_torrent_state(self, info_hash: str):
+        for extension in ('json', 'torrent', 'resume'):
+            try:
+                os.remove(self._state_path(info_hash, extension))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Suppression etat torrent impossible: {e}")
+
+    def save_resume_data(self, only_modified: bool = True) -> int:
+        """Demande les resume data des torrents (reponses ecrites par la boucle d'alertes)"""
+        flags = lt.torrent_handle.save_info_dict
+        if only_modified:
+            flags |= lt.torrent_handle.only_if_modified
+        requested = 0
+        for torrent_info in list(self.active_torrents.values()) + list(self.warm_pool.values()):
+            handle = torrent_info['handle']
+            if handle is None or not handle.is_valid() or torrent_info['torrent_file'] is None:
+                continue
+            with self._resume_cond:
+                self._pending_resume += 1
+            handle.save_resume_data(flags)
+            requested += 1
+        return requested
+
+    def _on_resume_data(self, info_hash: Optional[str], params):
+        """save_resume_data_alert: ecrit la resume data (inclut les metadonnees)"""
+        try:
+            if info_hash in self.active_torrents or info_hash in self.warm_pool:
+                self._write_state_file(info_hash, 'resume', lt.write_resume_data_buf(params))
+        except Exception as e:
+            logger.warning(f"Ecriture resume data impossible: {e}")
+        finally:
+            self._resume_done()
+
+    def _resume_done(self):
+        with self._resume_cond:
+            self._pending_resume = max(0, self._pending_resume - 1)
+            self._resume_cond.notify_all()
+
+    def _restore_torrents(self):
+        """Re-ajoute les torrents sauvegardes: resume data, sinon .torrent, sinon magnet"""
+        for name in sorted(os.listdir(RESUME_DIR)):
+            if not name.endswith('.json'):
+                continue
+            info_hash = name[:-len('.json')]
+            try:
+                with open(self._state_path(info_hash, 'json')) as f:
+                    state = json.load(f)
+                params = self._load_resume_params(info_hash, state['magnet'])
+                params.save_path = CACHE_DIR
+                params.storage_mode = lt.storage_mode_t(1)
+                if state.get('warm'):
+                    # Reste en pause dans le pool chaud (les resume data gardent les priorites a 0)
+                    params.flags = (params.flags | lt.torrent_flags.paused) & ~lt.torrent_flags.auto_managed
+                else:
+                    params.flags = (params.flags | lt.torrent_flags.auto_managed) & ~lt.torrent_flags.paused
+                self._add_torrent(info_hash, params, state['title'], state['magnet'], state.get('file_request') or {},
+                                  warm=bool(state.get('warm')))
+                logger.info(f"Torrent restaure: {state['title']} ({info_hash}, "
+                            f"{'metadonnees locales' if params.ti else 'magnet'}"
+                            f"{', en pause' if state.get('warm') else ''})")
+            except Exception as e:
+                logger.error(f"Restauration torrent {info_hash} impossible: {e}")
+                self.active_torrents.pop(info_hash, None)
+                self.warm_pool.pop(info_hash, None)
+
+    def _load_resume_params(self, info_hash: str, magnet_link: str):
+        resume_path = self._state_path(info_hash, 'resume')
+        if os.path.exists(resume_path):
+            try:
+                with open(resume_path, 'rb') as f:
+                    return lt.read_resume_data(f.read())
+            except Exception as e:
+                logger.warning(f"Resume data illisible ({info_hash}): {e}")
+
+        params = lt.parse_magnet_uri(magnet_link)
+        torrent_path = self._state_path(info_hash, 'torrent')
+        if os.path.exists(torrent_path):
+            params.ti = lt.torrent_info(torrent_path)  # Metadonnees sans passer par l'essaim
+        return params
+
+    def shutdown(self, timeout: float = SHUTDOWN_SAVE_TIMEOUT):
+        """Arret: sauvegarde la table DHT et les resume data de tous les torrents"""
+        self.save_dht_state()
+        self.session.pause()
+        requested = self.save_resume_data(only_modified=False)
+        with self._resume_cond:
+            self._resume_cond.wait_for(lambda: self._pending_resume == 0, timeout=timeout)
+            remaining = self._pending_resume
+        logger.info(f"Resume data sauvegardees: {requested - remaining}/{requested} torrents")
+
+    def prefetch_metadata(self, magnet_link: str) -> Optional[str]:
+        """Recupere en arriere-plan les metadonnees d'un magnet, sans telecharger aucun fichier"""
+        info_hash = self.extract_info_hash(magnet_link)
+        if not info_hash:
+            return None
+        with self._prefetch_lock:
+            if (info_hash in self.active_torrents or info_hash in self.warm_pool
+                    or info_hash in self.prefetching or info_hash in self.metadata_cache):
+                return info_hash
+            if len(self.prefetching) >= PREFETCH_MAX_ACTIVE:
+                return None
+            try:
+                params = lt.parse_magnet_uri(magnet_link)
+            except Exception as e:
+                logger.warning(f"Magnet invalide pour le pre-chargement: {e}")
+                return None
+            params.save_path = CACHE_DIR
+            params.storage_mode = lt.storage_mode_t(1)
+            # Priorites appliquees a la reception des metadonnees (les entrees en trop sont ignorees);
+            # les fichiers au-dela sont mis a 0 par _on_prefetch_metadata, nombre de fichiers connu
+            params.file_priorities = [0] * 4096
+            # Hors file d'attente: ne prend pas la place d'un stream actif
+            params.flags &= ~(lt.torrent_flags.auto_managed | lt.torrent_flags.paused)
+
+            lt_hash = self._lt_hash(params.info_hashes)
+            self.prefetching[info_hash] = {'handle': None, 'lt_hash': lt_hash, 'started_at': time.monotonic()}
+            self.handle_index[lt_hash] = info_hash
+        self.session.async_add_torrent(params)
+        return info_hash
+
+    def _on_prefetch_added(self, info_hash: str, alert):
+        if alert.error.value():
+            with self._prefetch_lock:
+                prefetch = self.prefetching.pop(info_hash, None)
+            if prefetch:
+                self.handle_index.pop(prefetch['lt_hash'], None)
+            logger.debug(f"Pre-chargement impossible {info_hash}: {alert.error.message()}")
+        elif alert.handle.status().has_metadata:
+            self._on_prefetch_metadata(info_hash)
+
+    def _on_prefetch_metadata(self, info_hash: str):
+        """Metadonnees pre-chargees: mises en cache, torrent retire de la session"""
+        with self._prefetch_lock:
+            prefetch = self.prefetching.pop(info_hash, None)
+            if prefetch is not None:
+                torrent_file = prefetch['handle'].torrent_file()
+                # Liste initiale de taille fixe: les fichiers au-dela seraient a la priorite par defaut
+                prefetch['handle'].prioritize_files([0] * torrent_file.num_files())
+                self._cache_metadata(info_hash, torrent_file)
+                # Rien n'a ete ecrit (priorites a 0): retrait sans suppression de fichiers
+                self.session.remove_torrent(prefetch['handle'])
+                self.handle_index.pop(prefetch['lt_hash'], None)
+        if prefetch is None:
+            # Adopte par start_download entre-temps: c'est maintenant un stream
+            if info_hash in self.active_torrents:
+                self._on_metadata_received(info_hash)
+            return
+        logger.info(f"Metadonnees pre-chargees: {torrent_file.name()} ({torrent_file.num_files()} fichiers, "
+                    f"{time.monotonic() - prefetch['started_at']:.1f}s)")
+
+    def _cache_metadata(self, info_hash: str, torrent_file: lt.torrent_info):
+        self.metadata_cache[info_hash] = (torrent_file, time.monotonic() + METADATA_CACHE_TTL)
+        self.metadata_cache.move_to_end(info_hash)
+        while len(self.metadata_cache) > METADATA_CACHE_SIZE:
+            self.metadata_cache.popitem(last=False)
+
+    def _adopt_prefetch(self, info_hash: str, handle):
+        """Le torrent de pre-chargement devient le stream (sans re-ajout a la session)"""
+        logger.info(f"Torrent adopte depuis le pre-chargement: {self.active_torrents[info_hash]['title']}")
+        if handle is None:
+            return  # add_torrent_alert pas encore recue: geree comme un ajout normal
+        self.active_torrents[info_hash]['handle'] = handle
+        handle.set_flags(lt.torrent_flags.auto_managed)
+        if handle.status().has_metadata:
+            self._on_metadata_received(info_hash)
+
+    def _expire_prefetch(self):
+        """Abandonne les recuperations trop longues et oublie les metadonnees expirees"""
+        now = time.monotonic()
+        with self._prefetch_lock:
+            for info_hash, prefetch in list(self.prefetching.items()):
+                if now - prefetch['started_at'] > PREFETCH_TIMEOUT:
+                    del self.prefetching[info_hash]
+                    self.handle_index.pop(prefetch['lt_hash'], None)
+                    if prefetch['handle'] is not None:
+                        self.session.remove_torrent(prefetch['handle'])
+            for info_hash, (_, expires_at) in list(self.metadata_cache.items()):
+                if expires_at <= now:
+                    del self.metadata_cache[info_hash]
+
+    def get_prefetched_metadata(self, info_hash: str) -> Optional[Dict]:
+        """Fichiers, tailles et conteneur du fichier video d'un resultat pre-charge (None si inconnu)"""
+        cached = self.metadata_cache.get(info_hash)
+        if not cached:
+            return None
+        files = list(cached[0].files())
+        video_index = find_video_file_index(files)
+        container = None
+        if video_index is not None:
+            container = os.path.splitext(files[video_index].path)[1].lstrip('.').lower()
+        return {
+            'name': cached[0].name(),
+            'total_size': cached[0].total_size(),
+            'files': describe_files(files, video_index),
+            'video_file_index': video_index,
+            'container': container,  # Extension du fichier video (mkv, mp4...)
+        }
+
+    def _on_metadata_received(self, info_hash: str):
+        """metadata_received_alert: fichiers connus, priorites d'acces instantane"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        if torrent_info['files'] or torrent_info['handle'] is None:
+            return
+
+        handle = torrent_info['handle']
+        torrent_info['torrent_file'] = handle.torrent_file()
+        torrent_info['files'] = [f for f in torrent_info['torrent_file'].files()]
+        logger.info(f"Metadonnees recues: {len(torrent_info['files'])} fichiers")
+
+        # Metadonnees persistees: un redemarrage n'a plus besoin de l'essaim pour les obtenir
+        try:
+            if not os.path.exists(self._state_path(info_hash, 'torrent')):
+                torrent = lt.create_torrent(torrent_info['torrent_file']).generate()
+                self._write_state_file(info_hash, 'torrent', lt.bencode(torrent))
+        except Exception as e:
+            logger.warning(f"Sauvegarde .torrent impossible: {e}")
+
+        # Bitfield initial (pieces deja presentes sur disque), ensuite maintenu par piece_finished
+        pieces = handle.status(lt.status_flags_t.query_pieces).pieces
+        with self._waiters_lock:
+            torrent_info['have'] = np.fromiter(pieces, dtype=np.uint8, count=len(pieces))
+        self._publish_snapshot(info_hash)
+
+        torrent_info['priorities'] = PiecePriorityState(
+            handle, torrent_info['torrent_file'].num_pieces(),
+            keep_deadlines=lambda: torrent_info['scheduler'].deadlines if torrent_info['scheduler'] else {}
+        )
+        # Priorites reelles (resume data d'un torrent mis en pause: tout a 0) comme base du diff
+        torrent_info['priorities'].applied = np.array(handle.get_piece_priorities(), dtype=np.uint8)
+        
+        # Fichier a streamer, puis IMMEDIATEMENT les priorites pour acces instantane
+        self._apply_file_selection(info_hash, self._choose_file_index(info_hash))
+
+    def _apply_file_selection(self, info_hash: str, file_index: Optional[int]):
+        """Ne telecharge que le fichier choisi et limite la strategie de pieces a sa plage"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        if file_index is None:
+            # Aucun fichier video reconnu: strategie sur tout le torrent
+            torrent_info['handle'].prioritize_files([LT_DEFAULT_PRIORITY] * len(torrent_info['files']))
+            self._setup_instant_access_priorities(info_hash)
+            return
+
+        previous = torrent_info['file_index']
+        torrent_info['file_index'] = file_index
+        if previous is not None and previous != file_index:
+            # Changement d'episode: tout l'etat lie a l'ancien fichier est perime
+            torrent_info.update(read_offset=0, scheduler=None, container=None, media_duration=None,
+                                time_index=None, time_index_attempted=False)
+            if torrent_info['status'] in ['streaming', 'completed']:
+                torrent_info['status'] = 'streaming'
+                self._select_video_file(info_hash)
+
+        files = torrent_info['files']
+        torrent_info['handle'].prioritize_files([4 if i == file_index else 0 for i in range(len(files))])
+        first, last = self.map_byte_range_to_pieces(info_hash, 0, files[file_index].size)
+        torrent_info['priorities'].select_range(first, last)
+        torrent_info['prebuffer_pieces'] = None  # Epinglages de l'ancien fichier effaces par select_range
+        self._setup_instant_access_priorities(info_hash)
+        logger.info(f"Fichier selectionne [{file_index}]: {files[file_index].path} "
+                    f"(pieces {first}-{last}, {len(files) - 1} autres fichiers ignores)")
+
+        # En-tete du fichier video en premier: il indique ou se trouve l'index du conteneur
+        first, last = self.map_byte_range_to_pieces(info_hash, 0, HEAD_PROBE_BYTES)
+        torrent_info['priorities'].pin(list(range(first, last + 1)), CONTAINER_HEAD_DEADLINE)
+        self._inspect_container(info_hash)
+
+    def _on_status_update(self, info_hash: str, status):
+        """state_update_alert: progression et transitions d'etat d'un torrent"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        
+        # Mise a jour du progres
+        progress = int(status.progress * 100)
+        self.download_progress[info_hash] = progress
+        self._publish_snapshot(info_hash, status)
+        self._update_watermark(info_hash)
+        
+        # Streaming pret des que le buffer devant la lecture couvre le prebuffer estime
+        snapshot = self.snapshots.get(info_hash)
+        if snapshot is None:
+            return
+        if torrent_info['status'] == 'downloading' and snapshot.prebuffer_bytes:
+            self._pin_prebuffer(info_hash, snapshot.prebuffer_bytes)
+        if snapshot.ready and status.has_metadata and torrent_info['status'] == 'downloading':
+            video_file = self._select_video_file(info_hash)
+            if video_file:
+                torrent_info['status'] = 'streaming'
+                self._unpin_prebuffer(info_hash)  # La fenetre de lecture prend le relais
+                logger.info(f"Streaming pret a {progress}% ({snapshot.buffered_ahead // 1024} KB "
+                            f"devant la lecture, {snapshot.prebuffer_bytes // 1024} KB requis): {video_file}")
+        
+        # Check si termine
+        if status.is_seeding or progress >= 100:
+            self._on_torrent_finished(info_hash)
+            return
+        
+        # Log periodique
+        if progress // 10 > torrent_info['last_logged_progress'] // 10:
+            torrent_info['last_logged_progress'] = progress
+            logger.info(f" {torrent_info['title']}: {progress}% - {status.num_peers} peers")
+
+    def _pin_prebuffer(self, info_hash: str, prebuffer_bytes: int):
+        """Telecharge le debut du prebuffer en tete, avant les points d'acces de la strategie instantanee.
+        Epinglage limite a PLAYABLE_BUFFER_SECONDS de media: le reste d'un prebuffer d'essaim lent
+        (horizon) suit la strategie normale sans passer devant les seeks ni le bridage"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        bitrate = self._media_bitrate(torrent_info)
+        if bitrate is not None:
+            prebuffer_bytes = min(prebuffer_bytes, int(max(PLAYABLE_MIN_BYTES, bitrate * PLAYABLE_BUFFER_SECONDS)))
+        pieces = self.map_byte_range_to_pieces(info_hash, torrent_info['read_offset'], prebuffer_bytes)
+        previous = torrent_info['prebuffer_pieces']
+        if pieces is None or torrent_info['priorities'] is None or pieces == previous:
+            return
+        torrent_info['prebuffer_pieces'] = pieces
+        torrent_info['priorities'].pin(list(range(pieces[0], pieces[1] + 1)), PREBUFFER_DEADLINE,
+                                       release=range(previous[0], previous[1] + 1) if previous else ())
+
+    def _unpin_prebuffer(self, info_hash: str):
+        """Libere le prebuffer epingle (streaming demarre ou seek)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        pieces, torrent_info['prebuffer_pieces'] = torrent_info['prebuffer_pieces'], None
+        if pieces is not None and torrent_info['priorities'] is not None:
+            torrent_info['priorities'].unpin(range(pieces[0], pieces[1] + 1))
+
+    def _on_piece_finished(self, info_hash: str, piece: int):
+        """piece_finished_alert: bitfield, snapshot et lecteurs en attente"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        with self._waiters_lock:
+            if torrent_info['have'] is not None:
+                torrent_info['have'][piece] = 1
+        self._publish_snapshot(info_hash)
+        self._wake_piece_waiters(info_hash, piece)
+        self._advance_media_index(info_hash)
+
+    def _advance_media_index(self, info_hash: str):
+        """Nouvelles pieces: inspection du conteneur, puis lecture de son index"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        if torrent_info['container'] is None and torrent_info['file_index'] is not None:
+            self._inspect_container(info_hash)
+        elif torrent_info['container'] is not None and not torrent_info['time_index_attempted']:
+            self._build_time_index(info_hash)
+
+    def _read_available(self, info_hash: str, offset: int, length: int) -> Optional[bytes]:
+        """Lit une range du fichier video si toutes ses pieces sont presentes, sinon None"""
+        torrent_info = self.active_torrents[info_hash]
+        first, last = self.map_byte_range_to_pieces(info_hash, offset, length)
+        if torrent_info['have'] is None or not torrent_info['have'][first:last + 1].all():
+            return None
+
+        path = os.path.join(CACHE_DIR, torrent_info['files'][torrent_info['file_index']].path)
+        with open(path, 'rb') as f:
+            return os.pread(f.fileno(), length, offset)
+
+    def _inspect_container(self, info_hash: str):
+        """Localise l'index du conteneur des que l'en-tete est la et epingle ses pieces"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        file_size = torrent_info['files'][torrent_info['file_index']].size
+        try:
+            layout = inspect_container(lambda offset, length: self._read_available(info_hash, offset, length),
+                                       file_size)
+        except OSError as e:
+            logger.warning(f"Inspection du conteneur impossible: {e}")
+            return
+        if layout is None:
+            return  # En-tete pas encore complet, nouvel essai a la prochaine piece
+
+        torrent_info['container'] = layout
+        index_pieces = []
+        for start, end in layout.index_ranges:
+            end = min(end, start + CONTAINER_INDEX_MAX_BYTES)
+            first, last = self.map_byte_range_to_pieces(info_hash, start, end - start)
+            index_pieces.extend(range(first, last + 1))
+
+        missing = [piece for piece in index_pieces if not torrent_info['have'][piece]]
+        if missing:
+            torrent_info['priorities'].pin(missing, CONTAINER_INDEX_DEADLINE)
+        logger.info(f"Conteneur {layout.container}: index {list(layout.index_ranges)} "
+                    f"({len(missing)} pieces prioritaires)")
+        self._build_time_index(info_hash)
+
+    def _build_time_index(self, info_hash: str):
+        """Construit l'index temps -> octets des que la zone d'index est entierement telechargee"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        layout = torrent_info['container']
+        if not layout.index_ranges:
+            torrent_info['time_index_attempted'] = True  # Repli ffprobe en fin de telechargement
+            return
+
+        start, end = layout.index_ranges[0]
+        if end - start > CONTAINER_INDEX_MAX_BYTES:
+            torrent_info['time_index_attempted'] = True
+            return
+        first, last = self.map_byte_range_to_pieces(info_hash, start, end - start)
+        if not torrent_info['have'][first:last + 1].all():
+            return
+
+        torrent_info['time_index_attempted'] = True
+        try:
+            index = build_time_index(layout, lambda offset, length: self._read_available(info_hash, offset, length),
+                                     torrent_info['files'][torrent_info['file_index']].size)
+        except OSError as e:
+            logger.warning(f"Lecture de l'index impossible: {e}")
+            return
+        if index is not None:
+            self._set_time_index(info_hash, index)
+
+    def _probe_time_index(self, info_hash: str, video_path: str):
+        """Repli ffprobe (thread): scan des keyframes du fichier complet"""
+        index = probe_keyframes(video_path)
+        if index is not None and info_hash in self.active_torrents:
+            self._set_time_index(info_hash, index)
+
+    def _set_time_index(self, info_hash: str, index: TimeIndex):
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        torrent_info['time_index'] = index
+        if torrent_info['scheduler'] is not None and index.duration:
+            torrent_info['scheduler'].duration = index.duration
+        logger.info(f"Index temporel ({index.source}): {len(index)} keyframes, duree {index.duration}")
+
+    def set_media_duration(self, info_hash: str, duration: float):
+        """Duree sondee par ffprobe (media_probe): bitrate reel tant que l'index n'en donne pas"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info or torrent_info['media_duration'] == duration:
+            return
+        torrent_info['media_duration'] = duration
+        scheduler = torrent_info['scheduler']
+        if scheduler is not None and not (torrent_info['time_index'] and torrent_info['time_index'].duration):
+            scheduler.duration = duration
+
+    def _publish_snapshot(self, info_hash: str, status=None):
+        """Construit et publie un nouveau snapshot immuable (thread d'alertes uniquement)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        previous = self.snapshots.get(info_hash) or TorrentSnapshot()
+        have = torrent_info['have']
+
+        changes = {'updated_at': time.time()}
+        if status is not None:
+            changes.update(
+                state=str(status.state),
+                progress=status.progress,
+                download_rate=status.download_payload_rate,
+                upload_rate=status.upload_payload_rate,
+                num_peers=status.num_peers,
+                num_seeds=status.num_seeds,
+                has_metadata=status.has_metadata,
+            )
+        if have is not None:
+            pieces = have.copy()
+            pieces.flags.writeable = False
+            changes.update(
+                pieces=pieces,
+                pieces_done=int(np.count_nonzero(pieces)),
+                buffered_ahead=self._compute_buffered_ahead(torrent_info, pieces),
+            )
+            changes.update(self._estimate_playable(
+                torrent_info, changes['buffered_ahead'], changes.get('download_rate', previous.download_rate)
+            ))
+
+        # Remplacement atomique: les lecteurs voient l'ancien ou le nouveau, jamais un melange
+        self.snapshots[info_hash] = replace(previous, **changes)
+
+    def _media_bitrate(self, torrent_info: Dict) -> Optional[float]:
+        """Debit du media (bytes/s): taille / duree (index ou ffprobe), duree supposee sinon"""
+        if torrent_info['scheduler'] is not None:
+            return torrent_info['scheduler'].bitrate()
+        file_index = torrent_info['file_index']
+        if file_index is None or not torrent_info['files']:
+            return None
+        time_index = torrent_info['time_index']
+        duration = time_index.duration if time_index is not None else None
+        return torrent_info['files'][file_index].size / (duration or torrent_info['media_duration'] or ASSUMED_DURATION)
+
+    def _estimate_playable(self, torrent_info: Dict, buffered_ahead: int, download_rate: int) -> Dict:
+        """Prebuffer requis devant la lecture, pret ou non, et temps estime pour l'atteindre"""
+        bitrate = self._media_bitrate(torrent_info)
+        if bitrate is None:
+            return {'prebuffer_bytes': 0, 'ready': False, 'eta_playable': None}
+
+        file_size = torrent_info['files'][torrent_info['file_index']].size
+        remaining = max(0, file_size - torrent_info['read_offset'])
+        required = max(PLAYABLE_MIN_BYTES, bitrate * PLAYABLE_BUFFER_SECONDS)
+        if 0 < download_rate < bitrate:
+            # Le buffer fond pendant la lecture: en accumuler assez pour tenir PLAYABLE_HORIZON secondes
+            # (debit encore inconnu au demarrage: pas de terme d'horizon)
+            required = max(required, (bitrate - download_rate) * PLAYABLE_HORIZON)
+        required = int(min(required, remaining))
+
+        missing = required - buffered_ahead
+        if missing <= 0:
+            return {'prebuffer_bytes': required, 'ready': True, 'eta_playable': 0.0}
+        eta = round(missing / download_rate, 1) if download_rate > 0 else None
+        return {'prebuffer_bytes': required, 'ready': False, 'eta_playable': eta}
+
+    def get_buffered_seconds(self, info_hash: str) -> Optional[float]:
+        """Secondes de media contigues disponibles devant la lecture (None sans bitrate connu)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        snapshot = self.snapshots.get(info_hash)
+        if not torrent_info or snapshot is None:
+            return None
+        bitrate = self._media_bitrate(torrent_info)
+        return snapshot.buffered_ahead / bitrate if bitrate else None
+
+    def _update_watermark(self, info_hash: str):
+        """Hysteresis haut/bas sur le buffer d'un stream regarde (bande passante vers les autres)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        priorities = torrent_info['priorities']
+        buffered = self.get_buffered_seconds(info_hash)
+        if priorities is None or buffered is None or torrent_info['status'] == 'completed':
+            return
+
+        if self.get_active_readers(info_hash) == 0:
+            throttle = False  # Personne ne regarde: pas de position de lecture a proteger
+        elif buffered >= BUFFER_HIGH_WATERMARK:
+            throttle = True
+        elif buffered <= BUFFER_LOW_WATERMARK:
+            throttle = False
+        else:
+            return
+        if priorities.set_throttled(throttle):
+            logger.info(f"{torrent_info['title']}: buffer {buffered:.0f}s, "
+                        f"{'pieces hors deadline en pause' if throttle else 'strategie complete retablie'}")
+
+    def _compute_buffered_ahead(self, torrent_info: Dict, have: np.ndarray) -> int:
+        """Bytes contigus telecharges depuis la position de lecture du fichier video"""
+        file_index = torrent_info.get('file_index')
+        if file_index is None:
+            return 0
+
+        ti = torrent_info['torrent_file']
+        file_size = torrent_info['files'][file_index].size
+        read_offset = min(torrent_info['read_offset'], file_size - 1)
+        piece = ti.map_file(file_index, read_offset, 1).piece
+        last_piece = ti.map_file(file_index, file_size - 1, 1).piece
+
+        # Premiere piece manquante a partir de la lecture (recherche vectorisee)
+        missing = np.flatnonzero(have[piece:last_piece + 1] == 0)
+        if missing.size == 0:
+            return file_size - read_offset
+        piece += int(missing[0])
+
+        # Debut de la premiere piece manquante, ramene dans le repere du fichier
+        file_start = ti.files().file_offset(file_index)
+        return max(0, piece * ti.piece_length() - file_start - read_offset)
+
+    def _on_torrent_finished(self, info_hash: str):
+        """torrent_finished_alert: toutes les pieces voulues sont presentes"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return
+        if torrent_info['status'] == 'completed':
+            return
+        
+        # Alerte d'avant un changement d'episode: le nouveau fichier n'est pas encore complet
+        file_pieces = self._file_piece_range(info_hash)
+        if file_pieces and torrent_info['have'] is not None:
+            if not torrent_info['have'][file_pieces[0]:file_pieces[1] + 1].all():
+                return
+        
+        if not torrent_info['ready_file']:
+            self._select_video_file(info_hash)
+        self.download_progress[info_hash] = 100
+        torrent_info['status'] = 'completed'
+        logger.info(f"Telechargement termine: {torrent_info['title']}")
+
+        # Pas d'index exploitable dans le conteneur: scan ffprobe du fichier complet
+        if torrent_info['time_index'] is None and torrent_info['ready_file']:
+            threading.Thread(
+                target=self._probe_time_index, args=(info_hash, torrent_info['ready_file']), daemon=True
+            ).start()
 
     def _setup_instant_access_priorities(self, info_hash: str):
         """Configure les priorites pour acces instantane a toutes les positions"""
@@ -160,78 +1498,108 @@ class RealStreamingService:
             if info_hash not in self.active_torrents:
                 return False
             
-            handle = self.active_torrents[info_hash]['handle']
+            priority_state = self.active_torrents[info_hash]['priorities']
             
-            if not handle.status().has_metadata:
+            if priority_state is None:
                 return False
             
-            ti = handle.torrent_file()
-            total_pieces = ti.num_pieces()
-            
-            # Strategie d'acces instantane: pre-charger des echantillons repartis
-            priorities = [2] * total_pieces  # Priorite normale par defaut
-            
-            # 1. TRES HAUTE PRIORITE : Debut du fichier (0-5% - metadonnees critiques)
-            start_critical = min(50, total_pieces // 20)  # 5% ou 50 pieces max
-            for piece in range(start_critical):
-                priorities[piece] = 7  # Maximum
-                handle.set_piece_deadline(piece, 500)  # 500ms deadline
-            
-            # 2. HAUTE PRIORITE : Points strategiques pour acces aleatoire
-            # Tous les 10% du fichier = points d'acces rapide
-            sample_points = [int(total_pieces * i / 10) for i in range(1, 10)]  # 10%, 20%, ... 90%
-            
-            for point in sample_points:
-                if 0 <= point < total_pieces:
-                    # 5 pieces autour de chaque point d'echantillon
-                    for offset in range(-2, 3):
-                        piece_idx = point + offset
-                        if 0 <= piece_idx < total_pieces:
-                            priorities[piece_idx] = 6  # Haute priorite
-                            handle.set_piece_deadline(piece_idx, 2000)  # 2s deadline
+            # Strategie d'acces instantane sur le fichier choisi: pre-charger des echantillons repartis
+            priority_state.apply_instant_access()
             
-            # 3. PRIORITE ELEVEE : Points intermediaires (5%, 15%, 25%, etc.)
-            intermediate_points = [int(total_pieces * i / 20) for i in range(1, 20, 2)]  # 5%, 15%, 25%...
-            
-            for point in intermediate_points:
-                if 0 <= point < total_pieces:
-                    # 2 pieces autour de chaque point intermediaire
-                    for offset in range(-1, 2):
-                        piece_idx = point + offset
-                        if 0 <= piece_idx < total_pieces:
-                            priorities[piece_idx] = max(priorities[piece_idx], 5)
-            
-            handle.prioritize_pieces(priorities)
-            
-            logger.info(f"Acces instantane configure: {start_critical} pieces critiques + {len(sample_points)} points d'acces")
+            # Comptes reels de la strategie (les points d'acces se confondent sur les petits fichiers)
+            layout, _ = priority_state.instant_access_layout(priority_state.last_piece - priority_state.first_piece + 1)
+            start_critical = int(np.count_nonzero(layout == 7))
+            access_pieces = int(np.count_nonzero(layout[start_critical:] >= 5))
+            logger.info(f"Acces instantane configure: {start_critical} pieces critiques + "
+                        f"{access_pieces} pieces aux points d'acces")
             return True
             
         except Exception as e:
             logger.error(f"Erreur configuration acces instantane: {e}")
             return False
     
+    def _find_video_file_index(self, info_hash: str) -> Optional[int]:
+        """Trouve l'index du fichier video principal (le plus gros) dans le torrent"""
+        return find_video_file_index(self.active_torrents[info_hash]['files'])
+
+    def _find_episode_file_index(self, info_hash: str, episode: Tuple[int, int]) -> Optional[int]:
+        """Plus gros fichier video dont le nom correspond a l'episode (saison, episode)"""
+        matches = [
+            (file_info.size, index) for index, file_info in enumerate(self.active_torrents[info_hash]['files'])
+            if any(file_info.path.lower().endswith(ext) for ext in VIDEO_EXTENSIONS)
+            and parse_episode(os.path.basename(file_info.path)) == episode
+        ]
+        return max(matches)[1] if matches else None
+
+    def _choose_file_index(self, info_hash: str) -> Optional[int]:
+        """Fichier demande (index, puis episode), sinon le plus gros fichier video"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return None
+        request = torrent_info['file_request']
+
+        file_index = request.get('file_index')
+        if file_index is not None:
+            if 0 <= file_index < len(torrent_info['files']):
+                return file_index
+            logger.warning(f"Index de fichier invalide {file_index} ({len(torrent_info['files'])} fichiers)")
+
+        episode = parse_episode(request.get('episode'))
+        if episode:
+            file_index = self._find_episode_file_index(info_hash, episode)
+            if file_index is not None:
+                return file_index
+            logger.warning(f"Episode S{episode[0]:02d}E{episode[1]:02d} introuvable, plus gros fichier video")
+
+        return self._find_video_file_index(info_hash)
+
+    def select_file(self, info_hash: str, file_index: Optional[int] = None, episode: Optional[str] = None) -> bool:
+        """Change le fichier a streamer (applique des que les metadonnees sont connues)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info:
+            return False
+
+        torrent_info['file_request'] = {'file_index': file_index, 'episode': episode}
+        self._save_torrent_state(info_hash)
+        if torrent_info['priorities'] is not None:
+            self._apply_file_selection(info_hash, self._choose_file_index(info_hash))
+        return True
+
+    def list_files(self, info_hash: str) -> Optional[List[Dict]]:
+        """Fichiers du torrent (vide tant que les metadonnees ne sont pas recues)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info:
+            return None
+        return describe_files(torrent_info['files'], torrent_info['file_index'])
+
+    def _select_video_file(self, info_hash: str) -> Optional[str]:
+        """Fichier video a streamer (choisi a la reception des metadonnees) et son scheduler de deadlines"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if torrent_info is None:
+            return None
+        if torrent_info['file_index'] is None:
+            torrent_info['file_index'] = self._choose_file_index(info_hash)
+        video_file = self._find_video_file(info_hash)
+        if not video_file:
+            return None
+
+        file_index = torrent_info['file_index']
+        torrent_info['ready_file'] = video_file
+        torrent_info['scheduler'] = StreamScheduler(
+            torrent_info['handle'], torrent_info['torrent_file'],
+            file_index, torrent_info['files'][file_index].size
+        )
+        if torrent_info['time_index'] is not None:
+            torrent_info['scheduler'].duration = torrent_info['time_index'].duration
+        torrent_info['scheduler'].duration = torrent_info['scheduler'].duration or torrent_info['media_duration']
+        return video_file
+
     def _find_video_file(self, info_hash: str) -> Optional[str]:
-        """Trouve le fichier video principal dans le torrent"""
-        torrent_info = self.active_torrents[info_hash]
-        
-        if not torrent_info['files']:
+        """Chemin du fichier video selectionne dans le torrent"""
+        index = self.active_torrents[info_hash]['file_index']
+        if index is None:
             return None
-        
-        video_extensions = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm']
-        largest_video = None
-        largest_size = 0
-        
-        for file_info in torrent_info['files']:
-            file_path = file_info.path
-            file_size = file_info.size
-            
-            # Check si c'est un fichier video
-            if any(file_path.lower().endswith(ext) for ext in video_extensions):
-                if file_size > largest_size:
-                    largest_size = file_size
-                    largest_video = os.path.join(CACHE_DIR, file_path)
-        
-        return largest_video
+        return os.path.join(CACHE_DIR, self.active_torrents[info_hash]['files'][index].path)
     
     def get_streaming_info(self, info_hash: str) -> Optional[Dict]:
         """Retourne les infos de streaming pour un torrent"""
@@ -240,6 +1608,7 @@ class RealStreamingService:
         
         torrent_info = self.active_torrents[info_hash]
         progress = self.download_progress.get(info_hash, 0)
+        snapshot = self.snapshots.get(info_hash) or TorrentSnapshot()
         
         return {
             'info_hash': info_hash,
@@ -247,8 +1616,35 @@ class RealStreamingService:
             'status': torrent_info['status'],
             'progress': progress,
             'ready_file': torrent_info.get('ready_file'),
-            'can_stream': torrent_info['status'] in ['streaming', 'completed']
+            'can_stream': torrent_info['status'] in ['streaming', 'completed'],
+            'download_rate': snapshot.download_rate,
+            'upload_rate': snapshot.upload_rate,
+            'num_peers': snapshot.num_peers,
+            'num_seeds': snapshot.num_seeds,
+            'pieces_done': snapshot.pieces_done,
+            'total_pieces': len(snapshot.pieces) if snapshot.pieces is not None else 0,
+            'buffered_ahead': snapshot.buffered_ahead,
+            'buffered_seconds': self.get_buffered_seconds(info_hash),
+            'ready': snapshot.ready,  # Lecture possible sans attendre depuis la position courante
+            'eta_playable': snapshot.eta_playable,  # Secondes avant d'etre pret (None = inconnu)
+            'prebuffer_bytes': snapshot.prebuffer_bytes,
+            'throttled': torrent_info['priorities'].throttled if torrent_info['priorities'] else False,
+            'snapshot_age': round(time.time() - snapshot.updated_at, 2) if snapshot.updated_at else None,
+            'scheduler': torrent_info['scheduler'].get_info() if torrent_info['scheduler'] else None,
+            'container': self._container_info(torrent_info['container']),
+            'time_index': torrent_info['time_index'].get_info() if torrent_info['time_index'] else None,
+            'bandwidth': torrent_info['bandwidth']
         }
+
+    @staticmethod
+    def _container_info(layout: Optional[ContainerLayout]) -> Optional[Dict]:
+        if layout is None:
+            return None
+        return {'format': layout.container, 'index_ranges': [list(r) for r in layout.index_ranges]}
+
+    def get_snapshot(self, info_hash: str) -> Optional[TorrentSnapshot]:
+        """Dernier snapshot publie (O(1), sans appel libtorrent)"""
+        return self.snapshots.get(info_hash)
     
     def get_video_path(self, info_hash: str) -> Optional[str]:
         """Retourne le chemin du fichier video pour streaming"""
@@ -263,41 +1659,293 @@ class RealStreamingService:
         
         return None
     
+    def get_video_size(self, info_hash: str) -> Optional[int]:
+        """Taille reelle du fichier video (metadonnees, pas la taille du fichier sparse)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info or torrent_info.get('file_index') is None:
+            return None
+        return torrent_info['files'][torrent_info['file_index']].size
+
+    def map_byte_range_to_pieces(self, info_hash: str, offset: int, length: int) -> Optional[Tuple[int, int]]:
+        """Convertit une range du fichier video en intervalle de pieces [first, last]"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info or torrent_info.get('file_index') is None:
+            return None
+
+        ti = torrent_info['torrent_file']
+        file_size = self.get_video_size(info_hash)
+        offset = max(0, min(offset, file_size - 1))
+        length = max(1, min(length, file_size - offset))
+
+        first = ti.map_file(torrent_info['file_index'], offset, 1).piece
+        last = ti.map_file(torrent_info['file_index'], offset + length - 1, 1).piece
+        return first, last
+
+    def _file_piece_range(self, info_hash: str) -> Optional[Tuple[int, int]]:
+        """Pieces [first, last] du fichier video selectionne"""
+        file_size = self.get_video_size(info_hash)
+        if not file_size:
+            return None
+        return self.map_byte_range_to_pieces(info_hash, 0, file_size)
+
+    def report_read(self, info_hash: str, reader_id: str, offset: int):
+        """Position de lecture reelle d'un lecteur (fait glisser sa fenetre de deadlines)"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info:
+            return
+        torrent_info['read_offset'] = offset
+        torrent_info['last_read'] = torrent_info['readers'][reader_id] = time.time()
+
+        scheduler = torrent_info['scheduler']
+        if scheduler is None or torrent_info['status'] == 'completed':
+            return
+        snapshot = self.snapshots.get(info_hash) or TorrentSnapshot()
+        scheduler.report_read(reader_id, offset, torrent_info['have'], snapshot.download_rate)
+
+    def report_playback_time(self, info_hash: str, reader_id: str, seconds: float,
+                             duration: Optional[float] = None):
+        """Position en secondes (HLS, chunks): convertie en offset du fichier video"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info or torrent_info['scheduler'] is None:
+            return
+
+        scheduler = torrent_info['scheduler']
+        if duration and duration > 0 and torrent_info['time_index'] is None:
+            scheduler.duration = duration
+        self.report_read(info_hash, reader_id, self.time_to_offset(info_hash, seconds))
+
+    def time_to_offset(self, info_hash: str, seconds: float) -> Optional[int]:
+        """Offset du fichier video pour un instant: keyframe de l'index, sinon estimation au debit moyen"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info or torrent_info.get('file_index') is None:
+            return None
+
+        if torrent_info['time_index'] is not None:
+            return torrent_info['time_index'].offset_at(seconds)
+
+        file_size = self.get_video_size(info_hash)
+        duration = (
+            (torrent_info['scheduler'].duration if torrent_info['scheduler'] else None)
+            or (torrent_info['container'].duration if torrent_info['container'] else None)
+            or ASSUMED_DURATION
+        )
+        return max(0, min(file_size - 1, int(seconds / duration * file_size)))
+
+    def time_to_piece(self, info_hash: str, seconds: float) -> Optional[int]:
+        """Piece contenant l'instant demande"""
+        offset = self.time_to_offset(info_hash, seconds)
+        if offset is None:
+            return None
+        return self.map_byte_range_to_pieces(info_hash, offset, 1)[0]
+
+    def get_keyframe_times(self, info_hash: str) -> Optional[List[float]]:
+        """Instants des keyframes du fichier video (index du conteneur), None tant qu'il n'est pas lu"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info or torrent_info['time_index'] is None:
+            return None
+        return [round(float(t), 3) for t in torrent_info['time_index'].times]
+
+    async def wait_for_range(self, info_hash: str, offset: int, length: int,
+                             timeout: float = PIECE_WAIT_TIMEOUT, reader_id: Optional[str] = None):
+        """Attend (sans bloquer la boucle) que les pieces d'une range du fichier video soient telechargees"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info:
+            return
+        self.report_read(info_hash, reader_id or 'default', offset)
+        if torrent_info['status'] == 'completed':
+            return
+
+        piece_range = self.map_byte_range_to_pieces(info_hash, offset, length)
+        if not piece_range:
+            return
+
+        handle = torrent_info['handle']
+        loop = asyncio.get_running_loop()
+        pending: List[Tuple[int, asyncio.Future]] = []
+
+        # Le bitfield est ecrit sous le meme verrou que le reveil: pas d'alerte perdue
+        with self._waiters_lock:
+            have = torrent_info['have']
+            for piece in range(piece_range[0], piece_range[1] + 1):
+                if have is not None and have[piece]:
+                    continue
+                future = loop.create_future()
+                self.piece_waiters.setdefault((info_hash, piece), []).append((loop, future))
+                pending.append((piece, future))
+                # Deadline echelonnee: la premiere piece lue est la plus urgente
+                handle.set_piece_deadline(piece, 100 + 50 * len(pending))
+
+        if not pending:
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(f for _, f in pending)), timeout)
+        except asyncio.TimeoutError:
+            missing = [piece for piece, f in pending if not f.done() or f.cancelled()]
+            raise PieceWaitTimeout(info_hash, missing)
+        finally:
+            self._forget_waiters(info_hash, pending)
+
+    def _forget_waiters(self, info_hash: str, pending: List[Tuple[int, asyncio.Future]]):
+        """Retire les futures d'une attente terminee du registre"""
+        with self._waiters_lock:
+            for piece, future in pending:
+                waiters = self.piece_waiters.get((info_hash, piece))
+                if not waiters:
+                    continue
+                waiters[:] = [w for w in waiters if w[1] is not future]
+                if not waiters:
+                    del self.piece_waiters[(info_hash, piece)]
+
+    def _wake_piece_waiters(self, info_hash: str, piece: int, error: Optional[Exception] = None):
+        """Reveille les lecteurs qui attendent une piece (appele depuis le thread d'alertes)"""
+        with self._waiters_lock:
+            waiters = self.piece_waiters.pop((info_hash, piece), [])
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._resolve_future, future, error)
+
+    @staticmethod
+    def _resolve_future(future: asyncio.Future, error: Optional[Exception]):
+        if future.done():
+            return
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
+
+    def get_disk_usage(self, info_hash: str) -> int:
+        """Octets reellement alloues sur disque par les fichiers du torrent (fichiers sparse)"""
+        torrent_info = self._get_torrent_info(info_hash)
+        if not torrent_info:
+            return 0
+        used = 0
+        for file_info in torrent_info['files']:
+            try:
+                used += os.stat(os.path.join(CACHE_DIR, file_info.path)).st_blocks * 512
+            except OSError:
+                continue  # Fichier pas encore cree (priorite 0 ou pas de piece)
+        return used
+
+    def get_active_readers(self, info_hash: str) -> int:
+        """Lecteurs actifs du fichier video (HTTP Range, HLS, chunks) depuis READER_IDLE_TIMEOUT"""
+        torrent_info = self.active_torrents.get(info_hash)
+        if not torrent_info:
+            return 0
+        now = time.time()
+        return sum(1 for last_seen in list(torrent_info['readers'].values()) if now - last_seen <= READER_IDLE_TIMEOUT)
+
+    def _get_torrent_info(self, info_hash: str) -> Optional[Dict]:
+        """Etat d'un torrent actif ou en pause dans le pool chaud"""
+        return self.active_torrents.get(info_hash) or self.warm_pool.get(info_hash)
+
+    def _detach_torrent(self, info_hash: str) -> Optional[Dict]:
+        """Retire un torrent des torrents actifs et libere ses lecteurs en attente
+        (None s'il a deja ete detache par un autre thread)"""
+        torrent_info = self.active_torrents.pop(info_hash, None)
+        if torrent_info is None:
+            return None
+        if torrent_info['priorities'] is not None:
+            torrent_info['priorities'].close()
+        self.download_progress.pop(info_hash, None)
+        self.snapshots.pop(info_hash, None)
+
+        # Liberer les lecteurs encore en attente de pieces
+        with self._waiters_lock:
+            waiting = [key[1] for key in self.piece_waiters if key[0] == info_hash]
+        for piece in waiting:
+            self._wake_piece_waiters(info_hash, piece, error=PieceWaitTimeout(info_hash, [piece]))
+        return torrent_info
+
     def stop_torrent(self, info_hash: str) -> bool:
-        """Arrete et nettoie un torrent specifique"""
+        """Arrete un stream: torrent mis en pause dans le pool chaud, fichiers et pieces conserves"""
         try:
-            if info_hash not in self.active_torrents:
+            torrent_info = self.active_torrents.get(info_hash)
+            if not torrent_info:
                 return False
-            
-            torrent_info = self.active_torrents[info_hash]
+
             handle = torrent_info['handle']
-            
-            # Arreter le torrent
-            self.session.remove_torrent(handle, lt.options_t.delete_files)
-            
-            # Nettoyer les references
-            del self.active_torrents[info_hash]
-            if info_hash in self.download_progress:
-                del self.download_progress[info_hash]
-            
-            # Supprimer fichiers cache
-            try:
-                import shutil
-                cache_dir = os.path.join(CACHE_DIR, f"torrent_{info_hash}")
-                if os.path.exists(cache_dir):
-                    shutil.rmtree(cache_dir)
-            except Exception as e:
-                logger.warning(f"Erreur suppression cache: {e}")
-            
-            logger.info(f" Torrent arrete et nettoye: {torrent_info['title']}")
+            if handle is None or not handle.is_valid() or torrent_info['status'] == 'error':
+                # Rien a garder au chaud (ajout pas encore termine ou en erreur)
+                return self.remove_torrent(info_hash)
+
+            if self._detach_torrent(info_hash) is None:
+                return False
+            # Plus aucune piece demandee: la reprise recalcule les priorites du fichier choisi
+            handle.unset_flags(lt.torrent_flags.auto_managed)
+            handle.pause()
+            if torrent_info['priorities'] is not None:
+                torrent_info['priorities'].reset()
+            else:
+                handle.clear_piece_deadlines()
+            if torrent_info['scheduler'] is not None:
+                torrent_info['scheduler'].clear()
+            torrent_info['readers'] = {}
+
+            self.warm_pool[info_hash] = torrent_info
+            self._save_torrent_state(info_hash)
+            logger.info(f" Torrent en pause (pool chaud {len(self.warm_pool)}/{WARM_POOL_SIZE}): "
+                        f"{torrent_info['title']}")
+
+            # Pool plein: suppression reelle des plus anciens
+            while len(self.warm_pool) > WARM_POOL_SIZE:
+                self.remove_torrent(next(iter(self.warm_pool)))
             return True
-            
+
         except Exception as e:
-            logger.error(f"Erreur arret torrent {info_hash}: {e}")
+            logger.error(f"Arret torrent {info_hash} impossible: {e}")
+            return False
+
+    def _resume_warm_torrent(self, info_hash: str):
+        """Sort un torrent du pool chaud: reprise immediate avec ses pieces et ses metadonnees"""
+        torrent_info = self.warm_pool.pop(info_hash)
+        handle = torrent_info['handle']
+        torrent_info['last_read'] = time.time()
+        self.active_torrents[info_hash] = torrent_info
+        self.download_progress[info_hash] = 100 if torrent_info['status'] == 'completed' else 0
+        self.snapshots[info_hash] = TorrentSnapshot(updated_at=time.time())
+        self._save_torrent_state(info_hash)
+
+        if handle is None:
+            return  # Ajout (restauration) encore en cours: add_torrent_alert fera la suite
+        handle.set_flags(lt.torrent_flags.auto_managed)
+        handle.resume()
+        self._publish_snapshot(info_hash)
+
+        if not torrent_info['files']:
+            if handle.status().has_metadata:
+                self._on_metadata_received(info_hash)
+        elif torrent_info['file_index'] is not None:
+            # Meme fichier: priorites recalculees, position et index du conteneur conserves
+            self._apply_file_selection(info_hash, torrent_info['file_index'])
+        else:
+            self._setup_instant_access_priorities(info_hash)
+        logger.info(f" Torrent repris depuis le pool chaud: {torrent_info['title']}")
+
+    def remove_torrent(self, info_hash: str) -> bool:
+        """Supprime un torrent (actif ou en pause) et ses fichiers"""
+        try:
+            torrent_info = self._detach_torrent(info_hash) or self.warm_pool.pop(info_hash, None)
+            if torrent_info is None:
+                return False
+
+            # Arreter le torrent (sinon retire a la reception de add_torrent_alert)
+            handle = torrent_info['handle']
+            if handle is not None:
+                self.session.remove_torrent(handle, lt.options_t.delete_files)
+            self.handle_index.pop(torrent_info['lt_hash'], None)
+            self._forget_torrent_state(info_hash)
+
+            logger.info(f" Torrent supprime: {torrent_info['title']}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Erreur suppression torrent {info_hash}: {e}")
             return False
     
-    def set_piece_priorities_for_seeking(self, info_hash: str, seek_position: float):
-        """Configure les priorites de telechargement pour le seeking INSTANTANE"""
+    def set_piece_priorities_for_seeking(self, info_hash: str, seek_position: float,
+                                         seconds: Optional[float] = None):
+        """Configure les priorites de telechargement pour le seeking INSTANTANE (position 0-1 ou instant)"""
         try:
             if info_hash not in self.active_torrents:
                 return False
@@ -305,99 +1953,75 @@ class RealStreamingService:
             torrent_info = self.active_torrents[info_hash]
             handle = torrent_info['handle']
             
-            if not handle.status().has_metadata:
+            # Metadonnees connues via la boucle d'alertes (pas d'appel bloquant handle.status())
+            if handle is None or torrent_info['priorities'] is None:
                 return False
             
-            # Calculer les pieces necessaires pour la position demandee
-            ti = handle.torrent_file()
-            piece_length = ti.piece_length()
-            total_size = ti.total_size()
-            
-            # Position en bytes
-            seek_bytes = int(seek_position * total_size)
-            seek_piece = seek_bytes // piece_length
-            
-            # STRATEGIE ULTRA-AGRESSIVE pour acces instantane
-            priorities = [1] * ti.num_pieces()  # Tres basse priorite par defaut
-            
-            # 1. ZONE ULTRA-CRITIQUE (instantane) : 3 pieces autour + deadline immediate
-            ultra_critical_start = max(0, seek_piece - 1)
-            ultra_critical_end = min(ti.num_pieces(), seek_piece + 2)
-            for piece in range(ultra_critical_start, ultra_critical_end):
-                priorities[piece] = 7  # Maximum
-                handle.set_piece_deadline(piece, 100)  # 100ms SEULEMENT!
-            
-            # 2. ZONE CRITIQUE (buffer proche) : 15 pieces autour
-            critical_start = max(0, seek_piece - 7)
-            critical_end = min(ti.num_pieces(), seek_piece + 8)
-            for piece in range(critical_start, critical_end):
-                if piece not in range(ultra_critical_start, ultra_critical_end):
-                    priorities[piece] = 6
-                    handle.set_piece_deadline(piece, 500)  # 500ms
-            
-            # 3. ZONE BUFFER (lecture continue) : 50 pieces apres
-            buffer_end = min(ti.num_pieces(), seek_piece + 50)
-            for piece in range(critical_end, buffer_end):
-                priorities[piece] = 5
-                handle.set_piece_deadline(piece, 2000)  # 2s
-            
-            # 4. MAINTENIR points d'acces strategiques (systeme existant)
-            # Conserver les points d'acces 10%, 20%, etc. avec priorite moderee
-            sample_points = [int(ti.num_pieces() * i / 10) for i in range(1, 10)]
-            for point in sample_points:
-                if 0 <= point < ti.num_pieces():
-                    priorities[point] = max(priorities[point], 4)
+            # Instant demande: piece qui contient vraiment la keyframe (index temps -> octets)
+            seek_piece = self.time_to_piece(info_hash, seconds) if seconds is not None else None
             
-            # 5. TOUJOURS maintenir debut du fichier (metadonnees video)
-            for piece in range(min(20, ti.num_pieces())):
-                priorities[piece] = max(priorities[piece], 6)
+            if seek_piece is None and torrent_info['file_index'] is not None:
+                # Position proportionnelle dans le fichier selectionne (pas dans tout le torrent)
+                file_size = self.get_video_size(info_hash)
+                seek_piece = self.map_byte_range_to_pieces(info_hash, int(seek_position * file_size), 1)[0]
+            elif seek_piece is None:
+                # Calculer les pieces necessaires pour la position demandee
+                ti = torrent_info['torrent_file']
+                seek_bytes = int(seek_position * ti.total_size())
+                seek_piece = seek_bytes // ti.piece_length()
             
-            handle.prioritize_pieces(priorities)
+            # Le prebuffer de l'ancienne position ne doit pas passer devant les pieces du seek
+            self._unpin_prebuffer(info_hash)
+
+            # STRATEGIE ULTRA-AGRESSIVE, calcul vectorise et application differentielle
+            # (les rafales de seeks pendant le scrubbing sont regroupees)
+            torrent_info['priorities'].request_seek(seek_piece)
             
-            logger.info(f"SEEKING INSTANTANE: piece {seek_piece} (ultra: {ultra_critical_start}-{ultra_critical_end}, critique: {critical_start}-{critical_end})")
+            logger.info(f"SEEKING INSTANTANE: piece {seek_piece}")
             return True
             
         except Exception as e:
             logger.error(f"Erreur priorites seeking: {e}")
             return False
 
-    def get_piece_availability(self, info_hash: str, seek_position: float = 0.0) -> Dict:
+    def get_piece_availability(self, info_hash: str, seek_position: float = 0.0,
+                               seconds: Optional[float] = None) -> Dict:
         """Retourne la disponibilite des pieces pour une position donnee (optimise acces instantane)"""
         try:
             if info_hash not in self.active_torrents:
                 return {"available": False, "pieces_ready": 0, "total_pieces": 0}
             
-            handle = self.active_torrents[info_hash]['handle']
+            # Lecture du snapshot publie par la boucle d'alertes (aucun appel libtorrent)
+            snapshot = self.snapshots.get(info_hash)
             
-            if not handle.status().has_metadata:
+            if snapshot is None or snapshot.pieces is None or not len(snapshot.pieces):
                 return {"available": False, "pieces_ready": 0, "total_pieces": 0}
             
-            ti = handle.torrent_file()
-            total_pieces = ti.num_pieces()
+            pieces = snapshot.pieces
+            
+            # Pieces du fichier selectionne (tout le torrent si aucun fichier video)
+            first_piece, last_piece = self._file_piece_range(info_hash) or (0, len(pieces) - 1)
+            total_pieces = last_piece + 1
             
-            # Position en pieces
-            seek_piece = int(seek_position * total_pieces)
+            # Position en pieces (instant via l'index temps -> octets si demande)
+            seek_piece = self.time_to_piece(info_hash, seconds) if seconds is not None else None
+            if seek_piece is None:
+                seek_piece = first_piece + int(seek_position * (last_piece - first_piece + 1))
             
             # ULTRA-CRITIQUE : juste 3 pieces autour (minimum pour demarrer)
-            ultra_critical_start = max(0, seek_piece - 1)
+            ultra_critical_start = max(first_piece, seek_piece - 1)
             ultra_critical_end = min(total_pieces, seek_piece + 2)
             
-            ultra_pieces_ready = 0
-            for piece in range(ultra_critical_start, ultra_critical_end):
-                if handle.have_piece(piece):
-                    ultra_pieces_ready += 1
+            ultra_pieces_ready = count_pieces(pieces, ultra_critical_start, ultra_critical_end)
             
             ultra_pieces_needed = ultra_critical_end - ultra_critical_start
             ultra_availability = ultra_pieces_ready / ultra_pieces_needed if ultra_pieces_needed > 0 else 0
             
             # ELARGIE : zone plus large pour info supplementaire
-            extended_start = max(0, seek_piece - 5)
+            extended_start = max(first_piece, seek_piece - 5)
             extended_end = min(total_pieces, seek_piece + 15)
             
-            extended_pieces_ready = 0
-            for piece in range(extended_start, extended_end):
-                if handle.have_piece(piece):
-                    extended_pieces_ready += 1
+            extended_pieces_ready = count_pieces(pieces, extended_start, extended_end)
             
             extended_pieces_needed = extended_end - extended_start
             extended_availability = extended_pieces_ready / extended_pieces_needed if extended_pieces_needed > 0 else 0
@@ -430,16 +2054,29 @@ class RealStreamingService:
             logger.error(f"Erreur verification disponibilite: {e}")
             return {"available": False, "pieces_ready": 0, "total_pieces": 0}
 
-    def cleanup_old_torrents(self):
-        """Nettoie les anciens torrents (garde les 5 plus recents)"""
-        try:
-            if len(self.active_torrents) > 5:  # Reduit de 10 a 5
-                # Supprimer les plus anciens
-                to_remove = list(self.active_torrents.keys())[:-5]
-                for info_hash in to_remove:
-                    self.stop_torrent(info_hash)
-        except Exception as e:
-            logger.error(f"Erreur nettoyage: {e}")
+    def get_piece_map(self, info_hash: str) -> Optional[Dict]:
+        """Carte compressee (RLE) des pieces presentes, calculee sur le snapshot"""
+        if info_hash not in self.active_torrents:
+            return None
+
+        torrent_info = self.active_torrents[info_hash]
+        snapshot = self.snapshots.get(info_hash)
+        if snapshot is None or snapshot.pieces is None:
+            return {"has_metadata": False, "total_pieces": 0, "pieces_done": 0, "runs": []}
+
+        piece_map = {
+            "has_metadata": True,
+            "total_pieces": len(snapshot.pieces),
+            "pieces_done": snapshot.pieces_done,
+            "piece_length": torrent_info['torrent_file'].piece_length(),
+            "runs": encode_piece_runs(snapshot.pieces),
+        }
+
+        # Plage de pieces du fichier video (pour la barre de buffer du lecteur)
+        file_size = self.get_video_size(info_hash)
+        if file_size:
+            piece_map["file_pieces"] = list(self.map_byte_range_to_pieces(info_hash, 0, file_size))
+        return piece_map
 
-# Instance globale
-real_streaming_service = RealStreamingService()
\ No newline at end of file
+# Instance globale (en mode 'remote', la session appartient au processus torrent_daemon.py)
+real_streaming_service = RealStreamingService() if TORRENT_ENGINE == 'local' else None
\ No newline at end of file
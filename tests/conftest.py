@@ -0,0 +1,11 @@
+"""
+Configuration commune des tests: pas de session libtorrent (mode 'remote'), cache temporaire
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('TORRENT_ENGINE', 'remote')
+os.environ.setdefault('STREAMTV_CACHE_DIR', tempfile.mkdtemp(prefix='streamtv_tests_'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
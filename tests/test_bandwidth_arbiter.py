@@ -0,0 +1,150 @@
+"""
+Decisions de BandwidthArbiter.plan(): roles, limites et pauses (service factice, sans libtorrent)
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bandwidth_arbiter import (IDLE_MAX_CONNECTIONS, STARTING_GRACE, STARVED_UPLOAD_LIMIT, UNLIMITED,
+                               WATCHED_MAX_CONNECTIONS, BandwidthArbiter)
+from real_streaming_service import ASSUMED_DURATION, TorrentSnapshot
+
+MB = 1024 * 1024
+
+
+class FakeService:
+    def __init__(self):
+        self.active_torrents = {}
+        self.snapshots = {}
+        self.readers = {}
+
+    def add(self, info_hash, status='streaming', readers=0, size=ASSUMED_DURATION * 1000, age=3600,
+            download_rate=0, buffered_ahead=0):
+        """Torrent avec un fichier video de bitrate size / ASSUMED_DURATION"""
+        added = time.time() - age
+        self.active_torrents[info_hash] = {
+            'handle': object(),
+            'status': status,
+            'scheduler': None,
+            'file_index': 0,
+            'files': [SimpleNamespace(size=size)],
+            'added_at': added,
+            'last_read': added,
+        }
+        self.snapshots[info_hash] = TorrentSnapshot(download_rate=download_rate, buffered_ahead=buffered_ahead)
+        self.readers[info_hash] = readers
+
+    def get_snapshot(self, info_hash):
+        return self.snapshots.get(info_hash)
+
+    def get_active_readers(self, info_hash):
+        return self.readers[info_hash]
+
+
+@pytest.fixture
+def service():
+    return FakeService()
+
+
+def make_arbiter(service, capacity=0):
+    return BandwidthArbiter(service, capacity, interval=3600)
+
+
+def test_fresh_torrent_not_paused_when_starved(service):
+    service.add('watched', readers=1, size=ASSUMED_DURATION * 200 * 1024)  # 200 KB/s, buffer vide
+    service.add('fresh', status='downloading', age=0)
+    service.add('idle')
+
+    plan = make_arbiter(service).plan()
+
+    assert plan['starved']
+    fresh = plan['torrents']['fresh']
+    assert fresh['role'] == 'starting'
+    assert not fresh['paused']
+    assert fresh['download_limit'] == UNLIMITED
+    assert fresh['upload_limit'] == UNLIMITED
+    assert fresh['max_connections'] == WATCHED_MAX_CONNECTIONS
+    assert plan['torrents']['idle']['paused']
+    assert plan['torrents']['idle']['upload_limit'] == STARVED_UPLOAD_LIMIT
+
+
+def test_downloading_stays_starting_after_grace(service):
+    service.add('slow', status='downloading', age=STARTING_GRACE * 10)
+    assert make_arbiter(service).plan()['torrents']['slow']['role'] == 'starting'
+
+
+def test_recently_requested_is_starting(service):
+    service.add('recent', status='streaming', age=STARTING_GRACE * 10)
+    service.active_torrents['recent']['last_read'] = time.time()
+    service.add('old', status='streaming', age=STARTING_GRACE * 10)
+    service.add('failed', status='error', age=0)
+
+    torrents = make_arbiter(service).plan()['torrents']
+    assert torrents['recent']['role'] == 'starting'
+    assert torrents['old']['role'] == 'idle'
+    assert torrents['failed']['role'] == 'idle'
+
+
+def test_roles(service):
+    service.add('watched', readers=2)
+    service.add('done', status='completed', readers=0)
+    service.add('idle')
+
+    torrents = make_arbiter(service).plan()['torrents']
+    assert torrents['watched']['role'] == 'watched'
+    assert torrents['watched']['max_connections'] == WATCHED_MAX_CONNECTIONS
+    assert torrents['done']['role'] == 'seeding'
+    assert torrents['idle']['role'] == 'idle'
+    assert torrents['idle']['max_connections'] == IDLE_MAX_CONNECTIONS
+
+
+def test_idle_share_spare_capacity(service):
+    # 100 KB/s de bitrate, buffer plein: demande = bitrate
+    service.add('watched', readers=1, size=ASSUMED_DURATION * 100 * 1024, buffered_ahead=1000 * MB)
+    service.add('idle1')
+    service.add('idle2')
+
+    plan = make_arbiter(service, capacity=10 * MB).plan()
+    assert not plan['starved']
+    assert plan['watched_demand'] == 100 * 1024
+    spare = 10 * MB - 100 * 1024
+    for info_hash in ('idle1', 'idle2'):
+        assert plan['torrents'][info_hash]['download_limit'] == spare // 2
+        assert not plan['torrents'][info_hash]['paused']
+    assert plan['torrents']['watched']['download_limit'] == UNLIMITED
+
+
+def test_no_watched_stream_leaves_idle_unlimited(service):
+    service.add('idle')
+    settings = make_arbiter(service).plan()['torrents']['idle']
+    assert settings['download_limit'] == UNLIMITED
+    assert not settings['paused']
+
+
+def test_watched_share_configured_capacity_by_demand(service):
+    service.add('a', readers=1, size=ASSUMED_DURATION * 300 * 1024, buffered_ahead=1000 * MB)
+    service.add('b', readers=1, size=ASSUMED_DURATION * 100 * 1024, buffered_ahead=1000 * MB)
+
+    torrents = make_arbiter(service, capacity=200 * 1024).plan()['torrents']
+    assert torrents['a']['download_limit'] == 150 * 1024
+    assert torrents['b']['download_limit'] == 50 * 1024
+
+
+def test_estimated_capacity_never_limits_watched(service):
+    service.add('a', readers=1, size=ASSUMED_DURATION * 300 * 1024)
+    service.add('b', readers=1, size=ASSUMED_DURATION * 300 * 1024)
+
+    torrents = make_arbiter(service).plan()['torrents']
+    assert torrents['a']['download_limit'] == UNLIMITED
+    assert torrents['b']['download_limit'] == UNLIMITED
+
+
+def test_deficit_boost(service):
+    service.add('empty', readers=1, size=ASSUMED_DURATION * 100 * 1024)
+    service.add('full', readers=1, size=ASSUMED_DURATION * 100 * 1024, buffered_ahead=1000 * MB)
+
+    torrents = make_arbiter(service).plan()['torrents']
+    assert torrents['empty']['demand'] == 3 * 100 * 1024
+    assert torrents['full']['demand'] == 100 * 1024
@@ -0,0 +1,162 @@
+"""
+MediaFileResponse: ranges, corps envoye et interruption sur lecture courte (ASGI sans serveur)
+"""
+
+import os
+
+import anyio
+import pytest
+from fastapi import HTTPException
+
+import media_file_server
+from media_file_server import (READ_BLOCK_SIZE, ZEROCOPY_EXTENSION, IncompleteBodyError, MediaFileResponse,
+                               parse_byte_range)
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / 'video.mkv'
+    data = os.urandom(3 * READ_BLOCK_SIZE + 1234)
+    path.write_bytes(data)
+    return str(path), data
+
+
+async def _connected():
+    await anyio.sleep_forever()
+
+
+def run(response, method='GET', extensions=None, receive=_connected):
+    """Execute la reponse; retourne les messages envoyes (et l'exception eventuelle)"""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def main():
+        scope = {'type': 'http', 'method': method, 'headers': [], 'extensions': extensions or {}}
+        await response(scope, receive, send)
+
+    error = None
+    try:
+        anyio.run(main)
+    except Exception as e:
+        error = e
+    return messages, error
+
+
+def body_of(messages):
+    return b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+
+
+def headers_of(messages):
+    return {key.decode(): value.decode() for key, value in messages[0]['headers']}
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes=0-99,200-299', (0, 99)),
+    (None, None),
+    ('bytes=abc', None),
+    ('bytes=50-10', None),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+
+def test_parse_byte_range_past_end():
+    with pytest.raises(HTTPException) as info:
+        parse_byte_range('bytes=1000-', 1000)
+    assert info.value.status_code == 416
+    assert info.value.headers['Content-Range'] == 'bytes */1000'
+
+
+def test_full_response(media_file):
+    path, data = media_file
+    messages, error = run(MediaFileResponse(path, 'video/x-matroska'))
+    assert error is None
+    assert messages[0]['status'] == 200
+    assert headers_of(messages)['content-length'] == str(len(data))
+    assert body_of(messages) == data
+    assert messages[-1]['more_body'] is False
+
+
+def test_range_response(media_file):
+    path, data = media_file
+    start, end = READ_BLOCK_SIZE - 10, 2 * READ_BLOCK_SIZE + 10
+    messages, error = run(MediaFileResponse(path, 'video/mp4', range_header=f'bytes={start}-{end}'))
+    assert error is None
+    assert messages[0]['status'] == 206
+    headers = headers_of(messages)
+    assert headers['content-range'] == f'bytes {start}-{end}/{len(data)}'
+    assert headers['content-length'] == str(end - start + 1)
+    assert body_of(messages) == data[start:end + 1]
+    # Premier bloc raccourci: les lectures suivantes sont alignees sur READ_BLOCK_SIZE
+    assert len(messages[1]['body']) == 10
+
+
+def test_head_sends_no_body(media_file):
+    path, _ = media_file
+    messages, error = run(MediaFileResponse(path, 'video/mp4'), method='HEAD')
+    assert error is None
+    assert body_of(messages) == b''
+
+
+def test_short_read_aborts(media_file):
+    path, data = media_file
+    response = MediaFileResponse(path, 'video/mp4', file_size=len(data) + READ_BLOCK_SIZE)
+    messages, error = run(response)
+    assert isinstance(error, IncompleteBodyError)
+    assert error.sent == len(data)
+    assert error.expected == len(data) + READ_BLOCK_SIZE
+    # Jamais de fin de corps normale: le client ne doit pas croire le fichier complet
+    assert all(message.get('more_body', True) for message in messages[1:])
+
+
+def test_unavailable_range_aborts(media_file):
+    path, _ = media_file
+
+    async def wait_for_range(offset, length):
+        if offset >= READ_BLOCK_SIZE:
+            raise TimeoutError("pieces manquantes")
+
+    messages, error = run(MediaFileResponse(path, 'video/mp4', wait_for_range=wait_for_range))
+    assert isinstance(error, IncompleteBodyError)
+    assert error.sent == READ_BLOCK_SIZE
+    assert all(message.get('more_body', True) for message in messages[1:])
+
+
+def test_disconnect_stops_reads(media_file, monkeypatch):
+    path, _ = media_file
+    reads = []
+    pread = os.pread
+
+    def counting_pread(fd, length, offset):
+        reads.append(offset)
+        return pread(fd, length, offset)
+
+    monkeypatch.setattr(media_file_server.os, 'pread', counting_pread)
+
+    async def wait_for_range(offset, length):
+        if offset > 0:
+            await anyio.sleep_forever()  # Pieces jamais arrivees
+
+    async def disconnect():
+        await anyio.sleep(0.05)
+        return {'type': 'http.disconnect'}
+
+    messages, error = run(MediaFileResponse(path, 'video/mp4', wait_for_range=wait_for_range), receive=disconnect)
+    assert error is None
+    assert reads == [0]
+
+
+def test_zerocopy_offsets(media_file):
+    path, data = media_file
+    response = MediaFileResponse(path, 'video/mp4', range_header='bytes=100-')
+    messages, error = run(response, extensions={ZEROCOPY_EXTENSION: {}})
+    assert error is None
+    sends = [message for message in messages if message['type'] == ZEROCOPY_EXTENSION]
+    assert [(message['offset'], message['count']) for message in sends] == [(100, len(data) - 100)]
+    assert sends[-1]['more_body'] is False
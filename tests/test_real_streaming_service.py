@@ -0,0 +1,221 @@
+"""
+Logique pure du service de streaming: priorites de pieces (diff, epinglages) et boucle d'alertes
+(handle libtorrent factice, aucune session)
+"""
+
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from real_streaming_service import LT_DEFAULT_PRIORITY, PiecePriorityState, RealStreamingService, TorrentSnapshot
+
+
+class FakeHandle:
+    """Enregistre les appels de PiecePriorityState comme le ferait un torrent_handle"""
+
+    def __init__(self, num_pieces: int):
+        self.priorities = [LT_DEFAULT_PRIORITY] * num_pieces
+        self.deadlines = {}
+        self.calls = []
+
+    def prioritize_pieces(self, priorities):
+        if priorities and isinstance(priorities[0], tuple):
+            self.calls.append(('pairs', len(priorities)))
+            for piece, priority in priorities:
+                self.priorities[piece] = priority
+        else:
+            self.calls.append(('full', len(priorities)))
+            self.priorities = list(priorities)
+
+    def get_piece_priorities(self):
+        return list(self.priorities)
+
+    def set_piece_deadline(self, piece, deadline):
+        self.deadlines[piece] = deadline
+        self.priorities[piece] = 7
+
+    def reset_piece_deadline(self, piece):
+        self.deadlines.pop(piece, None)
+
+    def clear_piece_deadlines(self):
+        self.deadlines.clear()
+
+
+def make_state(num_pieces=1000, keep=None):
+    handle = FakeHandle(num_pieces)
+    state = PiecePriorityState(handle, num_pieces, keep_deadlines=(lambda: keep) if keep is not None else None)
+    return handle, state
+
+
+def test_apply_is_differential():
+    handle, state = make_state()
+    assert state.apply_instant_access() > 0
+    assert handle.calls[-1][0] == 'full'  # Presque tout change depuis la priorite par defaut
+    calls = len(handle.calls)
+
+    assert state.apply_instant_access() == 0
+    assert len(handle.calls) == calls  # Rien a envoyer
+    assert list(state.applied) == handle.priorities
+
+
+def test_small_change_sent_as_pairs():
+    handle, state = make_state()
+    state.apply_instant_access()
+    state.apply_seek(500)
+    state.pin([900], 100)
+    assert handle.calls[-1] == ('pairs', 1)
+    assert handle.priorities[900] == 7
+
+
+def test_select_range_zeroes_other_pieces():
+    handle, state = make_state()
+    state.apply_instant_access()
+    state.select_range(100, 199)
+    priorities = np.array(handle.priorities)
+    assert not priorities[:100].any()
+    assert not priorities[200:].any()
+    assert priorities[100:200].all()
+    assert all(100 <= piece <= 199 for piece in handle.deadlines)
+
+
+def test_pin_survives_seek_and_unpin_restores_strategy():
+    handle, state = make_state()
+    state.apply_instant_access()
+    state.pin([700, 701], 42)
+    state.apply_seek(100)
+    assert handle.deadlines[700] == handle.deadlines[701] == 42
+    assert handle.priorities[700] == 7
+
+    state.unpin([700, 701])
+    assert 700 not in handle.deadlines and 701 not in handle.deadlines
+    assert 700 not in state.pinned
+    seek_priorities, _ = PiecePriorityState.seek_layout(1000, 100)
+    assert handle.priorities[701] == seek_priorities[701]
+
+
+def test_pin_release_replaces_previous_range():
+    handle, state = make_state()
+    state.apply_seek(0)  # Deadlines de la strategie sur les pieces 0-49 seulement
+    state.pin(list(range(300, 310)), 500)
+    state.pin(list(range(305, 315)), 500, release=range(300, 310))
+    assert set(state.pinned) == set(range(305, 315))
+    assert not any(300 <= piece < 305 for piece in handle.deadlines)
+    assert all(handle.deadlines[piece] == 500 for piece in range(305, 315))
+
+
+def test_keep_deadlines_never_reset():
+    handle, state = make_state(keep={650: 1000})
+    handle.set_piece_deadline(650, 1000)  # Posee par le StreamScheduler
+    state.apply_instant_access()
+    assert handle.priorities[650] == 7  # Jamais sous 7: une priorite 0 annulerait la deadline
+
+    state.pin([650, 651], 50)
+    state.unpin([650, 651])
+    assert 650 in handle.deadlines
+    assert 651 not in handle.deadlines
+
+
+def test_throttled_keeps_only_deadline_pieces():
+    handle, state = make_state()
+    state.apply_instant_access()
+    assert state.set_throttled(True)
+    assert not state.set_throttled(True)
+    priorities = np.array(handle.priorities)
+    assert set(np.flatnonzero(priorities).tolist()) == set(handle.deadlines)
+
+    state.apply_seek(500)  # Le buffer est a reconstruire a la nouvelle position
+    assert not state.throttled
+
+
+def test_reset_clears_everything():
+    handle, state = make_state()
+    state.apply_instant_access()
+    state.pin([10], 100)
+    state.reset()
+    assert not any(handle.priorities)
+    assert not handle.deadlines
+    assert not state.pinned
+
+
+def make_service(num_pieces=10):
+    """Service sans session libtorrent: seul l'etat utilise par la boucle d'alertes"""
+    service = RealStreamingService.__new__(RealStreamingService)
+    service.active_torrents = {
+        'HASH': {
+            'handle': None, 'title': 'test', 'have': np.zeros(num_pieces, dtype=np.uint8),
+            'file_index': None, 'files': [], 'scheduler': None, 'container': None,
+        }
+    }
+    service.snapshots = {'HASH': TorrentSnapshot()}
+    service.piece_waiters = {}
+    service._waiters_lock = threading.Lock()
+    return service
+
+
+class FakeAlert:
+    def __init__(self, name):
+        self.name = name
+
+    def what(self):
+        return self.name
+
+
+def test_dispatch_error_does_not_drop_batch():
+    service = make_service()
+    dispatched = []
+
+    def dispatch(alert):
+        if alert.name == 'broken':
+            raise KeyError('HASH')
+        dispatched.append(alert.name)
+
+    service._dispatch_alert = dispatch
+    alerts = [FakeAlert('a'), FakeAlert('broken'), FakeAlert('b')]
+    assert not service._dispatch_alerts(alerts)
+    assert dispatched == ['a', 'b']
+    assert service._dispatch_alerts([FakeAlert('c')])
+
+
+def test_merge_have_recovers_missed_pieces_and_wakes_readers():
+    service = make_service()
+    service.active_torrents['HASH']['have'][0] = 1
+    woken = []
+    service._wake_piece_waiters = lambda info_hash, piece: woken.append(piece)
+
+    actual = np.zeros(10, dtype=np.uint8)
+    actual[[0, 3, 4]] = 1
+    assert service._merge_have('HASH', actual) == [3, 4]
+    assert woken == [3, 4]
+    assert service.active_torrents['HASH']['have'][[0, 3, 4]].all()
+    assert service.snapshots['HASH'].pieces_done == 3
+
+    assert service._merge_have('HASH', actual) == []
+    assert service._merge_have('GONE', actual) == []
+
+
+def test_merge_have_never_clears_pieces():
+    service = make_service()
+    service.active_torrents['HASH']['have'][:] = 1
+    assert service._merge_have('HASH', np.zeros(10, dtype=np.uint8)) == []
+    assert service.active_torrents['HASH']['have'].all()
+
+
+def test_handlers_ignore_detached_torrent():
+    service = make_service()
+    status = SimpleNamespace(progress=0.5, has_metadata=True, is_seeding=False)
+    service._on_status_update('GONE', status)
+    service._on_piece_finished('GONE', 3)
+    service._on_metadata_received('GONE')
+    service._on_torrent_finished('GONE')
+    service._publish_snapshot('GONE')
+    assert service._select_video_file('GONE') is None
+
+
+def test_detach_twice():
+    service = make_service()
+    service.active_torrents['HASH']['priorities'] = None
+    service.download_progress = {'HASH': 0}
+    assert service._detach_torrent('HASH')['title'] == 'test'
+    assert service._detach_torrent('HASH') is None
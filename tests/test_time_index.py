@@ -0,0 +1,88 @@
+"""
+Index MP4 construit depuis les tables d'echantillons: instants de presentation (ctts) et liste
+d'edition (elst), sur un moov synthetique
+"""
+
+import struct
+
+import pytest
+
+from time_index import MP4_UNIT_RATE, _index_from_mp4
+
+TIMESCALE = 1000  # mdhd: 1 echantillon = 1 s (delta 1000)
+MOVIE_TIMESCALE = 600  # mvhd: unite des durees de elst
+SAMPLE_SIZE = 100
+CHUNK_OFFSET = 5000
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type: bytes, payload: bytes, version: int = 0) -> bytes:
+    return box(box_type, struct.pack('>I', version << 24) + payload)
+
+
+def table(box_type: bytes, rows, fmt: str = '>II', version: int = 0) -> bytes:
+    return full_box(box_type, struct.pack('>I', len(rows)) + b''.join(struct.pack(fmt, *row) for row in rows),
+                    version)
+
+
+def make_moov(samples=6, sync=(1, 4), ctts=None, elst=None) -> bytes:
+    """Piste video: un chunk de `samples` echantillons de taille fixe"""
+    stbl = [
+        table(b'stts', [(samples, 1000)]),
+        table(b'stss', [(s,) for s in sync], '>I'),
+        table(b'stsc', [(1, samples, 1)], '>III'),
+        full_box(b'stsz', struct.pack('>II', SAMPLE_SIZE, samples)),
+        table(b'stco', [(CHUNK_OFFSET,)], '>I'),
+    ]
+    if ctts is not None:
+        stbl.append(table(b'ctts', ctts, '>Ii', version=1))
+    mdia = [
+        full_box(b'mdhd', struct.pack('>IIII', 0, 0, TIMESCALE, samples * 1000)),
+        full_box(b'hdlr', struct.pack('>I4s', 0, b'vide') + b'\0' * 13),
+        box(b'minf', box(b'stbl', b''.join(stbl))),
+    ]
+    trak = []
+    if elst is not None:
+        trak.append(box(b'edts', table(b'elst', elst, '>Iii')))
+    trak.append(box(b'mdia', b''.join(mdia)))
+    mvhd = full_box(b'mvhd', struct.pack('>IIII', 0, 0, MOVIE_TIMESCALE, 0) + b'\0' * 80)
+    return box(b'moov', mvhd + box(b'trak', b''.join(trak)))
+
+
+def keyframes(moov: bytes):
+    index = _index_from_mp4(moov)
+    return [float(t) for t in index.times], [int(o) for o in index.offsets]
+
+
+def test_decode_times_without_ctts_or_elst():
+    times, offsets = keyframes(make_moov())
+    assert times == [0.0, 3.0]
+    assert offsets == [CHUNK_OFFSET, CHUNK_OFFSET + 3 * SAMPLE_SIZE]
+
+
+def test_ctts_and_edit_list_give_presentation_times():
+    # Images B: presentation 2 echantillons apres le decodage, compensee par media_time
+    ctts = [(6, 2000)]
+    times, _ = keyframes(make_moov(ctts=ctts, elst=[(6 * MOVIE_TIMESCALE, 2000, MP4_UNIT_RATE)]))
+    assert times == [0.0, 3.0]
+
+    # Sans liste d'edition, le decalage de composition reste visible
+    times, _ = keyframes(make_moov(ctts=ctts))
+    assert times == [2.0, 5.0]
+
+
+def test_empty_edit_delays_track():
+    elst = [(MOVIE_TIMESCALE, -1, MP4_UNIT_RATE), (6 * MOVIE_TIMESCALE, 1000, MP4_UNIT_RATE)]
+    times, _ = keyframes(make_moov(ctts=[(6, 2000)], elst=elst))
+    assert times == pytest.approx([2.0, 5.0])  # + 1 s d'edit vide, - 1 s de media_time, + 2 s de ctts
+
+
+@pytest.mark.parametrize('elst', [
+    [(MOVIE_TIMESCALE, 0, MP4_UNIT_RATE), (MOVIE_TIMESCALE, 3000, MP4_UNIT_RATE)],  # Montage
+    [(MOVIE_TIMESCALE, 0, MP4_UNIT_RATE // 2)],  # Ralenti
+])
+def test_complex_edit_list_falls_back_to_ffprobe(elst):
+    assert _index_from_mp4(make_moov(elst=elst)) is None
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Index temps -> octets des fichiers video
+Construit depuis les Cues Matroska, les tables d'echantillons MP4 ou un scan ffprobe
+"""
+
+import struct
+import logging
+import subprocess
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from container_inspector import CUES_ID, ContainerLayout, ReadAt, read_element_header
+
+logger = logging.getLogger(__name__)
+
+# Elements Matroska des Cues
+CUE_POINT_ID = 0xBB
+CUE_TIME_ID = 0xB3
+CUE_TRACK_POSITIONS_ID = 0xB7
+CUE_TRACK_ID = 0xF7
+CUE_CLUSTER_POSITION_ID = 0xF1
+
+# Boites MP4 traversees jusqu'aux tables d'echantillons (et a la liste d'edition)
+MP4_CONTAINER_BOXES = {b'trak', b'edts', b'mdia', b'minf', b'stbl'}
+MP4_UNIT_RATE = 0x10000  # media_rate 1.0 d'une entree elst (virgule fixe 16.16)
+
+FFPROBE_TIMEOUT = 120  # Scan complet des paquets (secondes)
+
+
+class TimeIndex:
+    """Points d'acces (keyframes) d'un fichier: temps croissants et offsets associes"""
+
+    def __init__(self, times: np.ndarray, offsets: np.ndarray, duration: Optional[float], source: str):
+        order = np.argsort(times, kind='stable')
+        self.times = np.asarray(times, dtype=np.float32)[order]
+        self.offsets = np.asarray(offsets, dtype=np.int64)[order]
+        self.duration = duration or (float(self.times[-1]) if len(self.times) else None)
+        self.source = source  # 'mkv_cues', 'mp4_stss' ou 'ffprobe'
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def keyframe_at(self, seconds: float) -> Tuple[float, int]:
+        """Dernier point d'acces a ou avant `seconds` -> (temps, offset)"""
+        i = max(0, int(np.searchsorted(self.times, seconds, side='right')) - 1)
+        return float(self.times[i]), int(self.offsets[i])
+
+    def offset_at(self, seconds: float) -> int:
+        return self.keyframe_at(seconds)[1]
+
+    def get_info(self) -> dict:
+        return {'source': self.source, 'keyframes': len(self), 'duration': self.duration}
+
+
+def build_time_index(layout: ContainerLayout, read_at: ReadAt, file_size: int) -> Optional[TimeIndex]:
+    """Index depuis la zone d'index localisee par l'inspecteur (None si pas encore lisible)"""
+    if not layout.index_ranges:
+        return None
+    start, end = layout.index_ranges[0]
+    data = read_at(start, end - start)
+    if data is None:
+        return None
+
+    try:
+        if layout.container == 'mkv':
+            return _index_from_cues(data, layout)
+        if layout.container == 'mp4':
+            return _index_from_mp4(data)
+    except (IndexError, ValueError, struct.error) as e:
+        logger.warning(f"Index {layout.container} illisible: {e}")
+    return None
+
+
+def _index_from_cues(data: bytes, layout: ContainerLayout) -> Optional[TimeIndex]:
+    """CuePoints (CueTime, CueClusterPosition) de la piste la plus indexee (la video)"""
+    cue_id, size, pos = read_element_header(data, 0)
+    if cue_id != CUES_ID:
+        raise ValueError("zone d'index sans element Cues")
+    end = min(len(data), pos + size) if size is not None else len(data)
+
+    tracks, times, positions = [], [], []
+    while pos < end:
+        element_id, size, data_start = read_element_header(data, pos)
+        if size is None:
+            break
+        if element_id == CUE_POINT_ID:
+            cue_time = None
+            child = data_start
+            while child < data_start + size:
+                child_id, child_size, child_data = read_element_header(data, child)
+                if child_id == CUE_TIME_ID:
+                    cue_time = int.from_bytes(data[child_data:child_data + child_size], 'big')
+                elif child_id == CUE_TRACK_POSITIONS_ID and cue_time is not None:
+                    track, cluster = _cue_track_position(data, child_data, child_data + child_size)
+                    if cluster is not None:
+                        tracks.append(track)
+                        times.append(cue_time)
+                        positions.append(cluster)
+                child = child_data + child_size
+        pos = data_start + size
+
+    if not times:
+        return None
+    tracks = np.array(tracks)
+    video_track = np.bincount(tracks).argmax()
+    keep = tracks == video_track
+    times = np.array(times, dtype=np.float64)[keep] * layout.timecode_scale / 1e9
+    offsets = np.array(positions, dtype=np.int64)[keep] + layout.segment_offset
+    return TimeIndex(times, offsets, layout.duration, 'mkv_cues')
+
+
+def _cue_track_position(data: bytes, start: int, end: int) -> Tuple[int, Optional[int]]:
+    track, cluster = 0, None
+    while start < end:
+        element_id, size, data_start = read_element_header(data, start)
+        value = int.from_bytes(data[data_start:data_start + size], 'big')
+        if element_id == CUE_TRACK_ID:
+            track = value
+        elif element_id == CUE_CLUSTER_POSITION_ID:
+            cluster = value
+        start = data_start + size
+    return track, cluster
+
+
+def _iter_boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Boites MP4 de [start, end) -> (type, debut du contenu, fin)"""
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, start)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, start + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - start
+        if size < header_size:
+            raise ValueError(f"boite {box_type!r} invalide")
+        yield box_type, start + header_size, min(end, start + size)
+        start += size
+
+
+def _find_box(data: bytes, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for found, payload, box_end in _iter_boxes(data, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+
+def _full_box_table(data: bytes, payload: int, columns: int, dtype: str = '>u4', skip: int = 0) -> np.ndarray:
+    """Table d'une full box: version/flags, [skip octets], nombre d'entrees, entrees"""
+    count = struct.unpack_from('>I', data, payload + 4 + skip)[0]
+    table = np.frombuffer(data, dtype=dtype, count=count * columns, offset=payload + 8 + skip)
+    return table.astype(np.int64).reshape(count, columns) if columns > 1 else table.astype(np.int64)
+
+
+def _index_from_mp4(data: bytes) -> Optional[TimeIndex]:
+    """Keyframes de la piste video depuis stss/stts/ctts/stsc/stsz/stco et la liste d'edition"""
+    moov = _find_box(data, 0, len(data), b'moov')
+    if moov is None:
+        raise ValueError("moov absent de la zone d'index")
+
+    movie_timescale = 0  # Unite des durees de elst
+    for box_type, payload, box_end in _iter_boxes(data, *moov):
+        if box_type == b'mvhd':
+            movie_timescale = _timescale_and_duration(data, payload)[0]
+        if box_type != b'trak':
+            continue
+        tables = {}
+        _collect_tables(data, payload, box_end, tables)
+        if tables.get('handler') == b'vide' and {'mdhd', 'stts', 'stsc', 'stsz'} <= tables.keys():
+            return _keyframes_from_tables(data, tables, movie_timescale)
+    return None
+
+
+def _timescale_and_duration(data: bytes, payload: int) -> Tuple[int, int]:
+    """(timescale, duree) d'une boite mvhd ou mdhd selon sa version"""
+    if data[payload] == 1:
+        return struct.unpack_from('>IQ', data, payload + 20)
+    return struct.unpack_from('>II', data, payload + 12)
+
+
+def _collect_tables(data: bytes, start: int, end: int, tables: dict):
+    """Parcourt trak/mdia/minf/stbl et note la position des tables utiles"""
+    for box_type, payload, box_end in _iter_boxes(data, start, end):
+        if box_type in MP4_CONTAINER_BOXES:
+            _collect_tables(data, payload, box_end, tables)
+        elif box_type == b'hdlr':
+            tables['handler'] = data[payload + 8:payload + 12]
+        elif box_type == b'mdhd':
+            tables['mdhd'] = _timescale_and_duration(data, payload)
+        elif box_type in (b'stts', b'ctts', b'stsc', b'stss', b'stco', b'co64', b'stsz', b'elst'):
+            tables[box_type.decode()] = payload
+
+
+def _edit_list_shift(data: bytes, payload: Optional[int], timescale: int, movie_timescale: int) -> Optional[float]:
+    """Decalage (secondes) des instants de la piste vers la chronologie du film selon elst:
+    edits vides initiaux moins le media_time du premier edit. None pour un vrai montage
+    (plusieurs edits de media, vitesse differente de 1): l'index vient alors du scan ffprobe"""
+    if payload is None:
+        return 0.0
+    version = data[payload]
+    count = struct.unpack_from('>I', data, payload + 4)[0]
+    entry = '>Qqi' if version == 1 else '>Iii'  # segment_duration, media_time, media_rate (16.16)
+    entry_size = struct.calcsize(entry)
+
+    empty, media_times = 0, []
+    for i in range(count):
+        segment_duration, media_time, rate = struct.unpack_from(entry, data, payload + 8 + i * entry_size)
+        if media_time == -1:
+            if not media_times:
+                empty += segment_duration  # Les edits vides de fin ne decalent rien
+        elif rate != MP4_UNIT_RATE or media_times:
+            return None
+        else:
+            media_times.append(media_time)
+
+    if empty and not movie_timescale:
+        return None
+    return (empty / movie_timescale if empty else 0.0) - (media_times[0] if media_times else 0) / timescale
+
+
+def _keyframes_from_tables(data: bytes, tables: dict, movie_timescale: int = 0) -> Optional[TimeIndex]:
+    """Instant de presentation et offset fichier de chaque echantillon de synchronisation (vectorise)"""
+    timescale, duration = tables['mdhd']
+    if not timescale:
+        return None
+    shift = _edit_list_shift(data, tables.get('elst'), timescale, movie_timescale)
+    if shift is None:
+        logger.info("Liste d'edition MP4 complexe: index par scan ffprobe en fin de telechargement")
+        return None
+
+    # stts: (nombre, duree) -> instant de decodage de chaque echantillon
+    stts = _full_box_table(data, tables['stts'], 2)
+    deltas = np.repeat(stts[:, 1], stts[:, 0])
+    dts = np.concatenate(([0], np.cumsum(deltas)[:-1]))
+
+    # ctts: (nombre, decalage) -> instant de presentation (images B); signe en version 1,
+    # lu signe dans tous les cas comme ffmpeg (decalages negatifs ecrits en version 0)
+    if 'ctts' in tables:
+        ctts = _full_box_table(data, tables['ctts'], 2, dtype='>i4')
+        composition = np.repeat(ctts[:, 1], np.maximum(ctts[:, 0], 0))[:len(dts)]
+        pts = dts.copy()
+        pts[:len(composition)] += composition
+    else:
+        pts = dts
+
+    # stsz: taille fixe ou table de tailles
+    sample_size, sample_count = struct.unpack_from('>II', data, tables['stsz'] + 4)
+    if sample_size:
+        sizes = np.full(sample_count, sample_size, dtype=np.int64)
+    else:
+        sizes = _full_box_table(data, tables['stsz'], 1, skip=4)
+
+    # stco/co64: offset de chaque chunk; stsc: echantillons par chunk (par plages)
+    if 'co64' in tables:
+        chunk_offsets = _full_box_table(data, tables['co64'], 1, dtype='>u8')
+    elif 'stco' in tables:
+        chunk_offsets = _full_box_table(data, tables['stco'], 1)
+    else:
+        return None
+    stsc = _full_box_table(data, tables['stsc'], 3)
+    runs = np.diff(np.append(stsc[:, 0] - 1, len(chunk_offsets)))
+    per_chunk = np.repeat(stsc[:, 1], np.maximum(runs, 0))
+
+    sample_chunk = np.repeat(np.arange(len(per_chunk)), per_chunk)
+    count = min(len(sample_chunk), len(sizes), len(pts))
+    sample_chunk, sizes, pts = sample_chunk[:count], sizes[:count], pts[:count]
+
+    # Offset = debut du chunk + tailles des echantillons precedents du meme chunk
+    size_before = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    chunk_first_sample = np.concatenate(([0], np.cumsum(per_chunk)[:-1]))
+    offsets = chunk_offsets[sample_chunk] + size_before - size_before[chunk_first_sample[sample_chunk]]
+
+    if 'stss' in tables:
+        sync = _full_box_table(data, tables['stss'], 1) - 1  # Numeros 1-based
+        sync = sync[(sync >= 0) & (sync < count)]
+    else:
+        sync = np.arange(count)  # Sans stss, tous les echantillons sont des points d'acces
+
+    return TimeIndex(pts[sync] / timescale + shift, offsets[sync], duration / timescale if duration else None,
+                     'mp4_stss')
+
+
+def probe_keyframes(video_path: str) -> Optional[TimeIndex]:
+    """Repli: scan des paquets video par ffprobe (fichier complet uniquement)"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,pos,flags',
+            '-of', 'csv=p=0',
+            video_path
+        ], capture_output=True, text=True, timeout=FFPROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.error(f"Erreur ffprobe keyframes: {e}")
+        return None
+
+    times, offsets = [], []
+    for line in result.stdout.splitlines():
+        fields = line.split(',')
+        if len(fields) < 3 or 'K' not in fields[2]:
+            continue
+        try:
+            times.append(float(fields[0]))
+            offsets.append(int(fields[1]))
+        except ValueError:
+            continue  # pts ou position absents (N/A)
+
+    if not times:
+        return None
+    return TimeIndex(np.array(times), np.array(offsets), None, 'ffprobe')
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Client du daemon torrent (torrent_daemon.py)
+Expose les memes methodes que le service de streaming et ses controleurs, par appels engine_protocol;
+une connexion par worker de l'API, multiplexee (plusieurs requetes en vol) par identifiant
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from engine_protocol import ASYNC_METHODS, ENGINE_METHODS, MAX_MESSAGE_BYTES, SUBSCRIBE, decode, encode
+from real_streaming_service import PIECE_WAIT_TIMEOUT, PieceWaitTimeout
+
+logger = logging.getLogger(__name__)
+
+RPC_TIMEOUT = 30  # Attente max d'une reponse du daemon (secondes)
+CONNECT_TIMEOUT = 5  # Attente max de la socket du daemon a la premiere requete (secondes)
+RECONNECT_DELAY = 0.2
+STREAMING_INFO_MAX_AGE = 2.0  # Infos poussees par le daemon utilisees sans aller-retour (secondes)
+
+
+class TorrentEngineError(Exception):
+    """Daemon torrent injoignable ou erreur levee cote daemon"""
+
+    def __init__(self, message: str, error_type: str = 'EngineUnavailable'):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def decode_error(payload: Dict) -> Exception:
+    """Reconstruit l'exception du daemon (PieceWaitTimeout gardee pour le 503 + Retry-After)"""
+    if payload['type'] == 'PieceWaitTimeout':
+        return PieceWaitTimeout(payload['info_hash'], payload['missing_pieces'], payload['retry_after'])
+    return TorrentEngineError(payload['message'], payload['type'])
+
+
+class RemoteComponent:
+    """Composant du daemon ('service', 'eviction_manager', ...): methodes exposees seulement.
+    Attribut = appel bloquant (threads); call_async(nom, ...) depuis une coroutine"""
+
+    def __init__(self, client: 'TorrentEngineClient', name: str):
+        self._client = client
+        self._name = name
+
+    def _method(self, name: str) -> str:
+        if name not in ENGINE_METHODS[self._name]:
+            raise AttributeError(f"{self._name}.{name} n'est pas expose par le daemon torrent")
+        return f"{self._name}.{name}"
+
+    def __getattr__(self, name: str):
+        method = self._method(name)
+        if method in ASYNC_METHODS:
+            async def remote_coroutine(*args, **kwargs):
+                return await self._client.call_async(method, *args, **kwargs)
+            return remote_coroutine
+
+        def remote_call(*args, **kwargs):
+            return self._client.call(method, *args, **kwargs)
+        return remote_call
+
+    async def call_async(self, name: str, *args, **kwargs):
+        """Methode du daemon attendue sans bloquer la boucle de l'appelant"""
+        return await self._client.call_async(self._method(name), *args, **kwargs)
+
+
+class RemoteStreamingService(RemoteComponent):
+    """Service de streaming distant: statut lu dans le cache alimente par les evenements du daemon"""
+
+    def get_streaming_info(self, info_hash: str) -> Optional[Dict]:
+        cached = self._client.get_cached_info(info_hash)
+        if cached is not None:
+            return cached[0]
+        return self._client.call('service.get_streaming_info', info_hash)
+
+    async def wait_for_range(self, info_hash: str, offset: int, length: int,
+                             timeout: float = PIECE_WAIT_TIMEOUT, reader_id: Optional[str] = None):
+        await self._client.call_async('service.wait_for_range', info_hash, offset, length,
+                                      timeout=timeout, reader_id=reader_id, rpc_timeout=timeout + RPC_TIMEOUT)
+
+    def stop_torrent(self, info_hash: str) -> bool:
+        self._client.forget_info(info_hash)
+        return self._client.call('service.stop_torrent', info_hash)
+
+    async def call_async(self, name: str, *args, **kwargs):
+        if name == 'get_streaming_info':
+            cached = self._client.get_cached_info(*args, **kwargs)
+            if cached is not None:
+                return cached[0]
+        elif name == 'stop_torrent':
+            self._client.forget_info(*args, **kwargs)
+        return await super().call_async(name, *args, **kwargs)
+
+
+class TorrentEngineClient:
+    """Connexion au daemon: boucle asyncio dediee (utilisable depuis du code synchrone ou async)"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.service = RemoteStreamingService(self, 'service')
+        self.eviction_manager = RemoteComponent(self, 'eviction_manager')
+        self.bandwidth_arbiter = RemoteComponent(self, 'bandwidth_arbiter')
+        self.upload_governor = RemoteComponent(self, 'upload_governor')
+
+        self.streaming_info: Dict[str, Tuple[Optional[Dict], float]] = {}  # info_hash -> (infos, recu a)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        thread.start()
+
+    def call(self, method: str, *args, rpc_timeout: float = RPC_TIMEOUT, **kwargs):
+        """Appel bloquant depuis un thread (jamais depuis une boucle asyncio: elle serait gelee)"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise TorrentEngineError(f"Appel bloquant de {method} depuis une coroutine: utiliser call_async",
+                                     'BlockingCall')
+        future = asyncio.run_coroutine_threadsafe(self._call(method, args, kwargs, rpc_timeout), self.loop)
+        return future.result()
+
+    async def call_async(self, method: str, *args, rpc_timeout: float = RPC_TIMEOUT, **kwargs):
+        """Appel depuis la boucle de l'API, sans la bloquer"""
+        future = asyncio.run_coroutine_threadsafe(self._call(method, args, kwargs, rpc_timeout), self.loop)
+        return await asyncio.wrap_future(future)
+
+    def get_cached_info(self, info_hash: str) -> Optional[Tuple[Optional[Dict], float]]:
+        entry = self.streaming_info.get(info_hash)
+        if entry is None or time.monotonic() - entry[1] > STREAMING_INFO_MAX_AGE:
+            return None
+        return entry
+
+    def forget_info(self, info_hash: str):
+        self.streaming_info.pop(info_hash, None)
+
+    async def _call(self, method: str, args, kwargs, rpc_timeout: float):
+        writer = await self._connect()
+        self._next_id += 1
+        request_id = self._next_id
+        future = self.loop.create_future()
+        self._pending[request_id] = future
+        try:
+            writer.write(encode({'id': request_id, 'm': method, 'a': list(args), 'k': kwargs}))
+            await writer.drain()
+            return await asyncio.wait_for(future, rpc_timeout)
+        except asyncio.TimeoutError:
+            raise TorrentEngineError(f"Pas de reponse du daemon torrent a {method}")
+        except ConnectionError as e:
+            raise TorrentEngineError(f"Daemon torrent injoignable: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        """Connexion paresseuse, retentee tant que le daemon demarre"""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+
+            deadline = time.monotonic() + CONNECT_TIMEOUT
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_MESSAGE_BYTES)
+                    break
+                except (FileNotFoundError, ConnectionError) as e:
+                    if time.monotonic() >= deadline:
+                        raise TorrentEngineError(f"Daemon torrent injoignable sur {self.socket_path}: {e}")
+                    await asyncio.sleep(RECONNECT_DELAY)
+
+            self._writer = writer
+            self.loop.create_task(self._read_loop(reader, writer))
+            # Abonnement aux evenements: statut des torrents pousse chaque seconde
+            self._next_id += 1
+            writer.write(encode({'id': self._next_id, 'm': SUBSCRIBE}))
+            logger.info(f"Connecte au daemon torrent ({self.socket_path})")
+            return writer
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = decode(line)
+                if 'ev' in message:
+                    self._on_event(message)
+                    continue
+                future = self._pending.get(message.get('id'))
+                if future is None or future.done():
+                    continue
+                if 'e' in message:
+                    future.set_exception(decode_error(message['e']))
+                else:
+                    future.set_result(message.get('r'))
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Connexion au daemon torrent perdue: {e}")
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            # Requetes en vol: echec immediat, la suivante reconnecte
+            self.streaming_info.clear()
+            for future in list(self._pending.values()):
+                if not future.done():
+                    future.set_exception(TorrentEngineError("Connexion au daemon torrent perdue"))
+
+    def _on_event(self, message: Dict):
+        if message['ev'] == 'info':
+            if message['d'] is None:
+                self.streaming_info.pop(message['h'], None)
+            else:
+                self.streaming_info[message['h']] = (message['d'], time.monotonic())
+
+    def close(self):
+        if self._writer is not None:
+            self.loop.call_soon_threadsafe(self._writer.close)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Daemon torrent
+Possede la session libtorrent et les controleurs (eviction, bande passante, upload) dans un
+processus separe de l'API; sert engine_protocol sur une socket Unix locale partagee par les workers
+"""
+
+import os
+import signal
+import asyncio
+import logging
+from typing import Dict, Set
+
+# Ce processus possede la session, quel que soit le mode configure pour l'API
+os.environ['TORRENT_ENGINE'] = 'local'
+
+from real_streaming_service import TORRENT_DAEMON_SOCKET, real_streaming_service  # noqa: E402
+from eviction_manager import eviction_manager  # noqa: E402
+from bandwidth_arbiter import bandwidth_arbiter  # noqa: E402
+from upload_governor import upload_governor  # noqa: E402
+from media_probe import media_probe  # noqa: E402,F401  (sonde des fichiers prets, cache disque partage)
+from engine_protocol import (  # noqa: E402
+    ASYNC_METHODS, EVENT_INTERVAL, MAX_MESSAGE_BYTES, SUBSCRIBE, decode, encode, encode_error, is_allowed
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Connection:
+    """Connexion d'un worker de l'API: requetes traitees en parallele, reponses dans le desordre"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.subscribed = False
+        self._write_lock = asyncio.Lock()
+
+    async def send(self, message: Dict):
+        async with self._write_lock:
+            self.writer.write(encode(message))
+            await self.writer.drain()
+
+
+class TorrentDaemon:
+    """Serveur engine_protocol au-dessus du service de streaming et de ses controleurs"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.components = {
+            'service': real_streaming_service,
+            'eviction_manager': eviction_manager,
+            'bandwidth_arbiter': bandwidth_arbiter,
+            'upload_governor': upload_governor,
+        }
+        self.connections: Set[Connection] = set()
+        self.published: Set[str] = set()  # Torrents annonces aux abonnes au dernier tour
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Socket d'un daemon precedent
+        server = await asyncio.start_unix_server(self._on_connection, self.socket_path, limit=MAX_MESSAGE_BYTES)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Daemon torrent a l'ecoute sur {self.socket_path}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        publisher = asyncio.create_task(self._publish_loop())
+        async with server:
+            await stop.wait()
+        publisher.cancel()
+        for connection in list(self.connections):
+            connection.writer.close()  # Les workers voient la fermeture et echouent vite (503)
+
+        # Resume data de tous les torrents avant l'arret (reprise instantanee au redemarrage)
+        await loop.run_in_executor(None, real_streaming_service.shutdown)
+        os.unlink(self.socket_path)
+
+    async def _on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(reader, writer)
+        self.connections.add(connection)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._handle(connection, decode(line)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Connexion API fermee: {e}")
+        finally:
+            self.connections.discard(connection)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _handle(self, connection: Connection, request: Dict):
+        request_id, method = request.get('id'), request.get('m', '')
+        try:
+            if method == SUBSCRIBE:
+                connection.subscribed = True
+                result = None
+            elif not is_allowed(method):
+                raise AttributeError(f"Methode non exposee: {method}")
+            else:
+                component, _, name = method.partition('.')
+                function = getattr(self.components[component], name)
+                args, kwargs = request.get('a', []), request.get('k', {})
+                if method in ASYNC_METHODS:
+                    result = await function(*args, **kwargs)
+                else:
+                    # Appels libtorrent bloquants hors de la boucle: les autres requetes continuent
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        None, lambda: function(*args, **kwargs)
+                    )
+            response = {'id': request_id, 'r': result}
+        except Exception as e:
+            response = {'id': request_id, 'e': encode_error(e)}
+
+        try:
+            await connection.send(response)
+        except ConnectionError:
+            pass
+
+    def _collect_streaming_info(self) -> Dict:
+        service = real_streaming_service
+        return {info_hash: service.get_streaming_info(info_hash) for info_hash in list(service.active_torrents)}
+
+    async def _publish_loop(self):
+        """Pousse les infos de streaming aux abonnes: le statut se lit sans aller-retour cote API"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(EVENT_INTERVAL)
+            subscribers = [connection for connection in self.connections if connection.subscribed]
+            if not subscribers:
+                continue
+            try:
+                infos = await loop.run_in_executor(None, self._collect_streaming_info)
+            except Exception as e:
+                logger.error(f"Erreur publication des infos de streaming: {e}")
+                continue
+
+            # Torrents disparus (arretes, supprimes): annonce explicite pour vider les caches
+            events = [{'ev': 'info', 'h': info_hash, 'd': info} for info_hash, info in infos.items()]
+            events += [{'ev': 'info', 'h': info_hash, 'd': None} for info_hash in self.published - set(infos)]
+            self.published = set(infos)
+            for connection in subscribers:
+                try:
+                    for event in events:
+                        await connection.send(event)
+                except ConnectionError:
+                    self.connections.discard(connection)
+
+
+if __name__ == "__main__":
+    asyncio.run(TorrentDaemon(TORRENT_DAEMON_SOCKET).serve())
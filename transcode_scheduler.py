@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Ordonnanceur des transcodages
+Tous les ffmpeg (segments HLS, chunks audio et video, transcodages complets) passent par une
+file a priorites: au plus un ffmpeg par coeur disponible pour le conteneur, les requetes d'un
+lecteur qui attend avant le prechargement, et le prechargement rendu inutile par un seek annule
+"""
+
+import os
+import heapq
+import itertools
+import logging
+import subprocess
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_BLOCKING = 0  # Un lecteur attend ce resultat
+PRIORITY_PREFETCH = 1  # Prechargement devant la position de lecture
+RECHECK_INTERVAL = 1.0  # Verification des processus longs termines (secondes)
+
+# Emplacements ffmpeg de ce processus; 0 = coeurs du conteneur partages entre les workers de l'API
+TRANSCODE_SLOTS = int(os.getenv('TRANSCODE_SLOTS', '0'))
+
+
+def available_cpus() -> int:
+    """Coeurs utilisables par le conteneur: affinite CPU et quota cgroup (v2 puis v1)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, int(quota))
+    return max(1, cpus)
+
+
+def default_slots() -> int:
+    """Au moins deux: le dernier emplacement est reserve aux requetes des lecteurs"""
+    if TRANSCODE_SLOTS > 0:
+        return max(2, TRANSCODE_SLOTS)
+    workers = int(os.getenv('API_WORKERS', '1')) if os.getenv('TORRENT_ENGINE', 'local') == 'remote' else 1
+    return max(2, available_cpus() // max(1, workers))
+
+
+class TranscodeScheduler:
+    """File a priorites executee par un thread par emplacement; les processus longs occupent un emplacement.
+    Prechargement et processus longs ne prennent jamais le dernier emplacement: une requete bloquante
+    trouve toujours un ffmpeg libre sans attendre la fin d'un transcodage complet ou d'un prechargement"""
+
+    def __init__(self, slots: Optional[int] = None):
+        self.slots = max(2, slots or default_slots())
+        self.max_processes = max(1, self.slots // 2)  # Transcodages complets: la moitie des emplacements
+        self.processes: List[subprocess.Popen] = []
+        self._queue: list = []  # (priorite, ordre, job); entrees perimees ignorees
+        self._queued: Dict[Future, dict] = {}
+        self._cancelling: set = set()  # Retires de la file, annulation du future pas encore faite
+        self._order = itertools.count()
+        self._running = 0
+        self._cond = threading.Condition()
+
+        for i in range(self.slots):
+            thread = threading.Thread(target=self._worker, name=f"transcode-{i}", daemon=True)
+            thread.start()
+        logger.info(f"Ordonnanceur de transcodage: {self.slots} ffmpeg simultanes")
+
+    def submit(self, function: Callable, *args, priority: int = PRIORITY_BLOCKING,
+               key: Optional[Hashable] = None, **kwargs) -> Future:
+        future = Future()
+        job = {'function': function, 'args': args, 'kwargs': kwargs, 'priority': priority, 'key': key,
+               'future': future}
+        with self._cond:
+            self._queued[future] = job
+            heapq.heappush(self._queue, (priority, next(self._order), job))
+            self._cond.notify()
+        return future
+
+    def promote(self, future: Future, priority: int) -> bool:
+        """Remonte un job en attente (prechargement devenu requete bloquante); faux s'il a ete annule"""
+        with self._cond:
+            if future in self._cancelling or future.cancelled():
+                return False
+            job = self._queued.get(future)
+            if job is not None and priority < job['priority']:
+                job['priority'] = priority
+                heapq.heappush(self._queue, (priority, next(self._order), job))
+                self._cond.notify()
+            return True
+
+    def cancel_prefetch(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Annule les prechargements en attente dont la cle verifie predicate (positions perimees)"""
+        with self._cond:
+            stale = [job for job in self._queued.values()
+                     if job['priority'] == PRIORITY_PREFETCH and predicate(job['key'])]
+            for job in stale:
+                del self._queued[job['future']]
+                self._cancelling.add(job['future'])  # promote() refuse ces futures des maintenant
+        for job in stale:
+            job['future'].cancel()  # Hors du verrou: les callbacks du registre s'executent ici
+        with self._cond:
+            self._cancelling.difference_update(job['future'] for job in stale)
+        return len(stale)
+
+    def _live_processes(self) -> int:
+        self.processes = [process for process in self.processes if process.poll() is None]
+        return len(self.processes)
+
+    def _limit(self, priority: int) -> int:
+        """Emplacements utilisables: tous pour une requete bloquante, sauf le dernier sinon"""
+        return self.slots if priority == PRIORITY_BLOCKING else self.slots - 1
+
+    def can_attach(self) -> bool:
+        """Place pour un processus long (transcodage complet) sans bloquer les requetes des lecteurs"""
+        with self._cond:
+            processes = self._live_processes()
+            return processes < self.max_processes and processes + self._running < self._limit(PRIORITY_PREFETCH)
+
+    def attach(self, process: subprocess.Popen):
+        """Processus long lance hors de la file: occupe un emplacement jusqu'a sa fin"""
+        with self._cond:
+            self.processes.append(process)
+
+    def get_state(self) -> Dict:
+        with self._cond:
+            return {
+                'slots': self.slots,
+                'running': self._running,
+                'processes': self._live_processes(),
+                'queued_blocking': sum(1 for job in self._queued.values() if job['priority'] == PRIORITY_BLOCKING),
+                'queued_prefetch': sum(1 for job in self._queued.values() if job['priority'] == PRIORITY_PREFETCH),
+            }
+
+    def _next_job(self) -> Optional[dict]:
+        """Job le plus prioritaire encore en attente (appele sous self._cond)"""
+        while self._queue:
+            priority, _, job = self._queue[0]
+            if job['future'] not in self._queued or priority != job['priority']:
+                heapq.heappop(self._queue)  # Annule, deja pris ou remonte
+                continue
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    job = self._next_job()
+                    if job is not None and self._running + self._live_processes() < self._limit(job['priority']):
+                        break
+                    self._cond.wait(RECHECK_INTERVAL)
+                heapq.heappop(self._queue)
+                del self._queued[job['future']]
+                self._running += 1
+
+            future = job['future']
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(job['function'](*job['args'], **job['kwargs']))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify()
+
+
+# Instance globale
+transcode_scheduler = TranscodeScheduler()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Gouverneur d'upload
+Plafonne l'upload de la session tant qu'un stream regarde est sous son buffer cible,
+relache le plafond progressivement quand les buffers se reconstituent (AIMD)
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, List
+
+from bandwidth_arbiter import BUFFER_TARGET_SECONDS
+from real_streaming_service import RealStreamingService, real_streaming_service
+
+logger = logging.getLogger(__name__)
+
+GOVERNOR_INTERVAL = 2  # Secondes entre deux evaluations
+UPLOAD_CAP_START = 256 * 1024  # Premier plafond quand un stream passe sous sa cible (bytes/s)
+UPLOAD_CAP_MIN = 32 * 1024  # Plancher: garder un minimum de reciprocite avec l'essaim
+UPLOAD_CAP_STEP = 64 * 1024  # Relachement additif par evaluation une fois les buffers revenus
+RELAX_AFTER = 10  # Secondes de buffers sains avant de commencer a relacher
+UNLIMITED = 0  # upload_rate_limit de session: 0 = illimite
+
+
+class UploadGovernor:
+    """Plafond d'upload de session pilote par la sante des buffers des streams regardes"""
+
+    def __init__(self, service: RealStreamingService, interval: float = GOVERNOR_INTERVAL):
+        self.service = service
+        self.interval = interval
+        self.cap = UNLIMITED
+        self.state = 'relaxed'  # 'relaxed', 'capped' ou 'relaxing'
+        self.stalled: List[Dict] = []
+        self.healthy_since = time.monotonic()
+        self.last_buffers: Dict[str, float] = {}
+        self.changes = 0
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+
+        thread = threading.Thread(target=self._loop, daemon=True)
+        thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.error(f"Erreur gouverneur d'upload: {e}")
+
+    def _stalled_streams(self) -> List[Dict]:
+        """Streams regardes sous leur buffer cible"""
+        stalled = []
+        for info_hash in list(self.service.active_torrents):
+            if self.service.get_active_readers(info_hash) == 0:
+                continue
+            buffered = self.service.get_buffered_seconds(info_hash)
+            if buffered is not None and buffered < BUFFER_TARGET_SECONDS:
+                stalled.append({'info_hash': info_hash, 'buffered_seconds': round(buffered, 1)})
+        return stalled
+
+    def evaluate(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            stalled = self._stalled_streams()
+            cap = self.cap
+
+            if stalled:
+                self.healthy_since = now
+                if cap == UNLIMITED:
+                    cap = UPLOAD_CAP_START
+                elif not self._recovering(stalled):
+                    # Toujours sous la cible sans progres: diviser le plafond
+                    cap = max(UPLOAD_CAP_MIN, cap // 2)
+                self.state = 'capped'
+            elif cap != UNLIMITED and now - self.healthy_since >= RELAX_AFTER:
+                cap += UPLOAD_CAP_STEP
+                if cap >= UPLOAD_CAP_START * 4:
+                    cap = UNLIMITED
+                self.state = 'relaxed' if cap == UNLIMITED else 'relaxing'
+
+            self.last_buffers = {stream['info_hash']: stream['buffered_seconds'] for stream in stalled}
+            self.stalled = stalled
+            self.updated_at = time.time()
+            if cap != self.cap:
+                self._apply(cap)
+            return self.get_state()
+
+    def _recovering(self, stalled: List[Dict]) -> bool:
+        """Vrai si chaque stream sous la cible a gagne du buffer depuis la derniere evaluation"""
+        return all(
+            stream['buffered_seconds'] > self.last_buffers.get(stream['info_hash'], float('inf'))
+            for stream in stalled
+        )
+
+    def _apply(self, cap: int):
+        self.service.session.apply_settings({'upload_rate_limit': cap})
+        self.changes += 1
+        logger.info(f"Gouverneur d'upload: {self.state}, plafond "
+                    f"{'illimite' if cap == UNLIMITED else f'{cap // 1024} KB/s'} "
+                    f"({len(self.stalled)} stream(s) sous {BUFFER_TARGET_SECONDS}s de buffer)")
+        self.cap = cap
+
+    def get_state(self) -> Dict:
+        return {
+            'state': self.state,
+            'upload_cap': self.cap or None,  # None = illimite
+            'buffer_target_seconds': BUFFER_TARGET_SECONDS,
+            'stalled_streams': self.stalled,
+            'changes': self.changes,
+            'updated_at': self.updated_at,
+        }
+
+
+# Instance globale
+upload_governor = UploadGovernor(real_streaming_service)